@@ -0,0 +1,344 @@
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from dateutil.relativedelta import relativedelta
+
+from storage import full_name_key
+
+ARRIVAL_BUCKET_MINUTES = 15
+
+SCHEMA = """
+-- Check-in/out counts per day and role. dimension is 'checkins', 'checkouts'
+-- (bucket ''), 'method' (QR, Manual, ...) or 'arrival' (check-in time rounded
+-- down to ARRIVAL_BUCKET_MINUTES, e.g. '09:45').
+CREATE TABLE IF NOT EXISTS day_counts (
+    day       TEXT NOT NULL,
+    role      TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    bucket    TEXT NOT NULL,
+    count     INTEGER NOT NULL,
+    PRIMARY KEY (day, role, dimension, bucket)
+) WITHOUT ROWID;
+
+-- Who came in each day, week and month (grain), and how many of them per role.
+-- Unique counts are kept up to date on write, so a report never has to count
+-- distinct members over raw attendance.
+CREATE TABLE IF NOT EXISTS period_members (
+    grain    TEXT NOT NULL,
+    start    TEXT NOT NULL,
+    member   TEXT NOT NULL,
+    role     TEXT NOT NULL,
+    checkins INTEGER NOT NULL,
+    PRIMARY KEY (grain, start, member)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS period_members_member ON period_members(member, grain, start);
+CREATE TABLE IF NOT EXISTS period_unique (
+    grain TEXT NOT NULL,
+    start TEXT NOT NULL,
+    role  TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (grain, start, role)
+) WITHOUT ROWID;
+
+-- Each member's first and latest day and how many days they came
+CREATE TABLE IF NOT EXISTS members (
+    member    TEXT PRIMARY KEY,
+    name      TEXT NOT NULL,
+    role      TEXT NOT NULL,
+    first_day TEXT NOT NULL,
+    last_day  TEXT NOT NULL,
+    days      INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS members_first_day ON members(first_day);
+CREATE INDEX IF NOT EXISTS members_last_day ON members(last_day);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+SQL_ADD_COUNT = (
+    "INSERT INTO day_counts (day, role, dimension, bucket, count) VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT (day, role, dimension, bucket) DO UPDATE SET count = count + excluded.count"
+)
+SQL_DROP_EMPTY_COUNTS = "DELETE FROM day_counts WHERE day = ? AND count <= 0"
+SQL_ADD_PERIOD_MEMBER = (
+    "INSERT INTO period_members (grain, start, member, role, checkins) VALUES (?, ?, ?, ?, 1) "
+    "ON CONFLICT (grain, start, member) DO UPDATE SET checkins = checkins + 1 RETURNING checkins"
+)
+SQL_REMOVE_PERIOD_MEMBER = ("UPDATE period_members SET checkins = checkins - 1 "
+                            "WHERE grain = ? AND start = ? AND member = ? RETURNING checkins, role")
+SQL_ADD_UNIQUE = (
+    "INSERT INTO period_unique (grain, start, role, count) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT (grain, start, role) DO UPDATE SET count = count + excluded.count"
+)
+SQL_ADD_MEMBER_DAY = (
+    "INSERT INTO members (member, name, role, first_day, last_day, days) VALUES (?, ?, ?, ?, ?, 1) "
+    "ON CONFLICT (member) DO UPDATE SET "
+    "name = CASE WHEN excluded.last_day >= last_day THEN excluded.name ELSE name END, "
+    "role = CASE WHEN excluded.last_day >= last_day THEN excluded.role ELSE role END, "
+    "first_day = min(first_day, excluded.first_day), "
+    "last_day = max(last_day, excluded.last_day), days = days + 1"
+)
+SQL_MEMBER_SPAN = ("SELECT min(start), max(start), count(*) FROM period_members "
+                   "WHERE member = ? AND grain = 'day'")
+
+# Period start for each grouping, as an SQL expression over a YYYY-MM-DD column
+PERIODS = {
+    "day": "{col}",
+    "week": "date({col}, 'weekday 0', '-6 days')",  # the Monday of that week
+    "month": "substr({col}, 1, 7) || '-01'",
+}
+
+
+def period_start(day, group):
+    """First day of the day/week (Monday)/month containing ``day``."""
+    if group == "week":
+        return day - timedelta(days=day.weekday())
+    if group == "month":
+        return day.replace(day=1)
+    return day
+
+
+def period_end(start, group):
+    """Last day of the period beginning at ``start``."""
+    if group == "week":
+        return start + timedelta(days=6)
+    if group == "month":
+        return start + relativedelta(months=1, days=-1)
+    return start
+
+
+def arrival_bucket(checkin_time):
+    """'09:47:12' -> '09:45' (ARRIVAL_BUCKET_MINUTES wide); '' if the time is unreadable."""
+    try:
+        hours, minutes = (int(part) for part in checkin_time.strip().split(":")[:2])
+    except ValueError:
+        return ""
+    minutes -= minutes % ARRIVAL_BUCKET_MINUTES
+    return f"{hours:02d}:{minutes:02d}"
+
+
+def row_day(row):
+    """The log row's date, or None if it can't be read (such rows are left out of the rollups)."""
+    try:
+        return date.fromisoformat(row[2].strip())
+    except (ValueError, IndexError):
+        return None
+
+
+class AttendanceRollups:
+    """Daily attendance rollups kept up to date with every check-in and check-out.
+
+    Lives in its own SQLite database (WAL, shared by every worker process)
+    whichever storage backend holds the logs. Each write touches a handful of
+    rows for one day, week and month, so reports over months read a few rows
+    per period instead of the raw log. The rollups are first built from the
+    existing log by backfill(); rebuild() starts them over from a log, e.g.
+    after editing the data files by hand. Clearing the log leaves them alone,
+    so history that was downloaded and cleared still shows up in reports.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        self._local = threading.local()
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=10, cached_statements=64, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _tx(self):
+        """Write transaction; BEGIN IMMEDIATE so concurrent writers queue instead of failing."""
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    # --------------------- updates ---------------------
+
+    def _count(self, db, row, delta):
+        """Add ``delta`` (+1/-1) of one log row's check-in (and check-out, if it has one)."""
+        day, role = row[2].strip(), row[1].strip()
+        counts = [("checkins", ""), ("method", row[5].strip() if len(row) > 5 else "")]
+        bucket = arrival_bucket(row[3])
+        if bucket:
+            counts.append(("arrival", bucket))
+        if len(row) > 4 and row[4].strip():
+            counts.append(("checkouts", ""))
+        db.executemany(SQL_ADD_COUNT, [(day, role, dimension, value, delta) for dimension, value in counts])
+
+    def _add(self, db, row):
+        """Count one check-in row; False if its date is unreadable."""
+        day = row_day(row)
+        if day is None:
+            return False
+        self._count(db, row, 1)
+        member, name, role = full_name_key(row[0]), row[0].strip(), row[1].strip()
+        for grain in PERIODS:
+            start = str(period_start(day, grain))
+            [(checkins,)] = db.execute(SQL_ADD_PERIOD_MEMBER, (grain, start, member, role)).fetchall()
+            if checkins == 1:  # first time in this period
+                db.execute(SQL_ADD_UNIQUE, (grain, start, role, 1))
+                if grain == "day":
+                    db.execute(SQL_ADD_MEMBER_DAY, (member, name, role, start, start))
+        return True
+
+    def add_checkins(self, rows):
+        """Count newly written check-in rows."""
+        with self._tx() as db:
+            for row in rows:
+                self._add(db, row)
+
+    def add_checkouts(self, rows):
+        """Count check-outs; ``rows`` are the closed log rows, counted on their check-in day."""
+        with self._tx() as db:
+            db.executemany(SQL_ADD_COUNT, [(row[2].strip(), row[1].strip(), "checkouts", "", 1)
+                                           for row in rows if row_day(row)])
+
+    def remove(self, row):
+        """Take a deleted log row back out of the rollups."""
+        day = row_day(row)
+        if day is None:
+            return
+        member = full_name_key(row[0])
+        with self._tx() as db:
+            self._count(db, row, -1)
+            db.execute(SQL_DROP_EMPTY_COUNTS, (str(day),))
+            for grain in PERIODS:
+                start = str(period_start(day, grain))
+                left = db.execute(SQL_REMOVE_PERIOD_MEMBER, (grain, start, member)).fetchall()
+                if not left or left[0][0] > 0:
+                    continue
+                db.execute("DELETE FROM period_members WHERE grain = ? AND start = ? AND member = ?",
+                           (grain, start, member))
+                db.execute(SQL_ADD_UNIQUE, (grain, start, left[0][1], -1))
+                db.execute("DELETE FROM period_unique WHERE grain = ? AND start = ? AND count <= 0",
+                           (grain, start))
+                if grain == "day":
+                    first_day, last_day, days = db.execute(SQL_MEMBER_SPAN, (member,)).fetchone()
+                    if days:
+                        db.execute("UPDATE members SET first_day = ?, last_day = ?, days = ? WHERE member = ?",
+                                   (first_day, last_day, days, member))
+                    else:
+                        db.execute("DELETE FROM members WHERE member = ?", (member,))
+
+    def rebuild(self, rows):
+        """Replace every rollup with counts of ``rows`` (the whole log); returns the rows counted."""
+        with self._tx() as db:
+            for table in ("day_counts", "period_members", "period_unique", "members"):
+                db.execute(f"DELETE FROM {table}")
+            counted = sum(self._add(db, row) for row in rows)
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('built', '1')")
+        return counted
+
+    def backfill(self, rows):
+        """Build the rollups from ``rows`` once, the first time any process starts.
+
+        ``rows`` is only iterated when there is work to do. Returns the rows counted.
+        """
+        with self._tx() as db:
+            if db.execute("SELECT 1 FROM meta WHERE key = 'built'").fetchone():
+                return 0
+            counted = sum(self._add(db, row) for row in rows)
+            db.execute("INSERT INTO meta (key, value) VALUES ('built', '1')")
+        return counted
+
+    # --------------------- reports ---------------------
+
+    def summary(self, date_from, date_to, group="day", role=""):
+        """Attendance per day, week (starting Monday) or month, for every period
+        that overlaps date_from..date_to (YYYY-MM-DD).
+
+        Each period: checkins, checkouts, unique members, new (first ever
+        visit) and returning, plus check-ins by role, by method and by arrival
+        time. ``role`` limits everything to one role.
+        """
+        first = period_start(date.fromisoformat(date_from), group)
+        last = period_start(date.fromisoformat(date_to), group)
+        role_clause, role_params = "", []
+        if role:
+            role_clause, role_params = " AND lower(role) = ?", [role.lower()]
+        days = [str(first), str(period_end(last, group))] + role_params
+        db = self._connect()
+        periods = {}
+
+        def entry(start):
+            return periods.setdefault(start, {
+                "period": start, "checkins": 0, "checkouts": 0, "unique": 0, "new": 0, "returning": 0,
+                "by_role": {}, "by_method": {}, "arrivals": {},
+            })
+
+        for start, row_role, dimension, bucket, count in db.execute(
+                f"SELECT {PERIODS[group].format(col='day')} AS period, role, dimension, bucket, sum(count) "
+                f"FROM day_counts WHERE day BETWEEN ? AND ?{role_clause} "
+                "GROUP BY period, role, dimension, bucket", days):
+            data = entry(start)
+            if dimension in ("checkins", "checkouts"):
+                data[dimension] += count
+                if dimension == "checkins":
+                    data["by_role"][row_role] = data["by_role"].get(row_role, 0) + count
+            else:
+                totals = data["by_method" if dimension == "method" else "arrivals"]
+                totals[bucket] = totals.get(bucket, 0) + count
+
+        for start, unique in db.execute(
+                f"SELECT start, sum(count) FROM period_unique "
+                f"WHERE grain = ? AND start BETWEEN ? AND ?{role_clause} GROUP BY start",
+                [group, str(first), str(last)] + role_params):
+            entry(start)["unique"] = unique
+
+        for start, new in db.execute(
+                f"SELECT {PERIODS[group].format(col='first_day')} AS period, count(*) FROM members "
+                f"WHERE first_day BETWEEN ? AND ?{role_clause} GROUP BY period", days):
+            entry(start)["new"] = new
+
+        for data in periods.values():
+            data["returning"] = max(data["unique"] - data["new"], 0)
+            data["arrivals"] = dict(sorted(data["arrivals"].items()))
+        return [periods[start] for start in sorted(periods)]
+
+    def members(self, first_from="", first_to="", last_before="", role=""):
+        """Members by attendance history: first visit in a date range and/or not seen since a date.
+
+        Returns dicts with name, role, first_day, last_day and days, most recent first.
+        """
+        where, params = [], []
+        for clause, value in (("first_day >= ?", first_from), ("first_day <= ?", first_to),
+                              ("last_day < ?", last_before), ("lower(role) = ?", role.lower())):
+            if value:
+                where.append(clause)
+                params.append(value)
+        sql = "SELECT name, role, first_day, last_day, days FROM members"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        rows = self._connect().execute(sql + " ORDER BY last_day DESC, member", params)
+        return [dict(zip(("name", "role", "first_day", "last_day", "days"), row)) for row in rows]
+
+
+if __name__ == "__main__":
+    # Usage: python analytics.py rebuild
+    if sys.argv[1:] != ["rebuild"]:
+        print("Usage: python analytics.py rebuild")
+        sys.exit(1)
+
+    # Only the store and the rollups: no app startup (migrations, mailer, maintenance threads)
+    from data_config import ANALYTICS_PATH, open_store
+
+    store = open_store()
+    rows = AttendanceRollups(ANALYTICS_PATH).rebuild(row for _, row in store.iter_logs({}))
+    print(f"✅ Rebuilt attendance rollups in {ANALYTICS_PATH} from {rows} log rows")
@@ -1,21 +1,40 @@
 import sys
+
+if __name__ == "__main__":
+    # python app.py: hand straight over to serve.py (same options; see README "Running in
+    # production") before any startup below runs. Whichever process ends up serving - this
+    # one, or each gunicorn worker after the fork - imports this module once as "app".
+    import serve
+    serve.main(sys.argv[1:])
+    sys.exit()
+
 import urllib.parse
 import re
-from flask import Flask, render_template, request, redirect, session, url_for, jsonify, send_from_directory
-import csv, os, qrcode
+from flask import Flask, render_template, request, redirect, session, url_for, jsonify, Response, g
+import hmac
+import csv, io, json, os
+import sqlite3
+import zlib
 from datetime import datetime, timedelta
-import webbrowser
 import threading
-import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.image import MIMEImage
 from dateutil.relativedelta import relativedelta
-from pathlib import Path
-from collections import defaultdict
+from itertools import islice
 import time
-RECENT_CHECKINS = defaultdict(float)
-RESCAN_COOLDOWN_SECONDS = 8
+from storage import LOG_HEADER, MEMBER_ID, full_name_key
+from data_config import ANALYTICS_PATH, CHECKOUT_CSV, DATA_DIR, LOG_CSV, open_store
+from migrations import run_migrations
+from mailer import Mailer
+from qr_codes import QrCache, QrRegenJob
+from live_events import EventJournal
+from analytics import PERIODS, AttendanceRollups
+from scan_sync import SyncLedger
+from recent_scans import RecentScans
+from member_tokens import MemberTokens, new_member_id
+from metrics import METRICS
+from paging import LOG_SORTS, REGISTRATION_SORTS, decode_cursor, encode_cursor
 
 
 app = Flask(__name__)
@@ -28,14 +47,18 @@ if getattr(sys, 'frozen', False):
     app.template_folder = os.path.join(sys._MEIPASS, 'templates')
     app.static_folder = os.path.join(sys._MEIPASS, 'static')
 
-# Email configuration
-EMAIL_HOST = ""
-EMAIL_PORT = 587
-EMAIL_USER = ""
-EMAIL_PASS = ""
-
-def send_qr_email(recipient_email, name, qr_path):
-    """Send a beautiful HTML email with QR code attachment"""
+# Email configuration (EMAIL_USE_TLS=0 for a local debugging SMTP server)
+EMAIL_HOST = os.getenv("EMAIL_HOST", "")
+EMAIL_PORT = int(os.getenv("EMAIL_PORT", "587"))
+EMAIL_USER = os.getenv("EMAIL_USER", "")
+EMAIL_PASS = os.getenv("EMAIL_PASS", "")
+EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "1") != "0"
+
+def send_qr_email(recipient_email, name, qr_png, filename):
+    """Queue a beautiful HTML email with QR code attachment; returns True if queued"""
+    if not EMAIL_HOST:
+        print(f"⚠️ Email not configured; not sending QR to {recipient_email}")
+        return False
     try:
         msg = MIMEMultipart("alternative")
         msg["From"] = EMAIL_USER
@@ -60,159 +83,297 @@ def send_qr_email(recipient_email, name, qr_path):
         msg.attach(MIMEText(html_body, "html"))
 
         # Attach QR code image
-        with open(qr_path, "rb") as f:
-            img = MIMEImage(f.read())
-            img.add_header("Content-Disposition", "attachment", filename=os.path.basename(qr_path))
-            msg.attach(img)
-
-        # Send email
-        with smtplib.SMTP(EMAIL_HOST, EMAIL_PORT) as server:
-            server.starttls()
-            server.login(EMAIL_USER, EMAIL_PASS)
-            server.sendmail(EMAIL_USER, recipient_email, msg.as_string())
+        img = MIMEImage(qr_png, "png")
+        img.add_header("Content-Disposition", "attachment", filename=filename)
+        msg.attach(img)
 
-        print(f"✅ Beautiful HTML email sent to {recipient_email}")
+        # Hand over to the background mailer (delivery + retries happen off-request)
+        MAILER.enqueue(recipient_email, msg)
+        return True
 
     except Exception as e:
-        print(f"❌ Error sending email to {recipient_email}: {e}")
+        print(f"❌ Error queueing email to {recipient_email}: {e}")
+        return False
 
 
-# Path configuration
-if getattr(sys, 'frozen', False):
-    BASE_DIR = sys._MEIPASS
-    APP_DIR = os.path.dirname(sys.executable)
-else:
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    APP_DIR = BASE_DIR
+# Data paths and the storage engine (STORAGE_BACKEND=csv|sqlite) are set in data_config.py
+STORE = open_store()
+
+# Bring data written by older versions up to the current layout, once, before
+# anything reads it; request handlers can then rely on every column being there.
+run_migrations(STORE, legacy_logs=(LOG_CSV, CHECKOUT_CSV))
+
+# Daily attendance rollups for reports (data/analytics.db, see data_config.py).
+# Built from the existing log the first time; python analytics.py rebuild starts them over.
+ROLLUPS = AttendanceRollups(ANALYTICS_PATH)
+if ROLLUPS.backfill(row for _, row in STORE.iter_logs({})):
+    print(f"✅ Built attendance rollups in {ANALYTICS_PATH} from the existing log")
+
+# QR codes carry a signed member token; changing QR_SECRET invalidates printed codes
+MEMBER_TOKENS = MemberTokens(os.getenv("QR_SECRET", app.secret_key))
+
+# QR images are rendered on demand (/qr/<member>) and kept in a bounded LRU
+QR_CACHE = QrCache(max_items=int(os.getenv("QR_CACHE_SIZE", "512")))
+QR_REGEN = QrRegenJob(QR_CACHE, status_path=DATA_DIR / "qr-regen.json")  # one run at a time across workers
+
+# Outgoing mail: persisted in data/outbox/ and delivered over one reused SMTP connection
+MAILER = Mailer(DATA_DIR / "outbox", EMAIL_HOST, EMAIL_PORT, EMAIL_USER, EMAIL_PASS,
+                use_tls=EMAIL_USE_TLS).start()
+
+# Check-in/out deltas for live dashboards (/events), shared across worker processes
+LIVE_EVENTS = EventJournal(DATA_DIR / "live-events.ndjson")
+
+# Under serve.py with several worker processes, /metrics adds up every worker's numbers
+if os.getenv("METRICS_SHARE_DIR"):
+    METRICS.share(os.getenv("METRICS_SHARE_DIR"))
+
+# Repeat reads of the same badge within the cooldown are answered before any lookup
+RESCAN_COOLDOWN_SECONDS = int(os.getenv("RESCAN_COOLDOWN_SECONDS", "8"))
+RECENT_SCANS = RecentScans(DATA_DIR / ".recent-scans", cooldown=RESCAN_COOLDOWN_SECONDS)
 
-DATA_DIR = Path(APP_DIR) / "data"
-QR_FOLDER = Path(APP_DIR) / "static" / "qrcodes"
-REG_CSV = DATA_DIR / "registrations.csv"
-LOG_CSV = DATA_DIR / "logs.csv"
+# Idempotency keys of offline scans already applied by /api/scan/sync
+SYNC_LEDGER = SyncLedger(DATA_DIR / "scan-sync.ndjson")
 
-os.makedirs(DATA_DIR, exist_ok=True)
-os.makedirs(QR_FOLDER, exist_ok=True)
+# Background housekeeping (CSV: fold checkout events into their day's partition when idle)
+STORE.start_maintenance(idle_seconds=int(os.getenv("COMPACT_IDLE_SECONDS", "300")))
 
 # --------------------- UTILS ---------------------
 
 def get_registered_parents():
-    parents = set()
-    if not os.path.exists(REG_CSV):
-        return []
-    
-    with open(REG_CSV, newline="") as f:
-        for row in csv.reader(f):
-            if len(row) < 10: continue
-            if row[5] in ["Parent", "Adult"]:
-                parents.add(f"{row[0]} {row[1]}")
-    return sorted(list(parents))
+    return sorted(set(STORE.names_with_role("Parent", "Adult")))
 
 def normalize_name(name):
     return " ".join(part.capitalize() for part in name.strip().split())
 
+MEMBER_TOKEN_PATH = re.compile(r"/M/([A-Za-z2-7]{8}-[A-Za-z2-7]{8})")
+
+def member_qr_url(base_url, reg):
+    """Check-in URL encoded in a member's QR code: HTTP://HOST/M/<signed member token>.
+
+    Scheme and host are upper-cased (both are case-insensitive) so the whole
+    URL fits QR alphanumeric mode. Rows without a Member ID fall back to the
+    old first|last|role link.
+    """
+    if len(reg) > MEMBER_ID and reg[MEMBER_ID].strip():
+        parts = urllib.parse.urlsplit(base_url)
+        host = f"{parts.scheme.upper()}://{parts.netloc.upper()}{parts.path}"
+        return f"{host}/M/{MEMBER_TOKENS.sign(reg[MEMBER_ID].strip())}"
+    role_clean = reg[5].split(',')[0]  # Remove any extra parameters
+    qr_data = f"{reg[0]}|{reg[1]}|{role_clean}"
+    return f"{base_url}/check-in?data={urllib.parse.quote(qr_data)}"
+
+def scanned_member(raw):
+    """(name, role, code) for a scanned QR payload, or an error message string.
+
+    Member tokens (bare, or as an /M/<token> URL) resolve with one key lookup
+    and follow the member through name changes. ``code`` is what to pass on as
+    ?data= when bouncing between check-in and check-out. Old first|last|role
+    codes still work, including Google/Lens wrapper URLs and double encoding.
+    """
+    qr_data = urllib.parse.unquote(raw or "").strip()
+    match = MEMBER_TOKEN_PATH.search(qr_data)
+    member_id = MEMBER_TOKENS.verify(match.group(1) if match else qr_data)
+    if member_id:
+        reg = STORE.find_member(member_id)
+        if not reg:
+            return "❌ Member not found."
+        return normalize_name(f"{reg[0]} {reg[1]}"), reg[5].split(",")[0].strip(), MEMBER_TOKENS.sign(member_id)
+
+    # Legacy first|last|role. If a scanner handed us a full URL, peel ?data=...
+    if qr_data.lower().startswith("http"):
+        try:
+            u = urllib.parse.urlparse(qr_data)
+            qs = urllib.parse.parse_qs(u.query)
+            if "data" in qs and qs["data"]:
+                qr_data = qs["data"][0]
+        except Exception:
+            pass
+
+    # If it still contains 'data=' without pipes, strip it and decode again
+    if "data=" in qr_data and "|" not in qr_data:
+        qr_data = qr_data.split("data=", 1)[1]
+    qr_data = urllib.parse.unquote(qr_data)
+
+    if not qr_data:
+        return "❌ Invalid QR scan."
+
+    try:
+        parts = qr_data.split("|")
+        if len(parts) < 3:
+            return "❌ Malformed QR code. Expected first|last|role format."
+        first = parts[0].strip()
+        last  = parts[1].strip()
+        role  = parts[2].split(",")[0].strip()
+        return normalize_name(f"{first} {last}"), role, qr_data
+    except Exception as e:
+        return f"❌ Error parsing QR code: {str(e)}"
+
+def checkin_rows(name, role, children, method="QR", at=None):
+    """Log rows for checking in a scanned member, plus a parent's chosen children."""
+    timestamp = at or datetime.now()
+    date_str = str(timestamp.date())
+    time_str = timestamp.strftime("%H:%M:%S")
+    if role.lower() == "parent":
+        return [[name, "Parent", date_str, time_str, "", method, name]] + [
+            [child, "Child", date_str, time_str, "", method, name] for child in children]
+    if role.lower() == "child":
+        reg = STORE.find_registration(name)
+        parent_name = reg[9].strip() if reg and len(reg) > 9 else ""
+        return [[name, "Child", date_str, time_str, "", method, parent_name]]
+    return [[name, "Adult", date_str, time_str, "", method, ""]]
+
+def family_of(name, role):
+    """The scanned member followed by, for a parent, the minors on their registration."""
+    return [name] + (get_minor_children(name) if role.lower() == "parent" else [])
+
+def family_status(name, role):
+    """[(member, checked in today?)] for family_of(), from one lookup of today's check-ins."""
+    open_now = set(STORE.checked_in_names())
+    return [(member, full_name_key(member) in open_now) for member in family_of(name, role)]
+
+def checkout_family(name, role):
+    """Who a scan can check out: the member and, for a parent, their minors - if checked in today."""
+    return [member for member, checked_in in family_status(name, role) if checked_in]
+
+def family_check_in(name, role, children, method="QR", at=None):
+    """Check a member in with their chosen children as one store write.
+
+    Only a parent's own minors are taken from ``children``. ``at`` backdates
+    the check-in (offline scans). Returns (time, [(member, status)]), status
+    "checked_in" or "already_checked_in" (e.g. brought in earlier by the
+    other parent).
+    """
+    wanted = {full_name_key(c) for c in children}
+    rows = checkin_rows(name, role, [c for c in family_of(name, role)[1:] if full_name_key(c) in wanted],
+                        method, at)
+    results = STORE.check_in_family(rows)
+    publish_checkins("check_in", [(index, row) for index, row in results if index is not None])
+    return rows[0][3], [(row[0], "checked_in" if index is not None else "already_checked_in")
+                        for index, row in results]
+
+def family_check_out(name, role, members, at=None):
+    """Check out the chosen members of the scanned member's family as one store write.
+
+    Names outside the family are ignored; no choice means the scanned member.
+    Returns (time, [(member, status)]), status "checked_out" or "not_checked_in".
+    """
+    wanted = {full_name_key(m) for m in members or [name]}
+    chosen = [m for m in family_of(name, role) if full_name_key(m) in wanted]
+    now = at or datetime.now()
+    time_str = now.strftime("%H:%M:%S")
+    closed = STORE.check_out(chosen, str(now.date()), time_str) if chosen else []
+    publish_checkouts("check_out", closed)
+    closed_names = {full_name_key(row[0]) for row in closed}
+    return time_str, [(m, "checked_out" if full_name_key(m) in closed_names else "not_checked_in")
+                      for m in chosen]
+
+def scan_key(raw):
+    """Who a QR payload is for, without reading any data: a token's member id, else the old code's name."""
+    match = MEMBER_TOKEN_PATH.search(urllib.parse.unquote(raw or ""))
+    member_id = MEMBER_TOKENS.verify(match.group(1) if match else urllib.parse.unquote(raw or ""))
+    if member_id:
+        return f"id:{member_id}"
+    scanned = scanned_member(raw)  # the first|last|role parser never touches the store
+    return f"name:{full_name_key(scanned[0])}" if isinstance(scanned, tuple) else f"raw:{raw}"
+
+def recently_scanned(raw):
+    """Debounce: True (and counted) for a repeat read of a badge inside RESCAN_COOLDOWN_SECONDS."""
+    if RECENT_SCANS.seen(scan_key(raw)):
+        METRICS.inc("attendance_rescans_suppressed_total")
+        return True
+    return False
+
+RESCAN_MESSAGE = "⚠️ This badge was just scanned. Please wait a few seconds."
+
+def member_qr_filename(reg):
+    return f"{reg[0]}_{reg[1]}.png"
+
+def send_member_qr(reg, base_url):
+    """Email a member their QR, rendered from the registration record."""
+    return send_qr_email(reg[2], f"{reg[0]} {reg[1]}",
+                         QR_CACHE.png(member_qr_url(base_url, reg)), member_qr_filename(reg))
+
 def name_has_number(name):
     return any(char.isdigit() for char in name)
 
 def already_registered(full_name):
-    if not os.path.exists(REG_CSV): return False
-    with open(REG_CSV, newline="") as f:
-        return any(f"{row[0]} {row[1]}".lower() == full_name.lower() 
-                  for row in csv.reader(f) if len(row) >= 2)
+    return STORE.find_registration(full_name) is not None
 
-# Replace with this:
 def is_checked_in(name):
-    """Check if a specific person is checked in (not based on children)."""
-    if not os.path.exists(LOG_CSV):
-        return False
-
-    today = str(datetime.now().date())
-    with open(LOG_CSV, newline="") as f:
-        for row in csv.reader(f):
-            if len(row) >= 5:
-                log_name = row[0].strip().lower()
-                log_date = row[2].strip() if len(row) > 2 else ""
-                checkout_time = row[4].strip()
-
-                # Match name and date, and ensure no checkout time
-                if log_name == name.strip().lower() and log_date == today and checkout_time == "":
-                    return True
-
-    return False
+    """Check if a specific person is checked in today (not based on children)."""
+    return STORE.is_checked_in(name)
 
 
 def get_registered_children(parent_name):
-    children = []
-    if not os.path.exists(REG_CSV): return children
-    with open(REG_CSV, newline="") as f:
-        for row in csv.reader(f):
-            if len(row) < 10: continue
-            if row[9].lower() == parent_name.lower() and row[5] == "Child":
-                children.append(f"{row[0]} {row[1]}")
-    return children
+    return STORE.children_of(parent_name)
 
 def calculate_age(birth_date):
     today = datetime.today().date()
     return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
 
 def get_minor_children(parent_name):
-    children = []
-    if not os.path.exists(REG_CSV):
-        return children
-
-    parent_name = parent_name.strip().lower()
-
-    with open(REG_CSV, newline="") as f:
-        reader = csv.reader(f)
-        for row in reader:
-            if len(row) > 6:
-                role = row[5].strip().lower()
-                full_name = f"{row[0].strip()} {row[1].strip()}".lower()
-
-                # CASE 1: If parent row contains children in the children column
-                if role == "parent" and full_name == parent_name and row[6].strip():
-                    children = [c.strip() for c in row[6].split(",") if c.strip()]
-                    return children  # Return immediately if found
-
-    return children
+    # Children listed in the Children column of the parent's own row
+    return STORE.minors_listed_by(parent_name)
 
 
 def is_minor(full_name):
-    if not os.path.exists(REG_CSV): return False
-    with open(REG_CSV, newline="") as f:
-        for row in csv.reader(f):
-            if len(row) < 9: continue
-            if f"{row[0]} {row[1]}".lower() == full_name.lower():
-                return row[8] == "1"  # Just use the minor flag
-    return False
+    row = STORE.find_registration(full_name)
+    return bool(row) and len(row) > 8 and row[8] == "1"  # Just use the minor flag
 
 def get_checked_in_names():
-    """Get names that are checked in but not checked out"""
-    names = []
-    if not os.path.exists(LOG_CSV): return names
-    with open(LOG_CSV, newline="") as f:
-        for row in csv.reader(f):
-            if len(row) >= 5 and not row[4]:  # No checkout time
-                names.append(row[0].lower())
-    return names
+    """Get names (lowercase) checked in today but not checked out"""
+    return STORE.checked_in_names()
 
 def email_exists(email):
-    if not os.path.exists(REG_CSV): return False
-    with open(REG_CSV, newline="") as f:
-        return any(len(row) > 2 and row[2].lower() == email.lower() 
-                  for row in csv.reader(f))
+    return STORE.email_exists(email)
 
 def phone_exists(phone):
-    if not os.path.exists(REG_CSV): return False
-    with open(REG_CSV, newline="") as f:
-        return any(len(row) > 3 and row[3] == phone for row in csv.reader(f))
+    return STORE.phone_exists(phone)
 
 def parent_exists(full_name):
-    if not os.path.exists(REG_CSV): return False
-    with open(REG_CSV, newline="") as f:
-        for row in csv.reader(f):
-            if len(row) > 5 and f"{row[0]} {row[1]}".lower() == full_name.lower():
-                return row[5] in ["Parent", "Adult"]
-    return False
+    row = STORE.find_registration(full_name)
+    return bool(row) and len(row) > 5 and row[5] in ["Parent", "Adult"]
+
+# --------------------- INSTRUMENTATION ---------------------
+
+# Optional bearer token so a Prometheus scraper can read /metrics without an admin session
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+def request_route():
+    """Route pattern (e.g. /qr/<path:member>) so labels don't grow with every URL."""
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+def record_request(status):
+    started = g.pop("request_started", None)
+    if started is None:
+        return
+    route, method = request_route(), request.method
+    METRICS.observe("attendance_http_request_duration_seconds", time.perf_counter() - started,
+                    route=route, method=method)
+    METRICS.inc("attendance_http_requests_total", route=route, method=method, status=str(status))
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def finish_request_timer(response):
+    record_request(response.status_code)
+    return response
+
+@app.teardown_request
+def record_failed_request(error):
+    if error is not None:
+        record_request(500)  # unhandled exception; after_request never ran
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus scrape endpoint (admin session or METRICS_TOKEN bearer token)."""
+    token = request.headers.get("Authorization", "")
+    if not session.get("authenticated") and not (
+            METRICS_TOKEN and hmac.compare_digest(token.encode(), f"Bearer {METRICS_TOKEN}".encode())):
+        return "❌ Unauthorized", 401
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
 
 # --------------------- ROUTES ---------------------
 @app.route("/")
@@ -287,64 +448,229 @@ def register():
                     return f"❌ Child name '{c}' contains invalid character '|'"
                 child_list.append(c)
 
-        # Generate QR code
-        qr_data = f"{first}|{last}|{role}"
         base_url = request.host_url.rstrip('/')
-        qr_url = f"{base_url}/check-in?data={urllib.parse.quote(qr_data)}"
-        qr_filename = f"{first}_{last}.png"
-        qr_path = QR_FOLDER / qr_filename
-        qrcode.make(qr_url).save(str(qr_path))
-
-        # Ensure CSV header exists and includes "Date of Birth" as LAST column
-        if os.path.exists(REG_CSV):
-            with open(REG_CSV, newline="") as f:
-                rows = list(csv.reader(f))
-            if rows:
-                header = rows[0]
-                if header and header[0] == "First Name" and "Date of Birth" not in header:
-                    header.append("Date of Birth")
-                    # pad existing rows
-                    for i in range(1, len(rows)):
-                        rows[i].append("")
-                    with open(REG_CSV, "w", newline="") as f:
-                        csv.writer(f).writerows(rows)
-        else:
-            with open(REG_CSV, "w", newline="") as f:
-                csv.writer(f).writerow([
-                    "First Name","Last Name","Email","Phone","Gender",
-                    "Role","Children","QR Link","Minor","Parent Name","Address",
-                    "Date of Birth"  # NEW last column
-                ])
-
-        # Write to CSV (append Date of Birth as last field)
-        with open(REG_CSV, "a", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                first,
-                last,
-                email,
-                phone,
-                gender,
-                role,
-                ", ".join(child_list),  # children
-                qr_url,
-                "1" if role == "Child" else "0",
-                parent_name,
-                address,
-                date_of_birth  # NEW last column
-            ])
+
+        # Save registration (Date of Birth as last field)
+        reg = [
+            first,
+            last,
+            email,
+            phone,
+            gender,
+            role,
+            ", ".join(child_list),  # children
+            "",  # QR link, filled in below from the member token
+            "1" if role == "Child" else "0",
+            parent_name,
+            address,
+            date_of_birth,
+            new_member_id(),
+        ]
+        # QR check-in link (the image itself is rendered on demand by /qr/<member>)
+        reg[7] = member_qr_url(base_url, reg)
+        STORE.add_registration(reg)
 
         # Send QR (best-effort)
         if email:
             try:
-                send_qr_email(email, full_name, str(qr_path))
+                send_member_qr(reg, base_url)
             except Exception as e:
                 print(f"Error sending email: {e}")
 
-        return render_template("qrcode.html", name=full_name, qr_url=f"/static/qrcodes/{qr_filename}")
+        session["registered_member"] = reg[MEMBER_ID]  # lets this browser show the new member's QR
+        return render_template("qrcode.html", name=full_name, qr_url=url_for("member_qr", member=full_name))
 
     return render_template("register.html", registered_parents=registered_parents)
 
+# --------------------- BULK IMPORT ---------------------
+
+# Upload column (case-insensitive) -> field; only the first three are required
+IMPORT_COLUMNS = {
+    "first name": "first", "last name": "last", "role": "role",
+    "email": "email", "phone": "phone", "gender": "gender", "children": "children",
+    "parent": "parents", "parents": "parents", "parent name": "parents",
+    "address": "address", "date of birth": "date_of_birth",
+}
+IMPORT_ROLES = {"parent": "Parent", "child": "Child", "adult": "Adult"}
+
+def name_problem(name):
+    """Why a name can't be used (same rules as /register), or None."""
+    if name_has_number(name):
+        return f"'{name}' contains a number."
+    if "|" in name:
+        return f"'{name}' contains the '|' character."
+    return None
+
+def plan_registration_import(records, roster, base_url):
+    """Validate uploaded rows in one pass; returns (registration rows to add, report).
+
+    ``records`` yields (line number, {field: value}). Each row's own fields are
+    checked first. Names, emails and phones are then checked against hash sets
+    of the roster and of the rows accepted so far, and reserved only by a row
+    that passes everything. A child's parents may be on the roster or anywhere
+    in the upload, so adults and parents are decided before children; a Parent
+    row in the upload also gets its children from the upload added to its
+    Children column. The report has one entry per row: line, name, ok and message.
+    """
+    names, emails, phones, parents = {}, set(), set(), {}
+    for row in roster:
+        if len(row) < 6 or row[0].strip() == "First Name":
+            continue
+        key = full_name_key(f"{row[0]} {row[1]}")
+        names[key] = "the roster"
+        emails.add(row[2].strip().lower())
+        phones.add(row[3].strip())
+        if row[5].strip() in ("Parent", "Adult"):
+            parents.setdefault(key, f"{row[0].strip()} {row[1].strip()}")
+    emails.discard("")
+    phones.discard("")
+
+    candidates, report = [], []
+    for line, record in records:
+        first = normalize_name(record.get("first") or "")
+        last = normalize_name(record.get("last") or "")
+        full_name = f"{first} {last}".strip()
+        entry = {"line": line, "name": full_name, "ok": False, "message": ""}
+        report.append(entry)
+        email = (record.get("email") or "").strip().lower()
+        phone = (record.get("phone") or "").strip()
+        role = IMPORT_ROLES.get((record.get("role") or "").strip().lower())
+        children = [normalize_name(c) for c in (record.get("children") or "").split(",") if c.strip()]
+        parent_names = [normalize_name(p) for p in (record.get("parents") or "").split(",") if p.strip()]
+
+        if not first or not last:
+            entry["message"] = "❌ First and last name are required."
+        elif name_problem(first) or name_problem(last):
+            entry["message"] = f"❌ Name {name_problem(first) or name_problem(last)}"
+        elif role is None:
+            entry["message"] = "❌ Role must be Parent, Child or Adult."
+        elif role == "Child" and children:
+            entry["message"] = "❌ Children cannot register children under their name."
+        elif role == "Child" and not 1 <= len(parent_names) <= 2:
+            entry["message"] = "❌ A child needs one or two parents/guardians."
+        elif role == "Parent" and any(name_problem(c) for c in children):
+            entry["message"] = f"❌ Child name {next(name_problem(c) for c in children if name_problem(c))}"
+        if entry["message"]:
+            continue
+
+        reg = [
+            first, last, email, phone, (record.get("gender") or "").strip() or "Other", role,
+            ", ".join(children) if role == "Parent" else "",
+            "",  # QR link, filled in once the row is accepted
+            "1" if role == "Child" else "0",
+            full_name if role == "Parent" else "",
+            (record.get("address") or "").strip() if role == "Adult" else "",
+            (record.get("date_of_birth") or "").strip(),
+            new_member_id(),
+        ]
+        candidates.append((entry, reg, parent_names))
+
+    # Adults and parents first (file order within each group), so a child can link to one further down
+    accepted, listed = [], {}
+    for entry, reg, parent_names in sorted(candidates, key=lambda c: c[1][5] == "Child"):
+        key, email, phone = full_name_key(f"{reg[0]} {reg[1]}"), reg[2], reg[3]
+        missing = [p for p in parent_names if full_name_key(p) not in parents]
+        if reg[5] == "Child" and missing:
+            entry["message"] = f"❌ Parent '{missing[0]}' is not registered or in this file."
+        elif key in names:
+            entry["message"] = f"❌ Already registered ({names[key]})."
+        elif email and email in emails:
+            entry["message"] = "❌ This email is already registered."
+        elif phone and phone in phones:
+            entry["message"] = "❌ This phone number is already registered."
+        if entry["message"]:
+            continue
+
+        # Passed every check: only now does the row claim its name, email and phone
+        names[key] = f"line {entry['line']}"
+        emails.add(email)
+        phones.add(phone)
+        if reg[5] == "Parent":
+            listed[key] = reg
+        if reg[5] in ("Parent", "Adult"):
+            parents.setdefault(key, f"{reg[0]} {reg[1]}")
+        if reg[5] == "Child":
+            reg[9] = ", ".join(parents[full_name_key(p)] for p in parent_names)
+            child = f"{reg[0]} {reg[1]}"
+            for p in parent_names:
+                parent_reg = listed.get(full_name_key(p))
+                if parent_reg is not None and key not in {full_name_key(c) for c in parent_reg[6].split(",")}:
+                    parent_reg[6] = ", ".join(filter(None, [parent_reg[6], child]))
+        entry["ok"], entry["message"] = True, "✅ Added"
+        accepted.append((entry["line"], reg))
+
+    regs = [reg for _, reg in sorted(accepted, key=lambda a: a[0])]  # saved in file order
+    for reg in regs:
+        reg[7] = member_qr_url(base_url, reg)
+    return regs, report
+
+def send_import_emails(regs, base_url):
+    """Background: render and queue each imported member's QR email (the outbox delivers them)."""
+    for reg in regs:
+        if reg[2]:
+            try:
+                send_member_qr(reg, base_url)
+            except Exception as e:
+                print(f"❌ Error sending QR to {reg[2]}: {e}")
+
+@app.route("/import-registrations", methods=["GET", "POST"])
+def import_registrations():
+    """Admin bulk registration from a CSV upload, with a per-row report."""
+    if not session.get("authenticated"):
+        return redirect("/admin-login")
+    if request.method == "GET":
+        return render_template("import_registrations.html")
+
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        return render_template("import_registrations.html", error="❌ Choose a CSV file to import.")
+    reader = csv.reader(io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline=""))
+    base_url = request.host_url.rstrip('/')
+    try:
+        header = [IMPORT_COLUMNS.get(cell.strip().lower()) for cell in next(reader, [])]
+        if {"first", "last", "role"} - set(header):
+            return render_template("import_registrations.html",
+                                   error="❌ The file needs First Name, Last Name and Role columns.")
+        records = ((reader.line_num, {field: value for field, value in zip(header, row) if field})
+                   for row in reader if any(cell.strip() for cell in row))
+        regs, report = plan_registration_import(records, STORE.registration_rows(), base_url)
+    except UnicodeDecodeError:
+        return render_template("import_registrations.html", error="❌ The file must be UTF-8 CSV.")
+    if regs:
+        STORE.add_registrations(regs)
+        # QR images and emails happen off-request; the rows are already saved
+        threading.Thread(target=send_import_emails, args=(regs, base_url),
+                         name="import-mail", daemon=True).start()
+    return render_template("import_registrations.html", report=report, added=len(regs),
+                           failed=len(report) - len(regs))
+
+def qr_authorized(reg):
+    """A QR carries the member's signed token: admins and scanner stations may see any,
+    the browser that just registered a member only theirs."""
+    if scanner_authorized():
+        return True
+    own = session.get("registered_member")
+    return bool(own and reg and len(reg) > MEMBER_ID and reg[MEMBER_ID] == own)
+
+@app.route("/qr/<path:member>")
+def member_qr(member):
+    """A member's check-in QR as PNG, rendered from their registration record."""
+    reg = STORE.find_registration(member)
+    if not qr_authorized(reg):
+        return "❌ Admin login required.", 401  # whether or not the member exists
+    if not reg or len(reg) < 8:
+        return "❌ Member not found.", 404
+
+    payload = member_qr_url(request.host_url.rstrip('/'), reg)
+    etag = QR_CACHE.etag(payload)
+    if etag in request.if_none_match:
+        response = Response(status=304)  # scanner/browser copy is still current
+    else:
+        response = Response(QR_CACHE.png(payload), mimetype="image/png")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"  # always revalidate; the ETag makes that cheap
+    return response
+
 # app.py
 @app.route("/scan")
 def scan():
@@ -352,48 +678,25 @@ def scan():
 
 
 @app.route("/check-in", methods=["GET", "POST"])
-def check_in():
-    # --- robust QR parsing ---
-    raw = request.args.get("data", "") or ""
-    qr_data = urllib.parse.unquote(raw)
-
-    # If scanner handed us a full URL (e.g., Google/Lens wrapper), peel ?data=...
-    if qr_data.startswith("http"):
-        try:
-            u = urllib.parse.urlparse(qr_data)
-            qs = urllib.parse.parse_qs(u.query)
-            if "data" in qs and qs["data"]:
-                qr_data = qs["data"][0]
-        except Exception:
-            pass
-
-    # If it still contains 'data=' without pipes, strip it and decode again
-    if "data=" in qr_data and "|" not in qr_data:
-        qr_data = qr_data.split("data=", 1)[1]
-    qr_data = urllib.parse.unquote(qr_data)
-
-    if not qr_data:
-        return "❌ Invalid QR scan."
-
-    # Parse parts
-    try:
-        parts = qr_data.split("|")
-        if len(parts) < 3:
-            return "❌ Malformed QR code. Expected first|last|role format."
-        first = parts[0].strip()
-        last  = parts[1].strip()
-        role  = parts[2].split(",")[0].strip()
-        name  = normalize_name(f"{first} {last}")
-    except Exception as e:
-        return f"❌ Error parsing QR code: {str(e)}"
+@app.route("/M/<token>", methods=["GET", "POST"])  # QR codes opened straight from a phone camera
+def check_in(token=None):
+    raw = token or request.args.get("data", "")
+    # A camera that reads the same badge again shouldn't land on the check-out page
+    if request.method == "GET" and recently_scanned(raw):
+        return RESCAN_MESSAGE, 429
+    scanned = scanned_member(raw)
+    if isinstance(scanned, str):
+        return scanned
+    name, role, qr_data = scanned
 
     # If already checked in, bounce to checkout using the CLEANED qr_data
-    if is_checked_in(name):
+    family = family_status(name, role)
+    if family[0][1]:
         return redirect(url_for("check_out", data=urllib.parse.quote(qr_data)))
 
     # Handle children if parent
-    minor_children = get_minor_children(name) if role.lower() == "parent" else []
-    unscanned_minors = [c for c in minor_children if not is_checked_in(c)]
+    minor_children = [child for child, _ in family[1:]]
+    unscanned_minors = [child for child, checked_in in family[1:] if not checked_in]
 
     # GET → show form
     if request.method == "GET":
@@ -406,98 +709,27 @@ def check_in():
             is_checked_in=False
         )
 
-    # POST → process check-in
-    timestamp   = datetime.now()
-    date_str    = str(timestamp.date())
-    time_str    = timestamp.strftime("%H:%M:%S")
-    checkin_by  = "QR"
-    selected_children = []
-
-    # Ensure log header
-    if not os.path.exists(LOG_CSV):
-        with open(LOG_CSV, "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow(["Name", "Role", "Date", "CheckIn", "CheckOut", "Method", "Parent"])
-
-    with open(LOG_CSV, "a", newline="") as f:
-        writer = csv.writer(f)
-
-        if role.lower() == "parent":
-            selected_children = request.form.getlist("children")
-            no_kids = "no_kids" in request.form
-            # Parent row
-            writer.writerow([name, "Parent", date_str, time_str, "", checkin_by, name])
-            # Children rows
-            if not no_kids:
-                for child in selected_children:
-                    if not is_checked_in(child):
-                        writer.writerow([child, "Child", date_str, time_str, "", checkin_by, name])
-
-        elif role.lower() == "child":
-            parent_name = ""
-            if os.path.exists(REG_CSV):
-                with open(REG_CSV, newline="") as reg_file:
-                    for row in csv.reader(reg_file):
-                        if len(row) > 9 and f"{row[0]} {row[1]}".strip().lower() == name.lower():
-                            parent_name = row[9].strip() if row[9] else ""
-                            break
-            writer.writerow([name, "Child", date_str, time_str, "", checkin_by, parent_name])
-
-        else:
-            writer.writerow([name, "Adult", date_str, time_str, "", checkin_by, ""])
+    # POST → one write for the whole family; anyone already in (e.g. via the other parent) is skipped
+    selected_children = [] if "no_kids" in request.form else request.form.getlist("children")
+    time_str, results = family_check_in(name, role, selected_children)
 
     # Success page → auto-returns to /scan
     return render_template(
         "checkin_success.html",
         name=name,
         time=time_str,
-        children=selected_children
+        children=[member for member, status in results[1:] if status == "checked_in"]
     )
 
 @app.route("/check-out", methods=["GET", "POST"])
 def check_out():
-    # --- robust QR parsing (handles Google/Lens wrappers, double-encoding, stray data=) ---
-    raw = request.args.get("data", "") or ""
-    qr_data = urllib.parse.unquote(raw)
-
-    if qr_data.startswith("http"):
-        try:
-            u = urllib.parse.urlparse(qr_data)
-            qs = urllib.parse.parse_qs(u.query)
-            if "data" in qs and qs["data"]:
-                qr_data = qs["data"][0]
-        except Exception:
-            pass
-
-    if "data=" in qr_data and "|" not in qr_data:
-        qr_data = qr_data.split("data=", 1)[1]
-    qr_data = urllib.parse.unquote(qr_data)
-
-    if not qr_data:
-        return "❌ Invalid QR scan."
-
-    # Parse parts
-    try:
-        parts = qr_data.split("|")
-        if len(parts) < 3:
-            return "❌ Malformed QR code."
-        first = parts[0].strip()
-        last  = parts[1].strip()
-        role  = parts[2].split(",")[0].strip()
-        name  = normalize_name(f"{first} {last}")
-    except Exception as e:
-        return f"❌ Error parsing QR code: {str(e)}"
+    scanned = scanned_member(request.args.get("data", ""))
+    if isinstance(scanned, str):
+        return scanned
+    name, role, qr_data = scanned
 
     # Build checkout list (only include members who are actually checked in)
-    checkout_list = []
-    if is_checked_in(name):
-        checkout_list.append(name)
-
-    if role.lower() == "parent":
-        children = get_minor_children(name)
-        for c in children:
-            if is_checked_in(c):
-                checkout_list.append(c)
+    checkout_list = checkout_family(name, role)
 
     # If nobody is actually checked in, tell user immediately
     if request.method == "GET":
@@ -505,104 +737,179 @@ def check_out():
             return "❌ No active check-in found for this family today."
         return render_template("check_out.html", name=name, checkout_list=checkout_list)
 
-    # POST → process checkout
-    selected_members = [normalize_name(m) for m in request.form.getlist("members")]
-    if not selected_members:
-        # fallback: if user didn’t tick anything, try to check out the scanned person
-        selected_members = [name]
-
-    if not os.path.exists(LOG_CSV):
+    # POST → close today's open rows for the selected members in one write
+    time_str, results = family_check_out(name, role, request.form.getlist("members"))
+    checked_out = [member for member, status in results if status == "checked_out"]
+    if not checked_out:
         return "❌ No active check-in found."
 
-    from datetime import datetime
-    today = str(datetime.now().date())
-    timestamp = datetime.now().strftime("%H:%M:%S")
-
-    # Read logs and preserve header
-    with open(LOG_CSV, newline="") as f:
-        rows = list(csv.reader(f))
-
-    header = []
-    data = rows
-    if rows and rows[0] and rows[0][0] == "Name":
-        header, data = rows[0], rows[1:]
-
-    found_any = False
-    for row in data:
-        if len(row) < 5:
-            continue
-        log_name = normalize_name(row[0])
-        log_date = (row[2] or "").strip()
-        checkout_time = (row[4] or "").strip()
-
-        if (log_name in selected_members) and (log_date == today) and (checkout_time == ""):
-            row[4] = timestamp
-            found_any = True
-
-    if not found_any:
-        return "❌ No active check-in found."
-
-    # Write back with header intact
-    out = [header] + data if header else data
-    with open(LOG_CSV, "w", newline="") as f:
-        csv.writer(f).writerows(out)
-
     # Success page (optionally show who got checked out)
-    checked_children = [m for m in selected_members if m != name]
-    return render_template("checkout_success.html", name=name, children=checked_children)
-
-
+    return render_template("checkout_success.html", name=name,
+                           children=[member for member in checked_out if member != name])
+
+@app.route("/api/scan", methods=["POST"])
+def api_scan():
+    """Scanner stations: one JSON round trip per scan.
+
+    Body: {"code": decoded QR text, "action": "auto" | "check_in" | "check_out",
+    "children": [...], "members": [...]}. "auto" checks the member in when there
+    is nothing to choose; otherwise the reply's "action" says what is needed:
+    "choose_children" (a parent with minors still to check in, listed in
+    "children") or "confirm_checkout" (already in; "members" can go home). The
+    station answers with action "check_in" or "check_out" and the picks.
+    """
+    body = request.get_json(silent=True) or {}
+    action = body.get("action", "auto")
+    if action not in ("auto", "check_in", "check_out"):
+        return jsonify({"ok": False, "error": "❌ Unknown action."}), 400
+    # Only fresh reads are debounced; "check_in"/"check_out" answer a choice on screen
+    if action == "auto" and recently_scanned(body.get("code", "")):
+        return jsonify({"ok": False, "duplicate": True, "error": RESCAN_MESSAGE}), 429
+    scanned = scanned_member(body.get("code", ""))
+    if isinstance(scanned, str):
+        return jsonify({"ok": False, "error": scanned}), 400
+    name, role, code = scanned
+    reply = {"ok": True, "name": name, "role": role, "code": code}
+
+    family = family_status(name, role)
+    if action == "check_out" or (action == "auto" and family[0][1]):
+        if action == "auto":
+            members = [member for member, checked_in in family if checked_in]
+            return jsonify(dict(reply, checked_in=True, action="confirm_checkout", members=members))
+        time_str, results = family_check_out(name, role, body.get("members") or [])
+        done = "checked_out"
+    else:
+        unscanned = [child for child, checked_in in family[1:] if not checked_in]
+        if action == "auto" and unscanned:
+            return jsonify(dict(reply, checked_in=False, action="choose_children", children=unscanned))
+        time_str, results = family_check_in(name, role, body.get("children") or [])
+        done = "checked_in"
+
+    outcome = scan_outcome(reply, done, time_str, results, was_checked_in=family[0][1])
+    return jsonify(outcome) if outcome["ok"] else (jsonify(outcome), 409)
+
+def scan_outcome(reply, done, time_str, results, was_checked_in):
+    """The JSON reply for a finished check-in/out: who it applied to and each member's result.
+
+    "checked_in" is the scanned member's state after this write, on the day it
+    was made for; ``was_checked_in`` is their state before it, for a check-out
+    that left them out.
+    """
+    members = [member for member, status in results if status == done]
+    if not members:
+        name = reply["name"]
+        error = "❌ No active check-in found." if done == "checked_out" else f"❌ {name} is already checked in."
+        return {"ok": False, "error": error}
+    status = dict((full_name_key(member), status) for member, status in results).get(full_name_key(reply["name"]))
+    checked_in = status in ("checked_in", "already_checked_in") if status else was_checked_in
+    return dict(reply, checked_in=checked_in, action=done, members=members, time=time_str,
+                results=[{"name": member, "status": status} for member, status in results])
+
+# --------------------- OFFLINE SCANNER STATIONS ---------------------
+
+# The member snapshot holds every member's signed token, which is enough to check them in or
+# out, so the snapshot and sync need the station key (Bearer) or an admin session. Without
+# SCANNER_KEY, offline mode is off except on stations logged in as admin. Set a station up by
+# opening /scan?key=<SCANNER_KEY> once.
+SCANNER_KEY = os.getenv("SCANNER_KEY", "")
+SYNC_BATCH_LIMIT = 500
+
+def scanner_authorized():
+    if session.get("authenticated"):
+        return True
+    if not SCANNER_KEY:
+        return False
+    token = request.headers.get("Authorization", "")
+    return hmac.compare_digest(token.encode(), f"Bearer {SCANNER_KEY}".encode())
+
+def scanner_refused():
+    error = "❌ Wrong or missing station key." if SCANNER_KEY else "❌ Offline mode is off until SCANNER_KEY is set."
+    return jsonify({"ok": False, "error": error}), 401
+
+@app.route("/sw.js")
+def service_worker():
+    """Served from the site root so its scope covers /scan."""
+    response = app.send_static_file("sw.js")
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
+@app.route("/api/scan/snapshot")
+def api_scan_snapshot():
+    """Everything a station needs to judge scans while offline: members and who is in today."""
+    if not scanner_authorized():
+        return scanner_refused()
+    members = []
+    for reg in STORE.registration_rows()[1:]:
+        name = normalize_name(f"{reg[0]} {reg[1]}")
+        role = reg[5].split(",")[0].strip()
+        member_id = reg[MEMBER_ID].strip() if len(reg) > MEMBER_ID else ""
+        members.append({
+            "name": name,
+            "role": role,
+            "token": MEMBER_TOKENS.sign(member_id) if member_id else "",
+            "children": get_minor_children(name) if role.lower() == "parent" else [],
+        })
+    return jsonify({"date": str(datetime.now().date()), "members": members,
+                    "checked_in": STORE.checked_in_names()})
+
+def checked_in_on(name, day):
+    """Whether ``name`` has an open check-in on ``day`` (offline scans can replay an earlier day)."""
+    if day == str(datetime.now().date()):
+        return is_checked_in(name)
+    key = full_name_key(name)
+    return any(full_name_key(row[0]) == key
+               for _, row in STORE.iter_logs({"date_from": day, "date_to": day, "status": "open"}))
+
+def apply_offline_scan(event):
+    """One queued scan, applied at the time it was made on the station."""
+    try:
+        at = datetime.strptime(str(event.get("at", "")), "%Y-%m-%dT%H:%M:%S")
+    except ValueError:
+        return {"ok": False, "error": "❌ Invalid scan time."}
+    if at > datetime.now() + timedelta(minutes=5):
+        return {"ok": False, "error": "❌ Scan time is in the future."}
+    scanned = scanned_member(event.get("code", ""))
+    if isinstance(scanned, str):
+        return {"ok": False, "error": scanned}
+    name, role, code = scanned
+    reply = {"ok": True, "name": name, "role": role, "code": code}
+    if event.get("action") == "check_in":
+        time_str, results = family_check_in(name, role, event.get("children") or [], at=at)
+        return scan_outcome(reply, "checked_in", time_str, results, was_checked_in=False)
+    if event.get("action") == "check_out":
+        was_checked_in = checked_in_on(name, str(at.date()))
+        time_str, results = family_check_out(name, role, event.get("members") or [], at=at)
+        return scan_outcome(reply, "checked_out", time_str, results, was_checked_in)
+    return {"ok": False, "error": "❌ Unknown action."}
+
+@app.route("/api/scan/sync", methods=["POST"])
+def api_scan_sync():
+    """Scans a station queued while offline, applied in the order sent.
+
+    Body: {"events": [{"key", "code", "action": "check_in" | "check_out",
+    "children", "members", "at": "YYYY-MM-DDTHH:MM:SS"}]}. "key" is the
+    station's idempotency key: a resent event is not applied twice and gets
+    its first result back. One result per event, in order.
+    """
+    if not scanner_authorized():
+        return scanner_refused()
+    events = (request.get_json(silent=True) or {}).get("events")
+    if not isinstance(events, list) or len(events) > SYNC_BATCH_LIMIT:
+        return jsonify({"ok": False, "error": f"❌ Send a list of at most {SYNC_BATCH_LIMIT} events."}), 400
+    if not all(isinstance(e, dict) and isinstance(e.get("key"), str) and 0 < len(e["key"]) <= 100
+               for e in events):
+        return jsonify({"ok": False, "error": "❌ Every event needs a key."}), 400
+    results = SYNC_LEDGER.apply(events, apply_offline_scan)
+    return jsonify({"ok": True, "results": [dict(result, key=event["key"])
+                                            for event, result in zip(events, results)]})
 
 @app.route("/dashboard", methods=["GET", "POST"])
 def dashboard():
     if not session.get("authenticated"):
         return redirect("/admin-login")
 
-    # Load logs
-    logs = []
-    if os.path.exists(LOG_CSV):
-        with open(LOG_CSV, newline="") as f:
-            logs = list(csv.reader(f))
-        if logs and logs[0][0] == "Name":  # Skip header row
-            logs = logs[1:]
-
-    # Load registrations and process family info (now includes DOB)
-    registrations = []
-    if os.path.exists(REG_CSV):
-        with open(REG_CSV, newline="") as f:
-            reader = csv.reader(f)
-            for row in reader:
-                # Skip header if present
-                if row and row[0].strip() == "First Name":
-                    continue
-
-                # Ensure we have up to DOB column (index 11)
-                if len(row) < 12:
-                    row += [""] * (12 - len(row))
-
-                first       = (row[0] or "").strip()
-                last        = (row[1] or "").strip()
-                email       = (row[2] or "").strip()
-                phone       = (row[3] or "").strip()
-                role        = (row[5] or "").strip()
-                children    = (row[6] or "").strip()
-                parents_raw = (row[9] or "").strip()
-                address     = (row[10] or "").strip() if role == "Adult" else ""
-                dob         = (row[11] or "").strip()  # ← NEW
-
-                parents = ", ".join([p.strip() for p in parents_raw.split(",") if p.strip()])
-
-                registrations.append({
-                    "name": f"{first} {last}",
-                    "email": email,
-                    "phone": phone,
-                    "role": role,
-                    "children": children,
-                    "parents": parents,
-                    "address": address,
-                    "date_of_birth": dob,  # ← pass to template
-                })
+    # Logs and registrations are fetched page by page from /dashboard/logs and
+    # /dashboard/registrations, so the page itself no longer grows with history
 
     # ✅ Notifications
     all_checked_out = session.pop("all_checked_out", False)
@@ -610,24 +917,219 @@ def dashboard():
 
     return render_template(
         "dashboard.html",
-        logs=logs,
-        registrations=registrations,
         all_checked_out=all_checked_out,
         logs_cleared=logs_cleared
     )
 
 
+LOG_FIELDS = ["name", "role", "date", "checkin", "checkout", "method", "parent"]
+DASHBOARD_PAGE_SIZE = 50
+DASHBOARD_MAX_PAGE_SIZE = 200
+
+def registration_summary(row):
+    """Registration row as the dashboard shows it (family info, DOB)."""
+    role = row[5].strip()
+    return {
+        "name": f"{row[0].strip()} {row[1].strip()}",
+        "email": row[2].strip(),
+        "phone": row[3].strip(),
+        "role": role,
+        "children": row[6].strip(),
+        "parents": ", ".join(p.strip() for p in row[9].split(",") if p.strip()),
+        "address": row[10].strip() if role == "Adult" else "",
+        "date_of_birth": row[11].strip(),
+    }
+
+def dashboard_page(fetch, sorts, default_sort, to_json):
+    """Shared handler for the dashboard's keyset-paginated JSON endpoints.
+
+    Query args: date (or date_from/date_to), role, status, q, sort, cursor, limit.
+    Returns {"rows": [...], "next": cursor or null}.
+    """
+    if not session.get("authenticated"):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    args = request.args
+    filters = {
+        "date_from": args.get("date_from") or args.get("date", ""),
+        "date_to": args.get("date_to") or args.get("date", ""),
+        "role": args.get("role", "").strip(),
+        "status": args.get("status", ""),
+        "q": args.get("q", "").strip(),
+    }
+    sort = args.get("sort", default_sort)
+    if sort not in sorts:
+        sort = default_sort
+    try:
+        limit = min(max(int(args.get("limit", DASHBOARD_PAGE_SIZE)), 1), DASHBOARD_MAX_PAGE_SIZE)
+        rows, next_key = fetch(filters, sort, decode_cursor(args.get("cursor")), limit)
+    except (ValueError, TypeError):
+        return jsonify({"error": "Invalid limit or cursor"}), 400
+
+    return jsonify({
+        "rows": [dict(to_json(row), index=index) for index, row in rows],
+        "next": encode_cursor(next_key) if next_key else None,
+    })
+
+def log_json(row, index=None):
+    data = dict(zip(LOG_FIELDS, row + [""] * (len(LOG_FIELDS) - len(row))))
+    if index is not None:
+        data["index"] = index
+    return data
+
+def update_rollups(update, change):
+    """Apply a committed log change to the analytics rollups; a failure is logged, never raised,
+    since the log itself is already written (python analytics.py rebuild catches up)."""
+    try:
+        update(change)
+    except sqlite3.Error as e:
+        print(f"❌ Analytics rollup update failed: {e}")
+
+def publish_checkins(kind, written):
+    """Count committed check-ins ([(index, row)] from append_logs) and push them to live dashboards."""
+    if written:
+        update_rollups(ROLLUPS.add_checkins, [row for _, row in written])
+        LIVE_EVENTS.publish(kind, {"rows": [log_json(row, index) for index, row in written]})
+
+def publish_checkouts(kind, closed):
+    """Count closed rows (checkout filled in) and push them to live dashboards; they find them by name/date/checkin."""
+    if closed:
+        update_rollups(ROLLUPS.add_checkouts, closed)
+        LIVE_EVENTS.publish(kind, {"rows": [log_json(row) for row in closed]})
+
+@app.route("/events")
+def live_events():
+    """Server-Sent Events: check_in, check_out, manual_checkin and manual_checkout deltas,
+    plus delete_log and clear_logs (dashboards refetch their log table)."""
+    if not session.get("authenticated"):
+        return "❌ Unauthorized", 401
+    last_event_id = request.headers.get("Last-Event-ID", "")
+    return Response(LIVE_EVENTS.stream(last_event_id), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/dashboard/logs")
+def dashboard_logs():
+    return dashboard_page(STORE.log_page, LOG_SORTS, "newest", log_json)
+
+@app.route("/dashboard/registrations")
+def dashboard_registrations():
+    return dashboard_page(STORE.registration_page, REGISTRATION_SORTS, "oldest", registration_summary)
+
+
 
 @app.route("/logout", methods=["POST"])
 def logout():
     session.clear()
     return redirect("/")
 
+API_LOGS_PAGE_SIZE = 500
+API_LOGS_MAX_PAGE_SIZE = 5000
+
 @app.route("/api/logs")
 def api_logs():
-    if not os.path.exists(LOG_CSV): return jsonify([])
-    with open(LOG_CSV, newline="") as f:
-        return jsonify(list(csv.reader(f)))
+    """Attendance log for integrations, oldest first.
+
+    Filters: date_from / date_to (YYYY-MM-DD), role, name. Paging: limit and
+    cursor. The default JSON array (header row first) holds one page, with the
+    cursor for the next one in X-Next-Cursor. format=ndjson streams one object
+    per line (each carrying its own resume cursor) with no limit unless given.
+    """
+    args = request.args
+    filters = {
+        "date_from": args.get("date_from", ""),
+        "date_to": args.get("date_to", ""),
+        "role": args.get("role", "").strip(),
+        "q": args.get("name", "").strip(),
+    }
+    ndjson = args.get("format") == "ndjson"
+    try:
+        cursor = decode_cursor(args.get("cursor"))
+        if cursor is not None and (len(cursor) != 1 or not isinstance(cursor[0], int)):
+            raise ValueError("invalid cursor")
+        after = cursor[0] if cursor else None
+        if "limit" in args:
+            limit = int(args["limit"])
+        else:
+            limit = None if ndjson else API_LOGS_PAGE_SIZE
+    except ValueError:
+        return jsonify({"error": "Invalid limit or cursor"}), 400
+    if limit is not None:
+        limit = min(max(limit, 1), API_LOGS_MAX_PAGE_SIZE)
+
+    rows = STORE.iter_logs(filters, after)
+
+    if ndjson:
+        def generate():
+            for index, row in islice(rows, limit):
+                yield json.dumps(dict(zip(LOG_FIELDS, row), cursor=encode_cursor((index,)))) + "\n"
+        return Response(generate(), mimetype="application/x-ndjson")
+
+    page = list(islice(rows, limit + 1))
+    rows.close()
+    if not page:
+        return jsonify([])
+    response = jsonify([LOG_HEADER] + [row for _, row in page[:limit]])
+    if len(page) > limit:
+        response.headers["X-Next-Cursor"] = encode_cursor((page[limit - 1][0],))
+    return response
+
+ANALYTICS_DEFAULT_RANGE = relativedelta(weeks=12)
+
+def analytics_range(args):
+    """(date_from, date_to) from the query, defaulting to the 12 weeks up to today; ValueError if malformed."""
+    date_to = datetime.strptime(args["date_to"], "%Y-%m-%d").date() if args.get("date_to") else datetime.now().date()
+    if args.get("date_from"):
+        date_from = datetime.strptime(args["date_from"], "%Y-%m-%d").date()
+    else:
+        date_from = date_to - ANALYTICS_DEFAULT_RANGE
+    return str(date_from), str(date_to)
+
+@app.route("/api/analytics")
+def api_analytics():
+    """Attendance per period from the daily rollups (never the raw log).
+
+    Query args: date_from / date_to (default: the last 12 weeks), group (day,
+    week or month; default week), role. Each period has checkins, checkouts,
+    unique, new, returning, by_role, by_method and arrivals.
+    """
+    if not session.get("authenticated"):
+        return jsonify({"error": "Unauthorized"}), 401
+    group = request.args.get("group", "week")
+    if group not in PERIODS:
+        return jsonify({"error": "group must be day, week or month"}), 400
+    try:
+        date_from, date_to = analytics_range(request.args)
+    except ValueError:
+        return jsonify({"error": "Dates must be YYYY-MM-DD"}), 400
+    return jsonify({
+        "date_from": date_from, "date_to": date_to, "group": group,
+        "periods": ROLLUPS.summary(date_from, date_to, group, request.args.get("role", "").strip()),
+    })
+
+@app.route("/api/analytics/members")
+def api_analytics_members():
+    """Members by attendance history.
+
+    status=new: first ever visit between date_from and date_to (default: the
+    last 12 weeks). status=lapsed: has come before, but not in the last
+    ``months`` months (default 1). Both take an optional role.
+    """
+    if not session.get("authenticated"):
+        return jsonify({"error": "Unauthorized"}), 401
+    args = request.args
+    role = args.get("role", "").strip()
+    try:
+        if args.get("status") == "new":
+            date_from, date_to = analytics_range(args)
+            members = ROLLUPS.members(first_from=date_from, first_to=date_to, role=role)
+        elif args.get("status") == "lapsed":
+            since = datetime.now().date() - relativedelta(months=int(args.get("months", "1")))
+            members = ROLLUPS.members(last_before=str(since), role=role)
+        else:
+            return jsonify({"error": "status must be new or lapsed"}), 400
+    except ValueError:
+        return jsonify({"error": "Dates must be YYYY-MM-DD and months a whole number"}), 400
+    return jsonify({"members": members})
 
 @app.route("/manual-checkin", methods=["POST"])
 def manual_checkin():
@@ -643,23 +1145,19 @@ def manual_checkin():
         name = name.replace(char, '')
     name = normalize_name(name)
     
-    if is_checked_in(name):
-        return f"❌ {name} is already checked in."
-    
     # Look up role
     role = "Adult"
-    if os.path.exists(REG_CSV):
-        with open(REG_CSV, newline="") as f:
-            for row in csv.reader(f):
-                if len(row) > 5 and f"{row[0]} {row[1]}" == name:
-                    role = row[5]
-                    break
+    reg = STORE.find_registration(name)
+    if reg and len(reg) > 5:
+        role = reg[5]
     
     timestamp = datetime.now()
-    with open(LOG_CSV, "a", newline="") as f:
-        # Add empty checkout column
-        csv.writer(f).writerow([name, role, str(timestamp.date()), 
-                               timestamp.strftime("%H:%M:%S"), "", "Admin"])
+    # Add empty checkout column; the open check and the append are one store write
+    [(index, row)] = STORE.check_in_family([[name, role, str(timestamp.date()),
+                                             timestamp.strftime("%H:%M:%S"), "", "Admin"]])
+    if index is None:
+        return f"❌ {name} is already checked in."
+    publish_checkins("manual_checkin", [(index, row)])
     
     return f"✅ {name} manually checked in."
 
@@ -673,73 +1171,27 @@ def manual_checkout():
     if not name: 
         return "❌ No name provided."
     
-    # Find the open check-in record
-    if not os.path.exists(LOG_CSV):
-        return "❌ No check-in records found."
-    
-    # Read all logs
-    with open(LOG_CSV, "r") as f:
-        logs = list(csv.reader(f))
-    
-    # Find the header row
-    header = None
-    if logs and logs[0][0] == "Name":
-        header = logs[0]
-        logs = logs[1:]
-    
-    found = False
-    for i, row in enumerate(logs):
-        # Ensure we have enough columns
-        if len(row) < 5:
-            continue
-            
-        # Clean and compare names
-        stored_name = row[0].strip()
-        requested_name = name.strip()
-        
-        # Check if this is the record we want to check out
-        if stored_name == requested_name and not row[4].strip():
-            # Set checkout time
-            checkout_time = datetime.now().strftime("%H:%M:%S")
-            logs[i][4] = checkout_time
-            found = True
-            break
-    
-    if found:
-        # Write updated logs back to file
-        with open(LOG_CSV, "w", newline="") as f:
-            writer = csv.writer(f)
-            if header:
-                writer.writerow(header)
-            writer.writerows(logs)
+    # Close the first open check-in record for this exact name
+    checkout_time = datetime.now().strftime("%H:%M:%S")
+    closed = STORE.check_out_first(name, checkout_time)
+    if closed:
+        publish_checkouts("manual_checkout", [closed])
         return f"✅ {name} checked out successfully."
-    else:
-        # Diagnostic information
-        active_found = any(row[0].strip() == name.strip() and not row[4].strip() for row in logs)
-        return f"❌ No active check-in found for {name}. Active check-in exists: {active_found}"   
+
+    # Diagnostic information
+    active_found = is_checked_in(name)
+    return f"❌ No active check-in found for {name}. Active check-in exists: {active_found}"   
 
 
 @app.route("/search-registrations")
 def search_registrations():
-    query = request.args.get("query", "").lower().strip()
-    results = []
-    
-    if query and os.path.exists(REG_CSV):
-        with open(REG_CSV, newline="") as f:
-            for row in csv.reader(f):
-                if len(row) < 4: continue
-                name = f"{row[0]} {row[1]}".lower()
-                email = row[2].lower() if len(row) > 2 else ""
-                phone = row[3] if len(row) > 3 else ""
-                
-                if (query in name or query in email or query in phone):
-                    results.append({
-                        "name": f"{row[0]} {row[1]}",
-                        "email": email,
-                        "phone": phone
-                    })
-                
-    return jsonify(results)
+    """Typeahead for the dashboard: ranked matches (exact, prefix, fuzzy), at most ``limit``."""
+    query = request.args.get("query", "")
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 100)
+    return jsonify([
+        {"name": name, "email": email, "phone": phone}
+        for _, (name, email, phone) in STORE.search_registrations(query, limit)
+    ])
 
 @app.route("/admin-login", methods=["GET", "POST"])
 def admin_login():
@@ -755,66 +1207,34 @@ def admin_login():
 @app.route("/delete-log/<int:index>", methods=["POST"])
 def delete_log(index):
     if not session.get("authenticated"): return redirect("/admin-login")
-    if not os.path.exists(LOG_CSV): return redirect("/dashboard")
-    
-    with open(LOG_CSV, newline="") as f:
-        logs = list(csv.reader(f))
-    if 0 <= index < len(logs):
-        logs.pop(index)
-        with open(LOG_CSV, "w", newline="") as f:
-            csv.writer(f).writerows(logs)
+    # index is the row's "index" from /dashboard/logs (CSV: position, SQLite: id)
+    deleted = STORE.delete_log(index)
+    if deleted:
+        update_rollups(ROLLUPS.remove, deleted)
+        # CSV indexes after the deleted row shift down, so other dashboards refetch rather than patch
+        LIVE_EVENTS.publish("delete_log", {"rows": [log_json(deleted)]})
     return redirect("/dashboard")
 
 @app.route("/admin-registrations")
 def admin_registrations():
     if not session.get("authenticated"): return redirect("/admin-login")
-    registrations = []
-    if os.path.exists(REG_CSV):
-        with open(REG_CSV, newline="") as f:
-            registrations = list(csv.reader(f))
+    registrations = STORE.registration_rows()
     return render_template("admin_registrations.html", registrations=registrations)
 
 @app.route("/delete-registration/<int:index>", methods=["POST"])
 def delete_registration(index):
     if not session.get("authenticated"): return redirect("/admin-login")
-    if not os.path.exists(REG_CSV): return redirect("/admin-registrations")
-    
-    with open(REG_CSV, newline="") as f:
-        registrations = list(csv.reader(f))
-    if 0 <= index < len(registrations):
-        registrations.pop(index)
-        with open(REG_CSV, "w", newline="") as f:
-            csv.writer(f).writerows(registrations)
+    STORE.delete_registration(index)
     return redirect("/admin-registrations")
 
 @app.route("/edit-registration/<int:index>", methods=["GET", "POST"])
 def edit_registration(index):
     if not session.get("authenticated"):
         return redirect("/admin-login")
-    if not os.path.exists(REG_CSV):
-        return "No registrations"
-
-    # Load and upgrade CSV to include "Date of Birth" as last header if missing
-    with open(REG_CSV, newline="") as f:
-        registrations = list(csv.reader(f))
-
+    registrations = STORE.registration_rows()
     if not registrations:
         return "No registrations"
 
-    # If header present and missing DOB, append it and pad all rows
-    header = registrations[0]
-    has_header = header and header[0].strip() == "First Name"
-    if has_header and "Date of Birth" not in header:
-        header.append("Date of Birth")
-        for i in range(1, len(registrations)):
-            registrations[i].append("")
-        with open(REG_CSV, "w", newline="") as f:
-            csv.writer(f).writerows(registrations)
-
-    # Re-read after potential upgrade so indexing stays consistent
-    with open(REG_CSV, newline="") as f:
-        registrations = list(csv.reader(f))
-
     if index < 0 or index >= len(registrations):
         return "Invalid registration index"
 
@@ -824,10 +1244,6 @@ def edit_registration(index):
     if reg and reg[0].strip() == "First Name":
         return "Invalid registration index"
 
-    # Ensure at least 12 columns (DOB is index 11)
-    if len(reg) < 12:
-        reg += [""] * (12 - len(reg))
-
     if request.method == "POST":
         first = normalize_name(request.form["first_name"])
         last = normalize_name(request.form["last_name"])
@@ -859,21 +1275,7 @@ def edit_registration(index):
         # Keep existing QR unless regenerating
         qr_url = reg[7] if len(reg) > 7 else ""
 
-        # Regenerate QR if requested (FIXED format to first|last|role)
-        if regenerate_qr:
-            qr_data = f"{first}|{last}|{role}"
-            base_url = request.host_url.rstrip('/')
-            qr_url = f"{base_url}/check-in?data={urllib.parse.quote(qr_data)}"
-            qr_filename = f"{first}_{last}.png"
-            qr_path = QR_FOLDER / qr_filename
-            qrcode.make(qr_url).save(str(qr_path))
-            if email:
-                try:
-                    send_qr_email(email, f"{first} {last}", str(qr_path))
-                except Exception as e:
-                    print(f"Error sending email: {e}")
-
-        # Write back the updated row (DOB last at index 11)
+        # Write back the updated row; the Member ID never changes, so printed QR codes keep working
         new_reg = [
             first,            # 0 First Name
             last,             # 1 Last Name
@@ -886,19 +1288,24 @@ def edit_registration(index):
             minor_flag,       # 8 Minor
             parent_name,      # 9 Parent Name
             address,          # 10 Address
-            date_of_birth     # 11 Date of Birth (NEW)
+            date_of_birth,    # 11 Date of Birth
+            reg[MEMBER_ID] or new_member_id(),  # 12 Member ID
         ]
 
-        registrations[index] = new_reg
-        with open(REG_CSV, "w", newline="") as f:
-            csv.writer(f).writerows(registrations)
+        # Regenerate QR if requested (e.g. the server address changed)
+        if regenerate_qr:
+            base_url = request.host_url.rstrip('/')
+            new_reg[7] = member_qr_url(base_url, new_reg)
+
+        STORE.update_registrations({index: new_reg})
+        if regenerate_qr and email:
+            try:
+                send_member_qr(new_reg, base_url)
+            except Exception as e:
+                print(f"Error sending email: {e}")
         return redirect("/admin-registrations")
 
     # GET: render the edit page (you pass the list to the template)
-    # Ensure reg has DOB slot for the template
-    if len(reg) < 12:
-        reg += [""] * (12 - len(reg))
-
     full_name = f"{reg[0]} {reg[1]}"
     is_checked_in_flag = is_checked_in(full_name)
     return render_template(
@@ -912,23 +1319,18 @@ def edit_registration(index):
 @app.route("/resend-qr/<int:index>")
 def resend_qr(index):
     if not session.get("authenticated"): return redirect("/admin-login")
-    if not os.path.exists(REG_CSV): return "No registrations"
-    
-    with open(REG_CSV, newline="") as f:
-        registrations = list(csv.reader(f))
+    registrations = STORE.registration_rows()
+    if len(registrations) < 2: return "No registrations"
     if index < 0 or index >= len(registrations):
         return "Invalid index"
     
     reg = registrations[index]
     if len(reg) < 8 or not reg[7]: return "No QR code"
     
-    qr_filename = reg[7].split("/")[-1]
-    qr_path = QR_FOLDER / qr_filename
-    
     if len(reg) > 2 and reg[2]:
-        name = f"{reg[0]} {reg[1]}"
-        if send_qr_email(reg[2], name, str(qr_path)):
-            return "QR code resent!"
+        if send_member_qr(reg, request.host_url.rstrip('/')):
+            return "QR code queued for resending!"
+        return "❌ Could not queue the QR email."
     return "No email found"
 
 @app.route("/check-out/<int:index>", methods=["POST"])
@@ -937,8 +1339,7 @@ def admin_check_out(index):
         return redirect("/admin-login")
     
     # Get the registration
-    with open(REG_CSV, newline="") as f:
-        registrations = list(csv.reader(f))
+    registrations = STORE.registration_rows()
     if index < 0 or index >= len(registrations):
         return "Invalid registration index"
     
@@ -947,99 +1348,110 @@ def admin_check_out(index):
     
     # Perform checkout
     timestamp = datetime.now()
-    date_str = str(timestamp.date())
     time_str = timestamp.strftime("%H:%M:%S")
     
-    # Find the open check-in record
-    logs = []
-    if os.path.exists(LOG_CSV):
-        with open(LOG_CSV, newline="") as f:
-            logs = list(csv.reader(f))
-    
-    found = False
-    for i, row in enumerate(logs):
-        if len(row) >= 5 and row[0] == full_name and not row[4]:
-            logs[i][4] = time_str  # Set checkout time
-            found = True
-            break
-    
-    if found:
-        with open(LOG_CSV, "w", newline="") as f:
-            csv.writer(f).writerows(logs)
+    # Close the open check-in record
+    closed = STORE.check_out_first(full_name, time_str)
+    if closed:
+        publish_checkouts("manual_checkout", [closed])
         return redirect(f"/edit-registration/{index}")
     return "No active check-in found for this user"
 
 
-# Add this to app.py (run once to update existing registrations)
+# Run once to update existing registrations (e.g. after the host URL changed)
 @app.route("/update-qr-codes")
 def update_qr_codes():
-    if not os.path.exists(REG_CSV): 
+    if not session.get("authenticated"):
+        return redirect("/admin-login")
+    if len(STORE.registration_rows()) < 2:
         return "No registrations"
-    
-    updated = 0
-    registrations = []
-    with open(REG_CSV, newline="") as f:
-        registrations = list(csv.reader(f))
-    
+
+    # Update stored links and warm the QR cache in the background
     base_url = request.host_url.rstrip('/')
-    
-    for i, reg in enumerate(registrations):
-        if len(reg) < 8 or not reg[7]:
-            continue
-        
-        # Extract first/last from name
-        name_parts = reg[0].split()
-        first = name_parts[0]
-        last = " ".join(name_parts[1:]) if len(name_parts) > 1 else ""
-        role = reg[5]
-        
-        # FIX: Generate new QR format (first|last|role)
-        role_clean = role.split(',')[0]  # Remove any extra parameters
-        qr_data = urllib.parse.quote(f"{first}|{last}|{role_clean}")
-        qr_url = f"{base_url}/check-in?data={qr_data}"
-        
-        # Update registration
-        registrations[i][7] = qr_url
-        
-        # Regenerate QR image
-        qr_filename = f"{first}_{last}.png"
-        qr_path = QR_FOLDER / qr_filename
-        qrcode.make(qr_url).save(str(qr_path))
-        updated += 1
-
-    # Save updated registrations
-    with open(REG_CSV, "w", newline="") as f:
-        csv.writer(f).writerows(registrations)
-        
-    return f"Updated {updated} QR codes"
+    if not QR_REGEN.start(STORE, base_url, member_qr_url):
+        return "⏳ QR regeneration is already running. Progress: /update-qr-codes/status"
+    return "✅ QR regeneration started. Progress: /update-qr-codes/status"
+
+@app.route("/update-qr-codes/status")
+def update_qr_codes_status():
+    if not session.get("authenticated"):
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(QR_REGEN.status())
+
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+def export_chunks(rows, fmt):
+    """Encode (index, row) pairs as CSV (header first) or NDJSON, ~EXPORT_CHUNK_BYTES at a time."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    if fmt == "csv":
+        writer.writerow(LOG_HEADER)
+    for _, row in rows:
+        if fmt == "csv":
+            writer.writerow(row)
+        else:
+            out.write(json.dumps(dict(zip(LOG_FIELDS, row))) + "\n")
+        if out.tell() >= EXPORT_CHUNK_BYTES:
+            yield out.getvalue().encode("utf-8")
+            out.seek(0)
+            out.truncate()
+    if out.tell():
+        yield out.getvalue().encode("utf-8")
+
+def gzip_chunks(chunks):
+    """Compress a byte stream into one gzip member as it goes."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip header and trailer
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
 
 @app.route("/download-logs")
 def download_logs():
+    """Stream the attendance log as a file download; the log itself is left as it is.
+
+    Query args: date_from / date_to (YYYY-MM-DD), role, format (csv or
+    ndjson) and gzip=1. Rows are read and sent one chunk at a time, so a
+    year of history needs no more memory than a day and no temporary file.
+    Clearing the log is a separate step (Clear Logs on the dashboard).
+    """
     if not session.get("authenticated"):
         return redirect("/admin-login")
 
-    if not os.path.exists(LOG_CSV):
-        return "❌ No logs available to download."
-
-    date_str = datetime.now().strftime("%d-%m-%Y")
-    download_name = f"check-in-logs-{date_str}.csv"
-
-    response = send_from_directory(
-        directory=os.path.dirname(LOG_CSV),
-        path=os.path.basename(LOG_CSV),
-        as_attachment=True,
-        download_name=download_name
+    args = request.args
+    fmt = args.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        return "❌ Format must be csv or ndjson", 400
+    filters = {
+        "date_from": args.get("date_from", ""),
+        "date_to": args.get("date_to", ""),
+        "role": args.get("role", "").strip(),
+    }
+    try:
+        for key in ("date_from", "date_to"):
+            if filters[key]:
+                datetime.strptime(filters[key], "%Y-%m-%d")
+    except ValueError:
+        return "❌ Dates must be YYYY-MM-DD", 400
+
+    if filters["date_from"] or filters["date_to"]:
+        scope = f"{filters['date_from'] or 'start'}-to-{filters['date_to'] or 'today'}"
+    else:
+        scope = datetime.now().strftime("%d-%m-%Y")
+    download_name = f"check-in-logs-{scope}.{fmt}"
+    chunks = export_chunks(STORE.iter_logs(filters), fmt)
+    mimetype = EXPORT_FORMATS[fmt]
+    if args.get("gzip") == "1":
+        chunks, mimetype, download_name = gzip_chunks(chunks), "application/gzip", download_name + ".gz"
+
+    return Response(
+        chunks,
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={download_name}"}
     )
 
-    @response.call_on_close
-    def clear_logs():
-        # Reset the log file and keep only the header row
-        with open(LOG_CSV, "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow(["Name", "Role", "Date", "CheckIn", "CheckOut", "Method", "Parent"])
-
-    return response
-
 
 
 @app.route("/confirm-clear-logs")
@@ -1054,45 +1466,11 @@ def clear_logs():
     if not session.get("authenticated"):
         return redirect("/admin-login")
 
-    # Recreate the logs CSV with just the header
-    with open(LOG_CSV, "w", newline="") as f:
-        csv.writer(f).writerow(
-            ["Name","Role","Date","CheckIn","CheckOut","Method","Parent"]
-        )
+    # Recreate the logs with just the header
+    STORE.clear_logs()
+    LIVE_EVENTS.publish("clear_logs", {})
 
     session["logs_cleared"] = True
     return redirect("/dashboard")
 
     return redirect("/dashboard")
-
-
-
-if __name__ == "__main__":
-    import socket, threading, webbrowser, time
-
-    def get_local_ip():
-        """Return the LAN IP (e.g., 192.168.x.x)."""
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        try:
-            # Uses routing table to pick the active interface; no traffic is sent.
-            s.connect(("8.8.8.8", 80))
-            ip = s.getsockname()[0]
-        except Exception:
-            try:
-                ip = socket.gethostbyname(socket.gethostname())
-            except Exception:
-                ip = "input your ip address"   // i used 127.0.0.1
-        finally:
-            s.close()
-        return ip
-
-    def open_browser():
-        ip = get_local_ip()
-        # Small delay so Flask is listening before we open the page
-        time.sleep(1.0)
-        webbrowser.open(f"http://{ip}:5000")
-
-    threading.Thread(target=open_browser, daemon=True).start()
-    # Serve on all interfaces so other devices on Wi-Fi can reach it
-    app.run(host="0.0.0.0", port=5000, debug=True)
-
@@ -0,0 +1,334 @@
+"""Benchmark harness: synthetic congregation + per-route latency and I/O.
+
+Usage:
+    python bench.py [--members 2000] [--family-size 4] [--months 12]
+                    [--requests 200] [--backend csv|sqlite] [--seed 1]
+                    [--output results.json] [--keep DIR]
+
+Generates registrations.csv / logs.csv in a scratch data directory (the same
+files the app imports on startup), points the app at it with DATA_DIR, drives
+the main routes through the Flask test client and prints one JSON document:
+latency percentiles plus bytes read/written per request for every route, so
+runs from different releases can be diffed or plotted.
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+from datetime import date, timedelta
+
+from dateutil.relativedelta import relativedelta
+
+from member_tokens import new_member_id
+from storage import LOG_HEADER, REG_HEADER, iter_merged_logs
+
+FIRST_NAMES = [
+    "James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda",
+    "David", "Elizabeth", "Samuel", "Grace", "Daniel", "Esther", "Joseph", "Ruth",
+    "Peter", "Hannah", "Paul", "Naomi", "Andrew", "Deborah", "Thomas", "Rebecca",
+]
+SURNAME_SYLLABLES = ["ash", "bel", "cor", "dun", "el", "far", "gil", "har", "ing", "kel",
+                     "lam", "mor", "nor", "ost", "pen", "rad", "sto", "tre", "wyn", "ford"]
+BASE_URL = "http://localhost"  # what the test client reports as request.host_url
+
+
+def surname(n):
+    """Unique, digit-free surname for family number n."""
+    parts = []
+    while True:
+        n, digit = divmod(n, len(SURNAME_SYLLABLES))
+        parts.append(SURNAME_SYLLABLES[digit])
+        if not n:
+            break
+        n -= 1
+    return "".join(reversed(parts)).capitalize()
+
+
+def qr_link(first, last, role):
+    data = urllib.parse.quote(f"{first}|{last}|{role}")
+    return f"{BASE_URL}/check-in?data={data}"
+
+
+# --------------------- dataset ---------------------
+
+def generate_dataset(data_dir, members=2000, family_size=4, months=12, attendance=0.6, seed=1):
+    """Write registrations.csv and logs.csv for a synthetic congregation.
+
+    Families get one or two parents and up to ``family_size`` members in total
+    (children are minors linked to their parents); about a quarter of households
+    are single adults. Every Sunday of the last ``months`` months each household
+    attends with probability ``attendance``. Returns a summary dict.
+    """
+    rng = random.Random(seed)
+    os.makedirs(data_dir, exist_ok=True)
+    households, regs, phone = [], [], 7000000000
+
+    def member(first, last, role, children="", parents=""):
+        nonlocal phone
+        phone += 1
+        email = f"{first}.{last}@example.com".lower()
+        minor = role == "Child"
+        dob = date(rng.randint(2008, 2022) if minor else rng.randint(1950, 2000),
+                   rng.randint(1, 12), rng.randint(1, 28))
+        regs.append([
+            first, last, "" if minor else email, f"0{phone}", rng.choice(["Male", "Female"]),
+            role, children, qr_link(first, last, role), "1" if minor else "0",
+            f"{first} {last}" if role == "Parent" else parents,
+            f"{rng.randint(1, 200)} High Street" if role == "Adult" else "", str(dob),
+            new_member_id(),
+        ])
+        return f"{first} {last}"
+
+    family = 0
+    while len(regs) < members:
+        last = surname(family)
+        family += 1
+        if rng.random() < 0.25 or family_size < 2:
+            households.append([(member(rng.choice(FIRST_NAMES), last, "Adult"), "Adult", "")])
+            continue
+        size = min(rng.randint(2, max(2, family_size)), members - len(regs))
+        parent_count = 1 if size < 3 or rng.random() < 0.3 else 2
+        firsts = rng.sample(FIRST_NAMES, size)
+        children = [f"{first} {last}" for first in firsts[parent_count:]]
+        parents = [member(first, last, "Parent", children=", ".join(children))
+                   for first in firsts[:parent_count]]
+        for first in firsts[parent_count:]:
+            member(first, last, "Child", parents=", ".join(parents))
+        households.append([(p, "Parent", p) for p in parents]
+                          + [(c, "Child", parents[0]) for c in children])
+
+    with open(os.path.join(data_dir, "registrations.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(REG_HEADER)
+        writer.writerows(regs)
+
+    # Sundays from `months` ago up to last week, oldest first (the order the app appends)
+    today = date.today()
+    day = today - relativedelta(months=months)
+    day += timedelta(days=(6 - day.weekday()) % 7)
+    log_rows = 0
+    with open(os.path.join(data_dir, "logs.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(LOG_HEADER)
+        while day < today:
+            for household in households:
+                if rng.random() >= attendance:
+                    continue
+                arrive = f"09:{rng.randint(30, 59):02d}:{rng.randint(0, 59):02d}"
+                leave = f"11:{rng.randint(30, 59):02d}:{rng.randint(0, 59):02d}"
+                for name, role, parent in household:
+                    writer.writerow([name, role, str(day), arrive, leave, "QR", parent])
+                    log_rows += 1
+            day += timedelta(days=7)
+
+    return {
+        "members": len(regs),
+        "households": len(households),
+        "log_rows": log_rows,
+        "registrations_bytes": os.path.getsize(os.path.join(data_dir, "registrations.csv")),
+        "logs_bytes": os.path.getsize(os.path.join(data_dir, "logs.csv")),
+    }
+
+
+# --------------------- measurement ---------------------
+
+def io_counters():
+    """(bytes read, bytes written) by this process so far; (None, None) off Linux.
+
+    Uses rchar/wchar from /proc, which count every read()/write() (page cache
+    hits included), i.e. how much file data the app asked for.
+    """
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(":") for line in f)
+        return int(fields["rchar"]), int(fields["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def summarize(samples):
+    """samples: [(seconds, bytes_read, bytes_written, ok)] -> result dict (ms / bytes)."""
+    latencies = sorted(s[0] * 1000 for s in samples)
+    reads = [s[1] for s in samples if s[1] is not None]
+    writes = [s[2] for s in samples if s[2] is not None]
+    return {
+        "count": len(samples),
+        "errors": sum(1 for s in samples if not s[3]),
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else None,
+        "p50_ms": round(percentile(latencies, 50), 3) if latencies else None,
+        "p90_ms": round(percentile(latencies, 90), 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99), 3) if latencies else None,
+        "max_ms": round(latencies[-1], 3) if latencies else None,
+        "bytes_read_per_request": round(sum(reads) / len(reads)) if reads else None,
+        "bytes_written_per_request": round(sum(writes) / len(writes)) if writes else None,
+    }
+
+
+def measure(send, iterations, warmup=3):
+    """Call send(i) -> response; returns per-request samples after a few warmup calls."""
+    for i in range(warmup):
+        send(-1 - i)
+    samples = []
+    for i in range(iterations):
+        read0, written0 = io_counters()
+        start = time.perf_counter()
+        response = send(i)
+        elapsed = time.perf_counter() - start
+        read1, written1 = io_counters()
+        samples.append((elapsed,
+                        read1 - read0 if read0 is not None else None,
+                        written1 - written0 if written0 is not None else None,
+                        response.status_code < 400 and not response.data.startswith("❌".encode())))
+    return samples
+
+
+# --------------------- scenarios ---------------------
+
+def run_routes(app_module, iterations, seed=1):
+    """Drive every benchmarked route; returns {route: summary}."""
+    rng = random.Random(seed)
+    regs = app_module.STORE.registration_rows()[1:]
+    client = app_module.app.test_client()
+    with client.session_transaction() as s:
+        s["authenticated"] = True
+
+    # Walk-ins: adults and parents arriving today without bringing anyone along
+    arrivals = [r for r in regs if r[5] in ("Adult", "Parent")]
+    rng.shuffle(arrivals)
+    arrivals = arrivals[:iterations + 3]
+    names = [f"{r[0]} {r[1]}" for r in regs]
+
+    def register(i):
+        last = "Newcomer" + surname(i + 3) if i >= 0 else "Warmup" + surname(-i)
+        return client.post("/register", data={
+            "first_name": "Bench", "last_name": last, "email": f"bench.{last}@example.com".lower(),
+            "phone": f"09{abs(i) + 1000000:08d}" if i >= 0 else f"08{-i:08d}",
+            "gender": "Other", "role": "Adult", "address": "1 Bench Road",
+            "date_of_birth": "1990-01-01",
+        })
+
+    def scan_data(reg):
+        return urllib.parse.quote(app_module.member_qr_url(BASE_URL, reg))  # what the scanner page sends
+
+    def check_in(i):
+        reg = arrivals[i + 3]  # warmup calls (-1..-3) use the first three
+        return client.post(f"/check-in?data={scan_data(reg)}", data={"no_kids": "1"})
+
+    def check_out(i):
+        reg = arrivals[i + 3]
+        return client.post(f"/check-out?data={scan_data(reg)}",
+                           data={"members": f"{reg[0]} {reg[1]}"})
+
+    def search(i):
+        name = rng.choice(names)
+        return client.get("/search-registrations", query_string={"query": name[:rng.randint(2, 6)]})
+
+    recent = str(date.today() - timedelta(days=35))
+    year_ago = str(date.today() - timedelta(days=365))
+    scenarios = [
+        ("register", register),
+        ("check_in", check_in),
+        ("check_out", check_out),
+        ("dashboard", lambda i: client.get("/dashboard")),
+        ("dashboard_logs", lambda i: client.get("/dashboard/logs")),
+        ("dashboard_registrations", lambda i: client.get("/dashboard/registrations")),
+        ("search_registrations", search),
+        ("api_logs", lambda i: client.get("/api/logs")),
+        ("api_logs_recent", lambda i: client.get("/api/logs", query_string={"date_from": recent})),
+        ("analytics_year", lambda i: client.get("/api/analytics", query_string={"date_from": year_ago})),
+    ]
+    results = {}
+    for name, send in scenarios:
+        print(f"⏱️ {name} x{iterations}", file=sys.stderr)
+        results[name] = summarize(measure(send, iterations))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the attendance app on synthetic data.")
+    parser.add_argument("--members", type=int, default=2000)
+    parser.add_argument("--family-size", type=int, default=4)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--attendance", type=float, default=0.6)
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per route")
+    parser.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--keep", help="generate into this directory and keep it")
+    args = parser.parse_args(argv)
+
+    data_dir = args.keep or tempfile.mkdtemp(prefix="attendance-bench-")
+    try:
+        print(f"🧪 Generating {args.members} members, {args.months} months in {data_dir}", file=sys.stderr)
+        dataset = generate_dataset(data_dir, args.members, args.family_size, args.months,
+                                   args.attendance, args.seed)
+        # The app reads its configuration at import time
+        os.environ["DATA_DIR"] = data_dir
+        os.environ["STORAGE_BACKEND"] = args.backend
+        os.environ["EMAIL_HOST"] = ""
+        os.environ["RESCAN_COOLDOWN_SECONDS"] = "0"  # the bench rescans the same badges back to back
+        os.environ["SQLITE_PATH"] = os.path.join(data_dir, "attendance.db")
+        if args.backend == "sqlite":
+            from sqlite_store import SqliteStore, import_csv
+            import_csv(SqliteStore(os.environ["SQLITE_PATH"]), os.path.join(data_dir, "registrations.csv"),
+                       iter_merged_logs(os.path.join(data_dir, "logs.csv")))
+
+        # App chatter (warnings, migration notices) goes to stderr; stdout is the report
+        with contextlib.redirect_stdout(sys.stderr):
+            start = time.perf_counter()
+            import app as app_module
+            startup = time.perf_counter() - start
+            routes = run_routes(app_module, args.requests, args.seed)
+
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "backend": args.backend,
+                "requests_per_route": args.requests,
+                "seed": args.seed,
+            },
+            "dataset": dict(dataset, family_size=args.family_size, months=args.months),
+            "startup_seconds": round(startup, 3),
+            "routes": routes,
+        }
+        text = json.dumps(report, indent=2, sort_keys=True)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(text + "\n")
+            print(f"✅ Wrote {args.output}", file=sys.stderr)
+        else:
+            print(text)
+    finally:
+        if not args.keep:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Where the data lives and which store holds it.
+
+Shared by app.py and the command-line tools that work on the data without
+starting the app (python migrations.py, python analytics.py rebuild).
+"""
+import os
+import sys
+from pathlib import Path
+
+from storage import CsvStore
+
+# Path configuration
+if getattr(sys, 'frozen', False):
+    BASE_DIR = sys._MEIPASS
+    APP_DIR = os.path.dirname(sys.executable)
+else:
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+    APP_DIR = BASE_DIR
+
+DATA_DIR = Path(os.getenv("DATA_DIR", Path(APP_DIR) / "data"))
+REG_CSV = DATA_DIR / "registrations.csv"
+LOG_DIR = DATA_DIR / "logs"  # one CSV per day + manifest.json
+LOG_CSV = DATA_DIR / "logs.csv"  # single-file log from before partitioning (migrated on startup)
+CHECKOUT_CSV = DATA_DIR / "checkouts.csv"
+
+os.makedirs(DATA_DIR, exist_ok=True)
+
+# Storage engine: "csv" (default, data/*.csv) or "sqlite" (data/attendance.db, WAL mode).
+# Move existing CSV data into SQLite once with: python sqlite_store.py import
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "csv").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", str(DATA_DIR / "attendance.db"))
+
+# Daily attendance rollups for reports, whichever backend holds the logs
+ANALYTICS_PATH = os.getenv("ANALYTICS_PATH", str(DATA_DIR / "analytics.db"))
+
+
+def open_store():
+    """The configured store, not yet migrated (see migrations.run_migrations)."""
+    if STORAGE_BACKEND == "sqlite":
+        from sqlite_store import SqliteStore
+        return SqliteStore(SQLITE_PATH)
+    # CSV files with self-refreshing in-memory indexes over them. All writes go
+    # through one writer thread holding data/.write.lock (shared across processes).
+    return CsvStore(REG_CSV, LOG_DIR, lock_path=DATA_DIR / ".write.lock")
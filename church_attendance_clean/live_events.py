@@ -0,0 +1,118 @@
+import json
+import os
+import threading
+import time
+
+
+class EventJournal:
+    """Attendance deltas for the live dashboard, shared by every worker process.
+
+    publish() appends one JSON line to the journal in a single O_APPEND write,
+    so lines from different processes never interleave. Each /events stream
+    tails the file from where its client left off. Event ids are
+    "<inode>-<offset>", which EventSource sends back as Last-Event-ID when it
+    reconnects, so nothing is missed across a dropped connection. Publishers in
+    this process wake their streams at once; other processes' events are seen
+    on the next poll. Past max_bytes the file is rotated to <path>.1; a client
+    too far behind for that gets a "reset" event and reloads its tables.
+    """
+
+    def __init__(self, path, max_bytes=1_000_000, poll_seconds=0.5, keepalive_seconds=15):
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.poll_seconds = poll_seconds
+        self.keepalive_seconds = keepalive_seconds
+        self._changed = threading.Condition()
+
+    def publish(self, kind, data):
+        line = json.dumps({"type": kind, "data": data}, separators=(",", ":")) + "\n"
+        try:
+            try:
+                if os.path.getsize(self.path) > self.max_bytes:
+                    os.replace(self.path, f"{self.path}.1")
+            except FileNotFoundError:
+                pass
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode("utf-8"))
+            finally:
+                os.close(fd)
+        except OSError as e:
+            print(f"⚠️ Could not record live event {kind}: {e}")  # the write itself has committed
+            return
+        with self._changed:
+            self._changed.notify_all()
+
+    def _stat(self, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None, 0
+        return st.st_ino, st.st_size
+
+    def _read(self, path, inode, offset):
+        """Complete events in ``path`` after ``offset``: ([(id, type, data)], new offset)."""
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_ino != inode:
+                return [], offset  # rotated between stat and open; caught on the next pass
+            f.seek(offset)
+            chunk = f.read()
+        events = []
+        for line in chunk.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break  # half-written by another process; read it next time
+            offset += len(line)
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            events.append((f"{inode}-{offset}", event.get("type", "message"), event.get("data")))
+        return events, offset
+
+    def stream(self, last_event_id="", max_seconds=300):
+        """Server-Sent Events text for one client, ending after ``max_seconds``.
+
+        Starts after ``last_event_id`` when it is still in the journal, otherwise
+        from now (sending "reset" if the client had asked to resume). The client
+        reconnects on its own when the stream ends, which re-checks its session.
+        """
+        inode, offset = self._stat(self.path)
+        if last_event_id:
+            try:
+                seen_inode, seen_offset = (int(part) for part in last_event_id.split("-"))
+            except ValueError:
+                seen_inode, seen_offset = None, 0
+            if seen_inode == inode and seen_offset <= offset:
+                offset = seen_offset
+            elif seen_inode == self._stat(f"{self.path}.1")[0]:
+                inode, offset = seen_inode, seen_offset  # resume from the rotated file
+            else:
+                yield "event: reset\ndata: {}\n\n"
+        yield "retry: 3000\n\n"
+
+        deadline = time.monotonic() + max_seconds
+        last_sent = time.monotonic()
+        while time.monotonic() < deadline:
+            current, size = self._stat(self.path)
+            events = []
+            if current != inode and inode is not None:
+                # Rotated: finish the old file (now .1) if it is still there, then start the new one
+                if self._stat(f"{self.path}.1")[0] == inode:
+                    events, _ = self._read(f"{self.path}.1", inode, offset)
+                else:
+                    yield "event: reset\ndata: {}\n\n"
+                inode, offset = current, 0
+            elif current is not None and inode is None:
+                inode, offset = current, 0  # journal created since we connected
+            if inode is not None and size > offset:
+                more, offset = self._read(self.path, inode, offset)
+                events += more
+            for event_id, kind, data in events:
+                yield f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(data)}\n\n"
+                last_sent = time.monotonic()
+            if not events:
+                if time.monotonic() - last_sent >= self.keepalive_seconds:
+                    yield ": keepalive\n\n"  # keeps proxies from closing an idle stream
+                    last_sent = time.monotonic()
+                with self._changed:
+                    self._changed.wait(self.poll_seconds)
@@ -0,0 +1,222 @@
+import json
+import os
+import smtplib
+import threading
+import time
+import uuid
+
+from metrics import METRICS
+
+try:
+    import fcntl  # POSIX only; the Windows build is a single process, which always sends
+except ImportError:
+    fcntl = None
+
+RECORD_FIELDS = {"id", "to", "message", "attempts", "next_attempt", "last_error"}
+
+
+class Mailer:
+    """Background SMTP delivery from an on-disk outbox.
+
+    enqueue() writes the message to outbox/<id>.json and returns straight away,
+    so registration never waits on the mail server and pending mail survives a
+    restart. One worker thread keeps a single SMTP connection open and reuses it
+    for every message, retrying failures with exponential backoff. Messages that
+    run out of attempts are moved to outbox/failed/.
+
+    Several worker processes can share one outbox: each can enqueue, but only
+    the one holding outbox/.sender.lock delivers, so no message goes out twice.
+    The sender looks at the outbox every ``poll_seconds`` for mail the other
+    workers queued; the others wait their turn in case it exits. An unexpected
+    error in the sender (an outbox file it can't move, say) is logged and the
+    loop carries on after a backoff, so mail never silently stops.
+    """
+
+    def __init__(self, outbox_dir, host, port=587, user="", password="", use_tls=True,
+                 max_attempts=6, base_delay=30, max_delay=3600, idle_timeout=60, poll_seconds=5):
+        self.outbox_dir = str(outbox_dir)
+        self.failed_dir = os.path.join(self.outbox_dir, "failed")
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.use_tls = use_tls
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.idle_timeout = idle_timeout
+        self.poll_seconds = poll_seconds
+        self._sender_lock = None
+        self._smtp = None
+        self._last_used = 0.0
+        self._wake = threading.Event()
+        self._idle = threading.Event()
+        self._thread = None
+        os.makedirs(self.failed_dir, exist_ok=True)
+
+    # --------------------- queue ---------------------
+
+    def enqueue(self, recipient, message):
+        """Store a ready-built email.message for delivery; returns its outbox id."""
+        msg_id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"  # sorts by creation time
+        record = {
+            "id": msg_id,
+            "to": recipient,
+            "message": message.as_string(),
+            "attempts": 0,
+            "next_attempt": 0,
+            "last_error": "",
+        }
+        self._save(record)
+        self._idle.clear()
+        self._wake.set()
+        return msg_id
+
+    def pending(self):
+        return len(self._outbox_files())
+
+    def flush(self, timeout=30):
+        """Wait until the outbox has nothing due (used by tests and shutdown)."""
+        self._wake.set()
+        return self._idle.wait(timeout)
+
+    def _path(self, msg_id):
+        return os.path.join(self.outbox_dir, f"{msg_id}.json")
+
+    def _save(self, record):
+        path = self._path(record["id"])
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(record, f)
+        os.replace(f"{path}.tmp", path)
+
+    def _outbox_files(self):
+        return sorted(name for name in os.listdir(self.outbox_dir) if name.endswith(".json"))
+
+    def _due(self):
+        """Records ready to send now, plus seconds until the next one that isn't."""
+        now = time.time()
+        due, wait = [], None
+        for name in self._outbox_files():
+            path = os.path.join(self.outbox_dir, name)
+            try:
+                with open(path) as f:
+                    record = json.load(f)
+                if not (isinstance(record, dict) and RECORD_FIELDS <= record.keys()
+                        and isinstance(record["next_attempt"], (int, float))):
+                    raise ValueError("not an outbox record")
+            except OSError:
+                continue  # sent and removed since the listing
+            except ValueError as e:
+                # A corrupt entry would otherwise be skipped (and counted as pending) forever
+                os.replace(path, os.path.join(self.failed_dir, name))
+                print(f"❌ Moved unreadable outbox entry {name} to failed/: {e!r}")
+                continue
+            if record["next_attempt"] <= now:
+                due.append(record)
+            else:
+                delay = record["next_attempt"] - now
+                wait = delay if wait is None else min(wait, delay)
+        return due, wait
+
+    # --------------------- delivery ---------------------
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="mailer", daemon=True)
+            self._thread.start()
+        return self
+
+    def _become_sender(self):
+        if fcntl is None:
+            return True
+        lock = open(os.path.join(self.outbox_dir, ".sender.lock"), "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return False
+        self._sender_lock = lock  # held (open) for the life of the process
+        return True
+
+    def _run(self):
+        while not self._become_sender():
+            time.sleep(self.poll_seconds)
+        errors = 0
+        while True:
+            try:
+                self._send_due()
+                errors = 0
+            except Exception as e:
+                errors += 1
+                delay = min(self.poll_seconds * 2 ** (errors - 1), self.max_delay)
+                print(f"❌ Mailer error (retrying in {delay}s): {e!r}")
+                self._disconnect()
+                time.sleep(delay)
+
+    def _send_due(self):
+        """Deliver everything due; if nothing was, wait for new mail or the next retry."""
+        due, wait = self._due()
+        for record in due:
+            self._deliver(record)
+        if due:
+            return
+        if wait is None:
+            self._idle.set()
+        # Sleep until new mail (ours, or another worker's by the next poll), the next
+        # retry, or the idle connection should be closed
+        timeout = min(wait if wait is not None else self.idle_timeout, self.poll_seconds)
+        if not self._wake.wait(timeout):
+            self._close_if_idle()
+        self._wake.clear()
+
+    def _deliver(self, record):
+        start = time.perf_counter()
+        try:
+            smtp = self._connection()
+            smtp.sendmail(self.user, record["to"], record["message"])
+            METRICS.observe("attendance_email_send_seconds", time.perf_counter() - start, result="sent")
+            self._last_used = time.time()
+            os.remove(self._path(record["id"]))
+            print(f"✅ Email sent to {record['to']}")
+        except Exception as e:
+            METRICS.observe("attendance_email_send_seconds", time.perf_counter() - start, result="error")
+            self._disconnect()
+            record["attempts"] += 1
+            record["last_error"] = str(e)
+            if record["attempts"] >= self.max_attempts:
+                os.replace(self._path(record["id"]), os.path.join(self.failed_dir, f"{record['id']}.json"))
+                print(f"❌ Giving up on email to {record['to']} after {record['attempts']} attempts: {e}")
+                return
+            delay = min(self.base_delay * 2 ** (record["attempts"] - 1), self.max_delay)
+            record["next_attempt"] = time.time() + delay
+            self._save(record)
+            print(f"❌ Error sending email to {record['to']} (retry in {delay}s): {e}")
+
+    def _connection(self):
+        if self._smtp is not None:
+            if time.time() - self._last_used < 5:
+                return self._smtp
+            try:
+                self._smtp.noop()  # the server may have dropped us while idle
+                return self._smtp
+            except (smtplib.SMTPException, OSError):
+                self._disconnect()
+        smtp = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.use_tls:
+            smtp.starttls()
+        if self.user:
+            smtp.login(self.user, self.password)
+        self._smtp = smtp
+        return smtp
+
+    def _close_if_idle(self):
+        if self._smtp is not None and time.time() - self._last_used >= self.idle_timeout:
+            self._disconnect()
+
+    def _disconnect(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
@@ -0,0 +1,45 @@
+import base64
+import hashlib
+import hmac
+import re
+import secrets
+
+ID_BYTES = 5    # 40 bits -> 8 base32 characters
+SIG_BYTES = 5   # truncated HMAC-SHA256, also 8 characters
+TOKEN_RE = re.compile(r"[A-Z2-7]{8}-[A-Z2-7]{8}")
+
+
+def _b32(data):
+    return base64.b32encode(data).decode("ascii").rstrip("=")
+
+
+def new_member_id():
+    """Random, permanent id for a registration (stored in its "Member ID" column)."""
+    return _b32(secrets.token_bytes(ID_BYTES))
+
+
+class MemberTokens:
+    """Signed member tokens for QR codes: "<member id>-<signature>", e.g. K3QZ7M2A-9FJW2XQD.
+
+    Upper-case base32 keeps the whole QR URL in the denser alphanumeric mode.
+    The id never changes when a member's name does, so printed codes keep
+    working, and the HMAC means nobody can mint a code for another member by
+    guessing ids.
+    """
+
+    def __init__(self, secret):
+        self.key = secret.encode("utf-8") if isinstance(secret, str) else secret
+
+    def _signature(self, member_id):
+        return _b32(hmac.new(self.key, member_id.encode("ascii"), hashlib.sha256).digest()[:SIG_BYTES])
+
+    def sign(self, member_id):
+        return f"{member_id}-{self._signature(member_id)}"
+
+    def verify(self, token):
+        """The member id inside a genuine token, else None."""
+        token = (token or "").strip().upper()
+        if not TOKEN_RE.fullmatch(token):
+            return None
+        member_id, signature = token.split("-")
+        return member_id if hmac.compare_digest(signature, self._signature(member_id)) else None
@@ -0,0 +1,170 @@
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds: 1ms .. 10s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """In-process counters and histograms, rendered in Prometheus text format.
+
+    Recording is a dict update under one lock (no I/O), cheap enough to leave on
+    in production. Each process keeps its own numbers; under a multi-process
+    server, share() makes every worker's /metrics report the sum of all of them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}        # name -> (type, help, buckets)
+        self._counters = {}    # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [per-bucket counts..., +Inf count, sum]
+        self._share_dir = None
+
+    def counter(self, name, help_text):
+        self._meta[name] = ("counter", help_text, None)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self._meta[name] = ("histogram", help_text, tuple(buckets))
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        buckets = self._meta[name][2]
+        key = (name, _labels(labels))
+        slot = bisect.bisect_left(buckets, value)
+        with self._lock:
+            counts = self._histograms.get(key)
+            if counts is None:
+                counts = self._histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+            counts[slot] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    # --- sharing between worker processes ---
+
+    def share(self, directory, interval=5):
+        """Publish this process's numbers to ``directory`` for render() in the other workers.
+
+        A scrape lands on one worker at random, so each one writes its totals to
+        <directory>/<pid>.json every ``interval`` seconds and at exit, and
+        render() adds every file to its own live numbers. Files of workers that
+        have exited are kept so counters never go backwards; the serve command
+        empties the directory when it starts.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self._share_dir = str(directory)
+
+        def run():
+            while True:
+                time.sleep(interval)
+                self._dump()
+
+        threading.Thread(target=run, name="metrics-share", daemon=True).start()
+        atexit.register(self._dump)
+
+    def _share_path(self, pid):
+        return os.path.join(self._share_dir, f"{pid}.json")
+
+    def _dump(self):
+        with self._lock:
+            data = {"counters": [[name, labels, value] for (name, labels), value in self._counters.items()],
+                    "histograms": [[name, labels, counts] for (name, labels), counts in self._histograms.items()]}
+        if not os.path.isdir(self._share_dir):
+            return  # the server is shutting down and has removed it
+        path = self._share_path(os.getpid())
+        try:
+            with open(f"{path}.tmp", "w") as f:
+                json.dump(data, f)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            print(f"⚠️ Could not share metrics: {e}")
+
+    def _add_shared(self, counters, histograms):
+        """Add the other workers' last published totals into ``counters``/``histograms``."""
+        own = f"{os.getpid()}.json"
+        for name in os.listdir(self._share_dir):
+            if not name.endswith(".json") or name == own:
+                continue
+            try:
+                with open(os.path.join(self._share_dir, name)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for metric, labels, value in data["counters"]:
+                key = (metric, tuple(tuple(pair) for pair in labels))
+                counters[key] = counters.get(key, 0) + value
+            for metric, labels, counts in data["histograms"]:
+                key = (metric, tuple(tuple(pair) for pair in labels))
+                mine = histograms.get(key)
+                histograms[key] = counts if mine is None else [a + b for a, b in zip(mine, counts)]
+
+    def render(self):
+        """Everything recorded so far, in Prometheus exposition format."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(counts) for key, counts in self._histograms.items()}
+        if self._share_dir:
+            self._add_shared(counters, histograms)
+
+        lines = []
+        for name, (kind, help_text, buckets) in sorted(self._meta.items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+            for (metric, labels), counts in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + ("+Inf",), counts):
+                    cumulative += count
+                    le = bound if bound == "+Inf" else repr(float(bound))
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(counts[-1])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+METRICS.histogram("attendance_http_request_duration_seconds", "Request latency by route and method.")
+METRICS.counter("attendance_http_requests_total", "Requests by route, method and status code.")
+METRICS.counter("attendance_csv_rows_read_total", "CSV rows parsed from the data files.")
+METRICS.counter("attendance_csv_rows_written_total", "CSV rows written to the data files (appends and rewrites).")
+METRICS.counter("attendance_csv_rewrites_total", "Whole CSV files rewritten (temp file + rename).")
+METRICS.counter("attendance_rescans_suppressed_total", "Repeat badge reads answered by the rescan debounce.")
+METRICS.histogram("attendance_qr_render_seconds", "Time to render one QR PNG in the web process.")
+METRICS.histogram("attendance_email_send_seconds", "Time to hand one email to the SMTP server, by result.")
@@ -0,0 +1,33 @@
+"""Bring data written by older versions up to the current layout.
+
+Each store lists its own ordered steps (CsvStore.MIGRATIONS,
+SqliteStore.MIGRATIONS) and records how far it has got. app.py runs the
+pending ones on startup; ``python migrations.py`` does the same without
+starting the app, then prints the schema version.
+"""
+import sys
+
+from member_tokens import new_member_id
+
+
+def run_migrations(store, legacy_logs=()):
+    """Apply pending migrations, printing each; returns [(version, description)] applied."""
+    applied = store.migrate(new_member_id, legacy_logs=legacy_logs)
+    for version, description in applied:
+        print(f"✅ Migration {version}: {description}")
+    return applied
+
+
+if __name__ == "__main__":
+    # Usage: python migrations.py
+    if sys.argv[1:]:
+        print("Usage: python migrations.py")
+        sys.exit(1)
+
+    # Only the store: no writer-side app startup (mailer, rollups, live events)
+    from data_config import CHECKOUT_CSV, LOG_CSV, STORAGE_BACKEND, open_store
+
+    store = open_store()
+    run_migrations(store, legacy_logs=(LOG_CSV, CHECKOUT_CSV))
+    print(f"✅ {STORAGE_BACKEND} data is at schema version {store.schema_version()} "
+          f"(current: {store.SCHEMA_VERSION})")
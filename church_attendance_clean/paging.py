@@ -0,0 +1,87 @@
+import base64
+import heapq
+import json
+
+# Sort orders offered by the dashboard. Every key ends with the row's position
+# (CSV) or id (SQLite) so keys are unique and pages never overlap or skip rows.
+LOG_SORTS = ("newest", "oldest", "name")
+REGISTRATION_SORTS = ("oldest", "newest", "name")
+
+
+def _fold(text):
+    """Lowercase with runs of whitespace collapsed (same as storage.full_name_key)."""
+    return " ".join(text.strip().lower().split())
+
+
+def encode_cursor(key):
+    """Opaque, URL-safe cursor for the last row of a page."""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError on anything malformed."""
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("invalid cursor")
+    if not isinstance(key, list) or not key:
+        raise ValueError("invalid cursor")
+    return tuple(key)
+
+
+def sort_key(sort, name, position):
+    """Ascending keyset key; "newest" negates the position so everything sorts ascending."""
+    if sort == "newest":
+        return (-position,)
+    if sort == "name":
+        return (_fold(name), position)
+    return (position,)
+
+
+def keyset_page(keyed_items, after, limit):
+    """Smallest ``limit`` items whose key is greater than ``after``.
+
+    ``keyed_items`` is an iterable of (key, item); it is streamed and only
+    limit + 1 items are kept, so memory depends on the page size, not the data.
+    Returns (items, key of the last item or None if there is no next page).
+    """
+    if after is not None:
+        keyed_items = ((k, item) for k, item in keyed_items if k > after)
+    page = heapq.nsmallest(limit + 1, keyed_items, key=lambda pair: pair[0])
+    next_key = page[limit - 1][0] if len(page) > limit else None
+    return [item for _, item in page[:limit]], next_key
+
+
+def log_matches(row, filters):
+    """Whether a log row passes the dashboard filters.
+
+    filters: date_from / date_to (YYYY-MM-DD, inclusive), role, status
+    ("open" or "closed") and q (case-insensitive substring of the name).
+    """
+    row_date = row[2].strip()
+    if filters.get("date_from") and row_date < filters["date_from"]:
+        return False
+    if filters.get("date_to") and row_date > filters["date_to"]:
+        return False
+    if filters.get("role") and row[1].strip().lower() != filters["role"].lower():
+        return False
+    status = filters.get("status")
+    if status == "open" and row[4].strip():
+        return False
+    if status == "closed" and not row[4].strip():
+        return False
+    if filters.get("q") and _fold(filters["q"]) not in _fold(row[0]):
+        return False
+    return True
+
+
+def registration_matches(row, filters):
+    """Whether a registration row passes the dashboard filters (role, q on name/email/phone)."""
+    if filters.get("role") and row[5].strip().lower() != filters["role"].lower():
+        return False
+    q = _fold(filters.get("q") or "")
+    if q and not (q in _fold(f"{row[0]} {row[1]}") or q in row[2].lower() or q in row[3]):
+        return False
+    return True
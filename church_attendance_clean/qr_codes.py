@@ -0,0 +1,187 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import qrcode
+
+from metrics import METRICS
+
+try:
+    import fcntl  # POSIX only; the Windows build is a single process and keeps status in memory
+except ImportError:
+    fcntl = None
+
+
+def payload_hash(payload):
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def render_qr_png(payload):
+    """Render one QR to PNG bytes."""
+    out = io.BytesIO()
+    qrcode.make(payload).save(out, "PNG")
+    return out.getvalue()
+
+
+class QrCache:
+    """Bounded LRU of rendered QR PNGs, keyed by the payload they encode.
+
+    Rendering is deterministic, so the payload hash doubles as a strong ETag and
+    a conditional request can be answered without rendering anything.
+    """
+
+    def __init__(self, max_items=512):
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._images = OrderedDict()  # payload -> png bytes, least recently used first
+
+    @staticmethod
+    def etag(payload):
+        return payload_hash(payload)
+
+    def __contains__(self, payload):
+        with self._lock:
+            return payload in self._images
+
+    def put(self, payload, png):
+        with self._lock:
+            self._images[payload] = png
+            self._images.move_to_end(payload)
+            while len(self._images) > self.max_items:
+                self._images.popitem(last=False)
+
+    def png(self, payload):
+        with self._lock:
+            png = self._images.get(payload)
+            if png is not None:
+                self._images.move_to_end(payload)
+                return png
+        with METRICS.timer("attendance_qr_render_seconds"):
+            png = render_qr_png(payload)  # outside the lock; a duplicate render is harmless
+        self.put(payload, png)
+        return png
+
+
+class QrRegenJob:
+    """Background bulk QR refresh for /update-qr-codes.
+
+    Works out each member's QR URL, saves the changed QR links with a single
+    registrations write, and pre-renders as many images as the cache holds so
+    the next round of /qr requests is served from memory. The cache belongs to
+    the process running the job: under several workers the others still render
+    on first request. The status counts images already ``cached`` apart from
+    ``over_capacity`` ones the cache had no room for.
+    Progress is read with status(). With a ``status_path`` the status lives in
+    that file instead, so under several worker processes only one run happens
+    at a time and any worker can report its progress.
+    """
+
+    def __init__(self, cache, status_path=None):
+        self.cache = cache
+        self.status_path = str(status_path) if status_path and fcntl is not None else None
+        self._lock = threading.Lock()
+        self._status = {"state": "idle"}
+
+    @contextmanager
+    def _shared_lock(self):
+        if not self.status_path:
+            yield
+            return
+        with open(f"{self.status_path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_shared(self):
+        try:
+            with open(self.status_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"state": "idle"}
+
+    def _write_shared(self):
+        tmp = f"{self.status_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._status, f)
+        os.replace(tmp, self.status_path)
+
+    def status(self):
+        if self.status_path:
+            status = self._read_shared()
+        else:
+            with self._lock:
+                status = dict(self._status)
+        status.pop("pid", None)
+        return status
+
+    def _update(self, **fields):
+        with self._lock:
+            self._status.update(fields)
+            if self.status_path:
+                self._write_shared()
+
+    def _running(self):
+        if not self.status_path:
+            return self._status.get("state") == "running"
+        current = self._read_shared()
+        if current.get("state") != "running":
+            return False
+        pid = current.get("pid")
+        if pid:
+            try:
+                os.kill(pid, 0)  # a worker that died mid-run doesn't block the next one
+            except ProcessLookupError:
+                return False
+            except OSError:
+                pass
+        return True
+
+    def start(self, store, base_url, qr_url_for):
+        """Kick off a run; returns False if one is already in progress."""
+        with self._lock, self._shared_lock():
+            if self._running():
+                return False
+            self._status = {"state": "running", "total": 0, "rendered": 0, "cached": 0,
+                            "over_capacity": 0, "links_updated": 0, "started": time.time(), "finished": None, "error": "",
+                            "pid": os.getpid()}
+            if self.status_path:
+                self._write_shared()
+        threading.Thread(target=self._run, args=(store, base_url, qr_url_for),
+                         name="qr-regen", daemon=True).start()
+        return True
+
+    def _run(self, store, base_url, qr_url_for):
+        try:
+            # Save updated QR links (one write, and only if something changed)
+            urls, changes = [], {}
+            for i, reg in enumerate(store.registration_rows()):
+                if i == 0 or len(reg) < 8 or not reg[7]:
+                    continue  # header row or no QR yet
+                url = qr_url_for(base_url, reg)
+                urls.append(url)
+                if reg[7] != url:
+                    reg[7] = url
+                    changes[i] = reg
+            if changes:
+                store.update_registrations(changes)
+            self._update(links_updated=len(changes))
+
+            # Warm the cache, rendering no more than it has room for
+            missing = [url for url in urls if url not in self.cache]
+            room = max(0, self.cache.max_items - (len(urls) - len(missing)))
+            self._update(total=len(urls), cached=len(urls) - len(missing),
+                         over_capacity=max(0, len(missing) - room))
+            for rendered, url in enumerate(missing[:room], 1):
+                self.cache.png(url)
+                self._update(rendered=rendered)
+            self._update(state="done", finished=time.time())
+        except Exception as e:
+            print(f"❌ QR regeneration failed: {e}")
+            self._update(state="failed", error=str(e), finished=time.time())
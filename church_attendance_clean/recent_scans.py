@@ -0,0 +1,68 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl  # POSIX only; the Windows build is a single process and needs just the thread lock
+except ImportError:
+    fcntl = None
+
+
+class RecentScans:
+    """Which badges were scanned in the last ``cooldown`` seconds, shared by every worker process.
+
+    The table is a small memory-mapped file that each worker maps: ``slots``
+    entries of (8-byte key digest, expiry time). A key hashes to a bucket of
+    WAYS slots; a new key takes an expired slot, or else the one that expires
+    soonest. So the table never grows, old entries fall out on their own, and
+    a lookup is a hash plus a few memory reads - no disk I/O on the request path.
+    """
+
+    ENTRY = struct.Struct("<8sd")
+    WAYS = 4
+
+    def __init__(self, path, cooldown=8, slots=4096):
+        self.cooldown = cooldown
+        self.buckets = max(1, slots // self.WAYS)
+        size = self.buckets * self.WAYS * self.ENTRY.size
+        self._fd = os.open(str(path), os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size != size:
+            os.ftruncate(self._fd, size)  # new file, or resized: start empty
+        self._map = mmap.mmap(self._fd, size)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def seen(self, key):
+        """True if ``key`` was scanned within the cooldown; otherwise remember it from now."""
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+        base = int.from_bytes(digest, "little") % self.buckets * self.WAYS * self.ENTRY.size
+        now = time.time()
+        with self._locked():
+            victim = victim_expiry = None
+            for way in range(self.WAYS):
+                offset = base + way * self.ENTRY.size
+                slot_digest, expires = self.ENTRY.unpack_from(self._map, offset)
+                if slot_digest == digest:
+                    if expires > now:
+                        return True
+                    victim = offset
+                    break
+                if victim is None or expires < victim_expiry:
+                    victim, victim_expiry = offset, expires
+            self.ENTRY.pack_into(self._map, victim, digest, now + self.cooldown)
+        return False
@@ -0,0 +1,102 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl  # POSIX only; the Windows build is a single process and needs just the thread lock
+except ImportError:
+    fcntl = None
+
+
+class SyncLedger:
+    """Idempotency keys of offline scans already applied, shared by every worker process.
+
+    A station resends a batch until it gets an answer, so the same scan can
+    arrive twice, or at two workers at once. apply() holds an exclusive lock
+    while it runs a batch, skips keys already in the ledger (returning their
+    first result again) and appends one JSON line per new scan. Past max_bytes
+    the ledger rotates to <path>.1, so keys are remembered for at least one
+    full file - far longer than any station keeps retrying.
+    """
+
+    def __init__(self, path, max_bytes=2_000_000):
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self._results = {}
+        self._inode = None
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(f"{self.path}.lock", "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read(self, path, offset=0):
+        """Load entries from ``path`` after ``offset``; returns (inode, new offset)."""
+        try:
+            with open(path, "rb") as f:
+                inode = os.fstat(f.fileno()).st_ino
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # torn by a crash mid-write; the scan will be retried
+                    offset += len(line)
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._results[entry["key"]] = entry["result"]
+        except FileNotFoundError:
+            return None, 0
+        return inode, offset
+
+    def _catch_up(self):
+        """Pick up what other processes appended (or a rotation) since our last batch."""
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            inode = None
+        if inode is not None and inode == self._inode:
+            self._inode, self._offset = self._read(self.path, self._offset)
+            return
+        self._results = {}
+        self._read(f"{self.path}.1")
+        self._inode, self._offset = self._read(self.path)
+
+    def apply(self, events, handle):
+        """Run ``handle(event)`` for each event with a new "key", in order.
+
+        Returns one result per event; repeats get the stored result with
+        "duplicate": True.
+        """
+        results = []
+        with self._locked():
+            self._catch_up()
+            if self._offset > self.max_bytes:
+                os.replace(self.path, f"{self.path}.1")
+                self._inode, self._offset = None, 0
+            with open(self.path, "a", encoding="utf-8") as f:
+                for event in events:
+                    key = event["key"]
+                    if key in self._results:
+                        results.append(dict(self._results[key], duplicate=True))
+                        continue
+                    result = handle(event)
+                    f.write(json.dumps({"key": key, "result": result}, separators=(",", ":")) + "\n")
+                    f.flush()
+                    self._results[key] = result
+                    results.append(result)
+                os.fsync(f.fileno())
+            st = os.stat(self.path)  # everything up to here is ours and already in _results
+            self._inode, self._offset = st.st_ino, st.st_size
+        return results
@@ -0,0 +1,230 @@
+import heapq
+import math
+import re
+import threading
+from itertools import chain
+
+PREFIX_LEN = 8      # longest prefix posted; longer query words are verified with startswith
+FUZZY_MIN_LEN = 3   # shorter queries would "fuzzily" match most of the roster
+FUZZY_MIN_SCORE = 0.4
+TYPO_MIN_LEN = 4    # words this long may be one typo (or two swapped letters) off a name
+TYPO_SCORE = 0.9    # ranks a one-typo name above partial trigram overlaps
+
+EXACT, PREFIX, FUZZY = 0, 1, 2
+
+
+def _fold(text):
+    return " ".join(text.strip().lower().split())
+
+
+def _digits(text):
+    return re.sub(r"\D", "", text)
+
+
+def trigrams(token):
+    """Padded trigrams ("  j", " jo", "joh", ...) so short words and typos still overlap."""
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def deletions(token):
+    """The token and every copy with one letter removed; two words one typo apart share one."""
+    return {token} | {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def edit_distance(a, b):
+    """Optimal string alignment distance: insert, delete, substitute or swap two neighbours, 1 each."""
+    if abs(len(a) - len(b)) > 1:
+        return 2  # callers only care about 0 or 1
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        row = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            row[j] = min(prev[j] + 1, row[j - 1] + 1, prev[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                row[j] = min(row[j], prev2[j - 2] + 1)
+        prev2, prev = prev, row
+    return prev[-1]
+
+
+class SearchIndex:
+    """In-memory typeahead index over registration name, email and phone.
+
+    Members are keyed by their registration index. Prefix postings answer
+    "starts with" lookups in one dict hit per query word; trigram postings find
+    substring and misspelled matches without scanning every member; deletion
+    postings over name words catch single typos and swapped letters ("jhon"),
+    which share too few trigrams with the name to score. sync()
+    applies appended and edited rows incrementally; anything that shifts
+    positions (a deletion) rebuilds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._synced = None       # the rows list last synced (identity fast path)
+        self._keys = []           # per-position identity of what we indexed, for diffing
+        self._reset()
+
+    def _reset(self):
+        self.members = {}         # index -> (name, email, phone) as displayed
+        self.tokens = {}          # index -> [searchable tokens]
+        self.exact = {}           # full name / email / phone digits -> {index}
+        self.prefixes = {}        # prefix -> {index}
+        self.grams = {}           # trigram -> {index}
+        self.typos = {}           # name word, or it less one letter -> {index}
+
+    # --------------------- building ---------------------
+
+    def sync(self, rows):
+        """Bring the index up to date with registration rows (index 0 = header)."""
+        with self._lock:
+            if rows is self._synced:
+                return
+            keys = [tuple(row[:4]) for row in rows]
+            old = self._keys
+            changed = [i for i in range(min(len(old), len(keys))) if keys[i] != old[i]]
+            if len(keys) < len(old) or len(changed) > max(10, len(keys) // 10):
+                self._reset()
+                old, changed = [], []
+            for index in changed:
+                self._remove(index)
+                self._add(index, rows[index])
+            for index in range(len(old), len(rows)):
+                self._add(index, rows[index])
+            self._keys = keys
+            self._synced = rows
+
+    def _add(self, index, row):
+        if len(row) < 4 or row[0].strip() == "First Name":
+            return
+        name = f"{row[0].strip()} {row[1].strip()}"
+        email = row[2].strip().lower()
+        phone = row[3].strip()
+        folded = _fold(name)
+
+        tokens = folded.split()
+        if email:
+            tokens += [email, email.split("@")[0]]
+        if _digits(phone):
+            tokens.append(_digits(phone))
+
+        self.members[index] = (name, email, phone)
+        self.tokens[index] = tokens
+        for value in (folded, email, _digits(phone)):
+            if value:
+                self.exact.setdefault(value, set()).add(index)
+        for token in tokens:
+            for n in range(1, min(len(token), PREFIX_LEN) + 1):
+                self.prefixes.setdefault(token[:n], set()).add(index)
+            for gram in trigrams(token):
+                self.grams.setdefault(gram, set()).add(index)
+        for word in folded.split():
+            if len(word) >= TYPO_MIN_LEN:
+                for variant in deletions(word):
+                    self.typos.setdefault(variant, set()).add(index)
+
+    def _remove(self, index):
+        member = self.members.pop(index, None)
+        if member is None:
+            return
+        tokens = self.tokens.pop(index)
+        name, email, phone = member
+
+        def discard(table, key):
+            postings = table.get(key)
+            if postings is not None:
+                postings.discard(index)
+                if not postings:
+                    del table[key]
+
+        for value in (_fold(name), email, _digits(phone)):
+            if value:
+                discard(self.exact, value)
+        for token in tokens:
+            for n in range(1, min(len(token), PREFIX_LEN) + 1):
+                discard(self.prefixes, token[:n])
+            for gram in trigrams(token):
+                discard(self.grams, gram)
+        for word in _fold(name).split():
+            if len(word) >= TYPO_MIN_LEN:
+                for variant in deletions(word):
+                    discard(self.typos, variant)
+
+    # --------------------- querying ---------------------
+
+    def search(self, query, limit=20):
+        """Top ``limit`` (index, (name, email, phone)) matches: exact, then prefix, then substring/fuzzy."""
+        q = _fold(query)
+        if not q:
+            return []
+        with self._lock:
+            ranked = {}
+            exact = set(self.exact.get(q, ()))
+            if re.fullmatch(r"[\d\s()+-]{3,}", q):  # looks like a phone number
+                exact |= self.exact.get(_digits(q), set())
+            for index in exact:
+                ranked[index] = (EXACT, 0)
+
+            # Every query word must start some token of the member
+            words = q.split()
+            candidates = None
+            for word in words:
+                found = {i for i in self.prefixes.get(word[:PREFIX_LEN], ())
+                         if len(word) <= PREFIX_LEN or any(t.startswith(word) for t in self.tokens[i])}
+                candidates = found if candidates is None else candidates & found
+            for index in candidates or ():
+                ranked.setdefault(index, (PREFIX, 0))
+
+            if len(ranked) < limit and len(q) >= FUZZY_MIN_LEN:
+                for index, score in chain(self._typos(q), self._fuzzy(q)):
+                    ranked[index] = min(ranked.get(index, (FUZZY, -score)), (FUZZY, -score))
+
+            top = heapq.nsmallest(limit, ranked, key=lambda i: (ranked[i], _fold(self.members[i][0]), i))
+            return [(index, self.members[index]) for index in top]
+
+    def _typos(self, q):
+        """(index, TYPO_SCORE) for members with a name word at most one edit from a long query
+        word, whose every other query word starts (or is one edit from) one of their tokens."""
+        words = q.split()
+        long_words = [w for w in words if len(w) >= TYPO_MIN_LEN]
+        if not long_words:
+            return
+        candidates = set()
+        for variant in deletions(max(long_words, key=len)):
+            candidates |= self.typos.get(variant, set())
+
+        def close(word, token):
+            return token.startswith(word) or (len(word) >= TYPO_MIN_LEN and edit_distance(word, token) <= 1)
+
+        for index in candidates:
+            if all(any(close(w, t) for t in self.tokens[index]) for w in words):
+                yield index, TYPO_SCORE
+
+    def _fuzzy(self, q):
+        """(index, score) for members containing ``q`` (score 1.0) or sharing enough trigrams.
+
+        Only the rarest postings are read: a member reaching the score threshold
+        must hold at least one of the (k - needed + 1) rarest query trigrams, and
+        a substring match must hold every inner trigram, so the common ones
+        ("  j", "son") never have to be walked.
+        """
+        compact = q.replace(" ", "")
+        q_grams = sorted(trigrams(compact), key=lambda g: len(self.grams.get(g, ())))
+        needed = max(1, math.ceil(FUZZY_MIN_SCORE * len(q_grams)))
+        candidates = set()
+        for gram in q_grams[:len(q_grams) - needed + 1]:
+            candidates |= self.grams.get(gram, set())
+        inner = [g for g in q_grams if " " not in g]
+        if inner:
+            candidates |= self.grams.get(inner[0], set())  # the rarest inner trigram
+
+        postings = [self.grams.get(g, set()) for g in q_grams]
+        inner_postings = [self.grams.get(g, set()) for g in inner]
+        for index in candidates:
+            if all(index in p for p in inner_postings) and (
+                    q in _fold(self.members[index][0]) or any(q in t for t in self.tokens[index])):
+                yield index, 1.0  # plain substring, e.g. the last digits of a phone number
+                continue
+            score = sum(index in p for p in postings) / len(q_grams)
+            if score >= FUZZY_MIN_SCORE:
+                yield index, score
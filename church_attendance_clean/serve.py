@@ -0,0 +1,147 @@
+"""Production server for the attendance app.
+
+Usage:
+    python serve.py [--workers 4] [--threads 8] [--host 0.0.0.0] [--port 5000]
+                    [--no-browser] [--dev]
+
+With more than one worker (Linux/macOS) this runs gunicorn: a master process
+forking ``--workers`` processes, each importing the app itself and serving
+``--threads`` requests at once. With one worker, or where gunicorn is not
+available (Windows), it runs waitress: one process, ``--threads`` threads.
+``--dev`` is the old Flask debug server with the reloader. ``python app.py``
+takes the same options: it calls main() before running any of its own startup.
+The app module is only imported in the process that serves it - never in the
+gunicorn master, so the writer, mailer and maintenance threads and the data
+migrations start once per worker, after the fork.
+
+Everything the workers share lives on disk (data files under a cross-process
+lock, the live event journal, the scan sync ledger, the mail outbox, QR job
+status); per-worker metrics are added up through a scratch directory that is
+removed on exit. The LAN address is opened in a browser once the server is
+starting, as before.
+"""
+import argparse
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import webbrowser
+
+
+def get_local_ip():
+    """Return the LAN IP (e.g., 192.168.x.x)."""
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        # Uses routing table to pick the active interface; no traffic is sent.
+        s.connect(("8.8.8.8", 80))
+        ip = s.getsockname()[0]
+    except Exception:
+        try:
+            ip = socket.gethostbyname(socket.gethostname())
+        except Exception:
+            ip = "127.0.0.1"  # input your ip address
+    finally:
+        s.close()
+    return ip
+
+
+def open_browser(port, delay=1.0):
+    def run():
+        # Small delay so the server is listening before we open the page
+        time.sleep(delay)
+        webbrowser.open(f"http://{get_local_ip()}:{port}")
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def gunicorn_available():
+    try:
+        import gunicorn.app.base  # noqa: F401  (POSIX only)
+    except ImportError:
+        return False
+    return True
+
+
+def serve_workers(host, port, workers, threads):
+    """gunicorn, gthread workers; each worker imports the app after the fork."""
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            # Imported in the worker, so its writer/mailer threads start in that process
+            from app import app
+            return app
+
+    share_dir = tempfile.mkdtemp(prefix="attendance-metrics-")
+    os.environ["METRICS_SHARE_DIR"] = share_dir
+    try:
+        Server({
+            "bind": f"{host}:{port}",
+            "workers": workers,
+            "threads": threads,
+            "worker_class": "gthread",
+            "timeout": 60,
+            "graceful_timeout": 10,
+        }).run()
+    finally:
+        shutil.rmtree(share_dir, ignore_errors=True)
+
+
+def serve_threaded(app, host, port, threads):
+    """waitress: one process, ``threads`` worker threads (works everywhere, including Windows)."""
+    try:
+        from waitress import serve
+    except ImportError:
+        print("⚠️ waitress is not installed (pip install -r requirements.txt); "
+              "falling back to Flask's threaded server")
+        app.run(host=host, port=port, threaded=True)
+        return
+    serve(app, host=host, port=port, threads=threads)
+
+
+def main(argv=None):
+    """Parse options and serve."""
+    default_workers = min(4, os.cpu_count() or 1) if gunicorn_available() else 1
+    parser = argparse.ArgumentParser(description="Serve the attendance app.")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_WORKERS", default_workers)),
+                        help="worker processes (gunicorn; Linux/macOS)")
+    parser.add_argument("--threads", type=int, default=int(os.getenv("WEB_THREADS", "8")),
+                        help="request threads per worker; each open live dashboard holds one")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"),
+                        help="interface to listen on (all, so other devices on Wi-Fi can reach it)")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "5000")))
+    parser.add_argument("--no-browser", action="store_true", help="don't open the LAN address in a browser")
+    parser.add_argument("--dev", action="store_true", help="Flask debug server with the reloader")
+    args = parser.parse_args(argv)
+
+    if not args.no_browser and not os.environ.get("WERKZEUG_RUN_MAIN"):  # not again in the reloader's child
+        open_browser(args.port)
+
+    if args.workers > 1 and not args.dev:
+        if gunicorn_available():
+            print(f"✅ Serving on {args.host}:{args.port} with {args.workers} workers x {args.threads} threads")
+            serve_workers(args.host, args.port, args.workers, args.threads)
+            return
+        print("⚠️ gunicorn is not available on this system; serving from one process")
+
+    from app import app  # loaded here, in the serving process, and only here
+    if args.dev:
+        app.run(host=args.host, port=args.port, debug=True)
+        return
+    print(f"✅ Serving on {args.host}:{args.port} with {args.threads} threads")
+    serve_threaded(app, args.host, args.port, args.threads)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
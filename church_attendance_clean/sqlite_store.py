@@ -0,0 +1,492 @@
+import csv
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import date
+
+from member_tokens import new_member_id
+from paging import sort_key
+from search_index import SearchIndex
+from storage import REG_HEADER, LogPartitions, full_name_key, iter_merged_logs
+
+MEMBER_COLUMNS = [
+    "first_name", "last_name", "email", "phone", "gender", "role", "children",
+    "qr_link", "minor", "parent_name", "address", "date_of_birth", "member_id",
+]
+LOG_COLUMNS = ["name", "role", "date", "checkin", "checkout", "method", "parent"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS members (
+    id            INTEGER PRIMARY KEY,
+    first_name    TEXT NOT NULL DEFAULT '',
+    last_name     TEXT NOT NULL DEFAULT '',
+    email         TEXT NOT NULL DEFAULT '',
+    phone         TEXT NOT NULL DEFAULT '',
+    gender        TEXT NOT NULL DEFAULT '',
+    role          TEXT NOT NULL DEFAULT '',
+    children      TEXT NOT NULL DEFAULT '',
+    qr_link       TEXT NOT NULL DEFAULT '',
+    minor         TEXT NOT NULL DEFAULT '',
+    parent_name   TEXT NOT NULL DEFAULT '',
+    address       TEXT NOT NULL DEFAULT '',
+    date_of_birth TEXT NOT NULL DEFAULT '',
+    member_id     TEXT NOT NULL DEFAULT '',
+    name_key      TEXT NOT NULL,
+    email_key     TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS members_name  ON members(name_key);
+CREATE INDEX IF NOT EXISTS members_email ON members(email_key);
+CREATE INDEX IF NOT EXISTS members_phone ON members(phone);
+CREATE INDEX IF NOT EXISTS members_role  ON members(role);
+
+CREATE TABLE IF NOT EXISTS attendance (
+    id       INTEGER PRIMARY KEY,
+    name     TEXT NOT NULL,
+    role     TEXT NOT NULL DEFAULT '',
+    date     TEXT NOT NULL DEFAULT '',
+    checkin  TEXT NOT NULL DEFAULT '',
+    checkout TEXT NOT NULL DEFAULT '',
+    method   TEXT NOT NULL DEFAULT '',
+    parent   TEXT NOT NULL DEFAULT '',
+    name_key TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS attendance_open ON attendance(name_key, date, checkout);
+CREATE INDEX IF NOT EXISTS attendance_date ON attendance(date, checkout);
+
+-- members_version changes with every members write (any process), so in-memory
+-- indexes built from the table know when to catch up
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('members_version', 0);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('schema_version', 0);
+CREATE TRIGGER IF NOT EXISTS members_insert_version AFTER INSERT ON members
+BEGIN UPDATE meta SET value = value + 1 WHERE key = 'members_version'; END;
+CREATE TRIGGER IF NOT EXISTS members_update_version AFTER UPDATE ON members
+BEGIN UPDATE meta SET value = value + 1 WHERE key = 'members_version'; END;
+CREATE TRIGGER IF NOT EXISTS members_delete_version AFTER DELETE ON members
+BEGIN UPDATE meta SET value = value + 1 WHERE key = 'members_version'; END;
+"""
+
+# Statements are constant strings so sqlite3's per-connection statement cache
+# prepares each one once.
+SQL_INSERT_MEMBER = (
+    f"INSERT INTO members ({', '.join(MEMBER_COLUMNS)}, name_key, email_key) "
+    f"VALUES ({', '.join('?' * (len(MEMBER_COLUMNS) + 2))})"
+)
+SQL_UPDATE_MEMBER = (
+    f"UPDATE members SET {', '.join(c + ' = ?' for c in MEMBER_COLUMNS)}, name_key = ?, email_key = ? "
+    "WHERE id = ?"
+)
+SQL_INSERT_LOG = (
+    f"INSERT INTO attendance ({', '.join(LOG_COLUMNS)}, name_key) "
+    f"VALUES ({', '.join('?' * (len(LOG_COLUMNS) + 1))})"
+)
+SQL_SELECT_MEMBERS = f"SELECT {', '.join(MEMBER_COLUMNS)} FROM members ORDER BY id"
+SQL_SELECT_LOGS = f"SELECT {', '.join(LOG_COLUMNS)} FROM attendance ORDER BY id"
+SQL_OPEN_ON_DATE = (f"SELECT {', '.join(LOG_COLUMNS)} FROM attendance"
+                    " WHERE name_key = ? AND date = ? AND checkout = ''")
+SQL_FIRST_OPEN = (f"SELECT id, {', '.join(LOG_COLUMNS)} FROM attendance"
+                  " WHERE name_key = ? AND name = ? AND checkout = '' ORDER BY id LIMIT 1")
+SQL_MEMBER_BY_NAME = f"SELECT {', '.join(MEMBER_COLUMNS)} FROM members WHERE name_key = ? ORDER BY id LIMIT 1"
+SQL_MEMBER_ID_AT = "SELECT id FROM members ORDER BY id LIMIT 1 OFFSET ?"
+SQL_MEMBER_BY_MEMBER_ID = f"SELECT {', '.join(MEMBER_COLUMNS)} FROM members WHERE member_id = ? LIMIT 1"
+SQL_MEMBERS_VERSION = "SELECT value FROM meta WHERE key = 'members_version'"
+SQL_SCHEMA_VERSION = "SELECT value FROM meta WHERE key = 'schema_version'"
+SQL_IS_OPEN = "SELECT 1 FROM attendance WHERE name_key = ? AND date = ? AND checkout = '' LIMIT 1"
+
+# Keyset conditions and orderings per dashboard sort; the "newest" key is (-id,)
+KEYSET = {
+    "newest": ("id < -?", "id DESC"),
+    "oldest": ("id > ?", "id"),
+    "name": ("(name_key, id) > (?, ?)", "name_key, id"),
+}
+
+
+def _pad(row, width):
+    row = list(row[:width])
+    return row + [""] * (width - len(row))
+
+
+def _member_params(row):
+    row = _pad(row, len(MEMBER_COLUMNS))
+    return row + [full_name_key(f"{row[0]} {row[1]}"), row[2].strip().lower()]
+
+
+def _log_params(row):
+    row = _pad(row, len(LOG_COLUMNS))
+    return row + [full_name_key(row[0])]
+
+
+def _today():
+    return str(date.today())
+
+
+def _log_where(filters):
+    """WHERE clauses + params for the dashboard / API log filters."""
+    where, params = [], []
+    if filters.get("date_from"):
+        where.append("date >= ?")
+        params.append(filters["date_from"])
+    if filters.get("date_to"):
+        where.append("date <= ?")
+        params.append(filters["date_to"])
+    if filters.get("role"):
+        where.append("lower(role) = ?")
+        params.append(filters["role"].lower())
+    if filters.get("status") == "open":
+        where.append("checkout = ''")
+    elif filters.get("status") == "closed":
+        where.append("checkout != ''")
+    if filters.get("q"):
+        where.append("instr(name_key, ?) > 0")
+        params.append(full_name_key(filters["q"]))
+    return where, params
+
+
+def _keyset_query(select, where, params, sort, after, limit):
+    """Finish a page query: keyset condition, ORDER BY and LIMIT (one extra row)."""
+    condition, order = KEYSET.get(sort, KEYSET["oldest"])
+    if after is not None:
+        where = where + [condition]
+        params = params + list(after)
+    sql = select + (" WHERE " + " AND ".join(where) if where else "") + f" ORDER BY {order} LIMIT ?"
+    return sql, params + [limit + 1]
+
+
+def _page(rows, sort, limit, name_of):
+    """Split fetched (id, position, row) tuples into the page and its next key."""
+    next_key = None
+    if len(rows) > limit:
+        row_id, _, row = rows[limit - 1]
+        next_key = sort_key(sort, name_of(row), row_id)
+    return [(position, row) for _, position, row in rows[:limit]], next_key
+
+
+class SqliteStore:
+    """Same interface as storage.CsvStore, backed by one SQLite database in WAL mode.
+
+    Registration index 0 is a virtual header row so admin links keep working.
+    Log rows are addressed by their id (what log_page hands the dashboard).
+    Older databases are brought up to date by migrate(); meta.schema_version
+    records how far.
+    """
+
+    # (version, what it does, method); run in order, each exactly once per database
+    MIGRATIONS = [
+        (1, "Add the Member ID column", "_migrate_member_id_column"),
+        (2, "Give every registration a Member ID", "_migrate_member_ids"),
+    ]
+    SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        self._local = threading.local()
+        db = self._connect()
+        db.executescript(SCHEMA)
+        self.search_index = SearchIndex()
+        self._search_version = None
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=10, cached_statements=64, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _tx(self):
+        """Write transaction; BEGIN IMMEDIATE so concurrent writers queue instead of failing."""
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def _query(self, sql, params=()):
+        return self._connect().execute(sql, params)
+
+    # --------------------- schema migrations ---------------------
+
+    def schema_version(self):
+        return self._query(SQL_SCHEMA_VERSION).fetchone()[0]
+
+    def migrate(self, new_id, legacy_logs=()):
+        """Run pending MIGRATIONS in one transaction; returns [(version, description)] applied.
+
+        ``legacy_logs`` is for the CSV store's interface; a database has none.
+        """
+        applied = []
+        with self._tx() as db:
+            version = db.execute(SQL_SCHEMA_VERSION).fetchone()[0]
+            for number, description, step in self.MIGRATIONS:
+                if number <= version:
+                    continue
+                getattr(self, step)(db, new_id=new_id)
+                db.execute("UPDATE meta SET value = ? WHERE key = 'schema_version'", (number,))
+                applied.append((number, description))
+        return applied
+
+    def _migrate_member_id_column(self, db, **context):
+        # Tables created before Member IDs lack the column; newer ones already have it
+        if "member_id" not in {r[1] for r in db.execute("PRAGMA table_info(members)")}:
+            db.execute("ALTER TABLE members ADD COLUMN member_id TEXT NOT NULL DEFAULT ''")
+        db.execute("CREATE INDEX IF NOT EXISTS members_member_id ON members(member_id)")
+
+    def _migrate_member_ids(self, db, new_id, **context):
+        ids = [r[0] for r in db.execute("SELECT id FROM members WHERE member_id = '' ORDER BY id")]
+        db.executemany("UPDATE members SET member_id = ? WHERE id = ?", ((new_id(), i) for i in ids))
+
+    # --------------------- registrations ---------------------
+
+    def registration_rows(self):
+        return [list(REG_HEADER)] + [list(r) for r in self._query(SQL_SELECT_MEMBERS)]
+
+    def find_registration(self, full_name):
+        row = self._query(SQL_MEMBER_BY_NAME, (full_name_key(full_name),)).fetchone()
+        return list(row) if row else None
+
+    def find_member(self, member_id):
+        row = self._query(SQL_MEMBER_BY_MEMBER_ID, (member_id.strip().upper(),)).fetchone()
+        return list(row) if row else None
+
+    def email_exists(self, email):
+        if not email.strip():
+            return False
+        sql = "SELECT 1 FROM members WHERE email_key = ? LIMIT 1"
+        return self._query(sql, (email.strip().lower(),)).fetchone() is not None
+
+    def phone_exists(self, phone):
+        if not phone.strip():
+            return False
+        sql = "SELECT 1 FROM members WHERE phone = ? LIMIT 1"
+        return self._query(sql, (phone.strip(),)).fetchone() is not None
+
+    def names_with_role(self, *roles):
+        sql = "SELECT first_name || ' ' || last_name FROM members WHERE role = ? ORDER BY id"
+        names = []
+        for role in roles:
+            names.extend(r[0] for r in self._query(sql, (role,)))
+        return names
+
+    def children_of(self, parent_name):
+        key = full_name_key(parent_name)
+        sql = "SELECT first_name || ' ' || last_name, parent_name FROM members WHERE role = 'Child' ORDER BY id"
+        return [name for name, parents in self._query(sql)
+                if key in (full_name_key(p) for p in parents.split(","))]
+
+    def minors_listed_by(self, parent_name):
+        sql = ("SELECT children FROM members WHERE name_key = ? AND lower(role) = 'parent' "
+               "AND trim(children) != '' ORDER BY id LIMIT 1")
+        row = self._query(sql, (full_name_key(parent_name),)).fetchone()
+        return [c.strip() for c in row[0].split(",") if c.strip()] if row else []
+
+    def search_registrations(self, query, limit=20):
+        version = self._query(SQL_MEMBERS_VERSION).fetchone()[0]
+        if version != self._search_version:
+            self.search_index.sync(self.registration_rows())
+            self._search_version = version
+        return self.search_index.search(query, limit)
+
+    def registration_page(self, filters, sort="oldest", after=None, limit=50):
+        where, params = [], []
+        if filters.get("role"):
+            where.append("lower(role) = ?")
+            params.append(filters["role"].lower())
+        if filters.get("q"):
+            q = filters["q"].strip().lower()
+            where.append("(instr(name_key, ?) > 0 OR instr(email_key, ?) > 0 OR instr(phone, ?) > 0)")
+            params += [full_name_key(q), q, q]
+        # Position (for the admin links) = number of members up to and including this one
+        select = (f"SELECT id, (SELECT COUNT(*) FROM members m WHERE m.id <= members.id), "
+                  f"{', '.join(MEMBER_COLUMNS)} FROM members")
+        sql, params = _keyset_query(select, where, params, sort, after, limit)
+        rows = [(r[0], r[1], list(r[2:])) for r in self._query(sql, params)]
+        return _page(rows, sort, limit, lambda row: f"{row[0]} {row[1]}")
+
+    def add_registration(self, row):
+        self.add_registrations([row])
+
+    def add_registrations(self, rows):
+        """Insert registration rows in one transaction."""
+        with self._tx() as db:
+            db.executemany(SQL_INSERT_MEMBER, (_member_params(row) for row in rows))
+
+    def _member_id(self, db, index):
+        if index < 1:
+            return None
+        row = db.execute(SQL_MEMBER_ID_AT, (index - 1,)).fetchone()
+        return row[0] if row else None
+
+    def update_registrations(self, changes):
+        with self._tx() as db:
+            # Resolve every position before changing anything
+            ids = {index: self._member_id(db, index) for index in changes}
+            for index, row in changes.items():
+                if ids[index] is not None:
+                    db.execute(SQL_UPDATE_MEMBER, _member_params(row) + [ids[index]])
+
+    def delete_registration(self, index):
+        with self._tx() as db:
+            member_id = self._member_id(db, index)
+            if member_id is None:
+                return False
+            db.execute("DELETE FROM members WHERE id = ?", (member_id,))
+            return True
+
+    # --------------------- attendance ---------------------
+
+    def log_rows(self):
+        return [list(r) for r in self._query(SQL_SELECT_LOGS)]
+
+    def iter_logs(self, filters, after=None):
+        """Stream (id, row) pairs oldest first, filtered, starting after id ``after``."""
+        where, params = _log_where(filters)
+        if after is not None:
+            where.append("id > ?")
+            params.append(after)
+        sql = f"SELECT id, {', '.join(LOG_COLUMNS)} FROM attendance"
+        sql += (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY id"
+        for r in self._query(sql, params):
+            yield r[0], list(r[1:])
+
+    def log_page(self, filters, sort="newest", after=None, limit=50):
+        where, params = _log_where(filters)
+        select = f"SELECT id, {', '.join(LOG_COLUMNS)} FROM attendance"
+        sql, params = _keyset_query(select, where, params, sort, after, limit)
+        rows = [(r[0], r[0], list(r[1:])) for r in self._query(sql, params)]
+        return _page(rows, sort, limit, lambda row: row[0])
+
+    def is_checked_in(self, name):
+        return self._query(SQL_IS_OPEN, (full_name_key(name), _today())).fetchone() is not None
+
+    def checked_in_names(self):
+        sql = "SELECT DISTINCT name_key FROM attendance WHERE date = ? AND checkout = ''"
+        return [r[0] for r in self._query(sql, (_today(),))]
+
+    def append_logs(self, rows, skip_open=False):
+        """Returns (id, row) for each row actually written."""
+        with self._tx() as db:
+            return [(log_id, row) for log_id, row in self._insert_logs(db, rows, skip_open) if log_id is not None]
+
+    def check_in_family(self, rows):
+        """One transaction; (id, row) for every row, id None for anyone already checked in."""
+        with self._tx() as db:
+            return self._insert_logs(db, rows, True)
+
+    def _insert_logs(self, db, rows, skip_open):
+        written = []
+        for row in rows:
+            params = _log_params(row)
+            if skip_open and db.execute(SQL_IS_OPEN, (params[-1], params[2])).fetchone():
+                written.append((None, row))
+                continue
+            written.append((db.execute(SQL_INSERT_LOG, params).lastrowid, row))
+        return written
+
+    def check_out(self, names, on_date, checkout_time):
+        """Returns the closed rows, checkout time filled in."""
+        closed = []
+        with self._tx() as db:
+            for name in names:
+                params = (full_name_key(name), on_date)
+                closed.extend(list(r) for r in db.execute(SQL_OPEN_ON_DATE, params))
+                db.execute("UPDATE attendance SET checkout = ? WHERE name_key = ? AND date = ? AND checkout = ''",
+                           (checkout_time,) + params)
+        return [row[:4] + [checkout_time] + row[5:] for row in closed]
+
+    def check_out_first(self, name, checkout_time):
+        """Returns the closed row (checkout filled in) or None."""
+        with self._tx() as db:
+            row = db.execute(SQL_FIRST_OPEN, (full_name_key(name), name.strip())).fetchone()
+            if not row:
+                return None
+            db.execute("UPDATE attendance SET checkout = ? WHERE id = ?", (checkout_time, row[0]))
+            return list(row[1:5]) + [checkout_time] + list(row[6:])
+
+    def delete_log(self, log_id):
+        """Delete the log row with this id; returns the deleted row, or None."""
+        with self._tx() as db:
+            row = db.execute(f"SELECT {', '.join(LOG_COLUMNS)} FROM attendance WHERE id = ?", (log_id,)).fetchone()
+            if row:
+                db.execute("DELETE FROM attendance WHERE id = ?", (log_id,))
+            return list(row) if row else None
+
+    def clear_logs(self):
+        with self._tx() as db:
+            db.execute("DELETE FROM attendance")
+
+    def start_maintenance(self, idle_seconds=300, poll_seconds=30):
+        pass  # SQLite checkpoints its WAL on its own
+
+
+# --------------------- CSV IMPORT ---------------------
+
+def _csv_rows(path, header_first_cell):
+    """Stream data rows from a CSV file, skipping the header and blank lines."""
+    if not os.path.exists(path):
+        return
+    with open(path, newline="") as f:
+        for row in csv.reader(f):
+            if not row or row[0].strip() == header_first_cell:
+                continue
+            yield row
+
+
+def iter_csv_logs(log_dir, legacy_log_csv=None, legacy_checkout_csv=None):
+    """Every log row the CSV backend holds: a not-yet-migrated logs.csv, then the partitions."""
+    if legacy_log_csv:
+        yield from iter_merged_logs(legacy_log_csv, legacy_checkout_csv)
+    partitions = LogPartitions(log_dir)
+    for key in partitions.keys():
+        yield from partitions.iter_rows(key)
+
+
+def import_csv(store, reg_csv, log_rows, new_id=new_member_id):
+    """One streaming pass over registrations.csv and the CSV log rows into ``store``.
+
+    Short legacy rows (files not yet migrated to the current columns) are
+    padded to the current width on the way in, and rows without a Member ID
+    get one from ``new_id``: the database may already be at the current schema
+    version, so its own backfill migration would not run again. ``log_rows``
+    already has checkout events folded in (see iter_csv_logs). Returns (members, logs).
+    """
+    counts = [0, 0]
+
+    def counted(rows, slot, params):
+        for row in rows:
+            counts[slot] += 1
+            yield params(row)
+
+    with store._tx() as db:
+        db.executemany(SQL_INSERT_MEMBER, counted(_csv_rows(reg_csv, "First Name"), 0, _member_params))
+        db.executemany(SQL_INSERT_LOG, counted(log_rows, 1, _log_params))
+        store._migrate_member_ids(db, new_id=new_id)
+    return tuple(counts)
+
+
+if __name__ == "__main__":
+    # Usage: python sqlite_store.py import [db_path]
+    from data_config import REG_CSV, LOG_DIR, LOG_CSV, CHECKOUT_CSV, SQLITE_PATH
+    from migrations import run_migrations
+
+    if len(sys.argv) < 2 or sys.argv[1] != "import":
+        print("Usage: python sqlite_store.py import [db_path]")
+        sys.exit(1)
+
+    db_path = sys.argv[2] if len(sys.argv) > 2 else SQLITE_PATH
+    store = SqliteStore(db_path)
+    run_migrations(store)  # a database from an older version gets the current columns first
+    if store.registration_rows()[1:] or store.log_rows():
+        print(f"❌ {db_path} already has data; import into an empty database.")
+        sys.exit(1)
+    members, logs = import_csv(store, REG_CSV, iter_csv_logs(LOG_DIR, LOG_CSV, CHECKOUT_CSV))
+    print(f"✅ Imported {members} registrations and {logs} log rows into {db_path}")
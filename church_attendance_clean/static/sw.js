@@ -0,0 +1,41 @@
+// Scanner station service worker (served as /sw.js): keeps /scan and its QR
+// library available with no network. Scans themselves never go through here;
+// the page queues them in IndexedDB and syncs them to /api/scan/sync.
+// Bump CACHE whenever the list below or the library version changes.
+const CACHE = 'scanner-v1';
+const LIBRARY = 'https://unpkg.com/html5-qrcode@2.3.8/html5-qrcode.min.js';
+const SHELL = ['/scan', '/static/manifest.json', LIBRARY];
+
+self.addEventListener('install', event => {
+  event.waitUntil(caches.open(CACHE).then(cache => cache.addAll(SHELL)).then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', event => {
+  event.waitUntil(caches.keys()
+    .then(keys => Promise.all(keys.filter(key => key !== CACHE).map(key => caches.delete(key))))
+    .then(() => self.clients.claim()));
+});
+
+self.addEventListener('fetch', event => {
+  if (event.request.method !== 'GET') return;
+  const url = new URL(event.request.url);
+
+  if (url.href === LIBRARY) {
+    // Pinned version: the cached copy never goes stale, so never ask unpkg again
+    event.respondWith(caches.match(LIBRARY).then(hit => hit || fetch(event.request)));
+    return;
+  }
+
+  if (url.origin === location.origin && (url.pathname === '/scan' || url.pathname === '/static/manifest.json')) {
+    // Open instantly from the cache and refresh it in the background for next time
+    const network = fetch(event.request).then(response => {
+      if (response.ok) {
+        const copy = response.clone();
+        caches.open(CACHE).then(cache => cache.put(url.pathname, copy));
+      }
+      return response;
+    });
+    event.respondWith(caches.match(url.pathname).then(hit => hit || network));
+    event.waitUntil(network.catch(() => {}));
+  }
+});
@@ -0,0 +1,913 @@
+import csv
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+from itertools import islice
+
+from metrics import METRICS
+from paging import keyset_page, log_matches, registration_matches, sort_key
+from search_index import SearchIndex
+from write_queue import WriteQueue
+
+
+def file_signature(path):
+    """(mtime_ns, size) of a file, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def full_name_key(name):
+    return " ".join(name.strip().lower().split())
+
+
+REG_HEADER = [
+    "First Name", "Last Name", "Email", "Phone", "Gender",
+    "Role", "Children", "QR Link", "Minor", "Parent Name", "Address",
+    "Date of Birth", "Member ID",
+]
+MEMBER_ID = REG_HEADER.index("Member ID")  # permanent id the QR token carries
+LOG_HEADER = ["Name", "Role", "Date", "CheckIn", "CheckOut", "Method", "Parent"]
+# checkouts.csv: one appended event per checkout, pointing at its check-in row
+CHECKOUT_HEADER = ["Name", "Date", "CheckIn", "CheckOut"]
+
+
+def _is_log_header(row):
+    return bool(row) and row[0] == "Name"
+
+
+def write_rows_atomic(path, rows):
+    """Rewrite a CSV file via a temp file + rename so a crash never leaves it half-written.
+
+    ``rows`` may be a generator, even one still reading ``path``: the old file
+    stays in place until the new one is complete, so a rewrite can stream.
+    """
+    tmp = f"{path}.tmp"
+    written = 0
+
+    def counted():
+        nonlocal written
+        for row in rows:
+            written += 1
+            yield row
+
+    with open(tmp, "w", newline="") as f:
+        csv.writer(f).writerows(counted())
+    os.replace(tmp, path)
+    METRICS.inc("attendance_csv_rewrites_total")
+    METRICS.inc("attendance_csv_rows_written_total", written)
+
+
+def checkin_key(name, on_date, checkin_time):
+    return (full_name_key(name), on_date.strip(), checkin_time.strip())
+
+
+def read_checkout_events(events_path):
+    """checkouts.csv as {(name, date, checkin): [checkout times, oldest first]}."""
+    events = {}
+    if events_path and os.path.exists(events_path):
+        with open(events_path, newline="") as f:
+            reader = csv.reader(f)
+            for row in reader:
+                if len(row) < 4 or _is_log_header(row):
+                    continue
+                events.setdefault(checkin_key(row[0], row[1], row[2]), []).append(row[3])
+        METRICS.inc("attendance_csv_rows_read_total", reader.line_num)
+    return events
+
+
+def apply_checkout_events(rows, events):
+    """Fill the CheckOut cell of open rows from pending checkout events (mutates rows)."""
+    for row in rows:
+        if events and len(row) >= 5 and not row[4].strip() and not _is_log_header(row):
+            times = events.get(checkin_key(row[0], row[2], row[3]))
+            if times:
+                row[4] = times.pop(0)
+        yield row
+
+
+def iter_merged_logs(log_path, events_path=None):
+    """Stream data rows of logs.csv with checkout events folded in."""
+    if not os.path.exists(log_path):
+        return
+    events = read_checkout_events(events_path)
+    with open(log_path, newline="") as f:
+        reader = csv.reader(f)
+        try:
+            yield from apply_checkout_events((row for row in reader if row and not _is_log_header(row)), events)
+        finally:
+            METRICS.inc("attendance_csv_rows_read_total", reader.line_num)
+
+
+PARTITION_DATE = re.compile(r"\d{4}-\d{2}-\d{2}$")
+UNDATED = "undated"  # partition for rows whose Date cell isn't YYYY-MM-DD
+IMPORT_CHUNK_ROWS = 5000  # legacy logs.csv rows held at once while moving them into partitions
+
+
+class LogPartitions:
+    """Attendance log split by day: data/logs/<YYYY-MM-DD>.csv plus manifest.json.
+
+    Each partition has its own checkout events file (<date>.checkouts.csv). The
+    manifest records every partition's row count and open (not checked out)
+    count together with the file sizes they were taken at; an entry whose files
+    have a different size on disk (crash, hand edit, another process) is simply
+    recounted. Only the writer thread saves the manifest, via touch() + save().
+    """
+
+    def __init__(self, log_dir):
+        self.dir = str(log_dir)
+        self.manifest_path = os.path.join(self.dir, "manifest.json")
+        self._lock = threading.RLock()
+        self._signature = None
+        self._parts = None   # partition -> {"rows": n, "open": n, "size": [log bytes, events bytes]}
+        self._touched = set()
+        os.makedirs(self.dir, exist_ok=True)
+
+    @staticmethod
+    def key_for(on_date):
+        on_date = on_date.strip()
+        return on_date if PARTITION_DATE.match(on_date) else UNDATED
+
+    def log_path(self, key):
+        return os.path.join(self.dir, f"{key}.csv")
+
+    def events_path(self, key):
+        return os.path.join(self.dir, f"{key}.checkouts.csv")
+
+    def _sizes(self, key):
+        return [(file_signature(path) or (0, 0))[1] for path in (self.log_path(key), self.events_path(key))]
+
+    def _load(self):
+        signature = file_signature(self.manifest_path)
+        if self._parts is not None and signature == self._signature:
+            return self._parts
+        parts = {}
+        try:
+            with open(self.manifest_path) as f:
+                parts = json.load(f).get("partitions", {})
+        except (OSError, ValueError):
+            pass
+        # Partitions the manifest doesn't know about yet (e.g. it was lost) are counted on demand
+        for name in os.listdir(self.dir):
+            if name.endswith(".csv") and not name.endswith(".checkouts.csv"):
+                parts.setdefault(name[:-len(".csv")], None)
+        self._parts, self._signature = parts, signature
+        return parts
+
+    def _count(self, key):
+        rows = open_rows = 0
+        for row in iter_merged_logs(self.log_path(key), self.events_path(key)):
+            rows += 1
+            if len(row) < 5 or not row[4].strip():
+                open_rows += 1
+        return {"rows": rows, "open": open_rows, "size": self._sizes(key)}
+
+    def info(self, key):
+        """{"rows", "open"} for one partition, recounted if its files changed size."""
+        with self._lock:
+            parts = self._load()
+            entry = parts.get(key)
+            if entry is None or entry["size"] != self._sizes(key):
+                if not os.path.exists(self.log_path(key)):
+                    return {"rows": 0, "open": 0}
+                entry = parts[key] = self._count(key)
+            return entry
+
+    def keys(self, date_from="", date_to=""):
+        """Partitions in date order (undated last), limited to a date range if given."""
+        with self._lock:
+            keys = sorted(k for k in self._load() if k != UNDATED)
+            undated = UNDATED in self._parts
+        if date_from:
+            keys = [k for k in keys if k >= date_from]
+        if date_to:
+            keys = [k for k in keys if k <= date_to]
+        if undated and not (date_from or date_to):
+            keys.append(UNDATED)
+        return keys
+
+    def start_of(self, key):
+        """Global index of the first row of ``key`` (writer side, inside a batch).
+
+        Untouched partitions are taken from the manifest as loaded at the start
+        of the batch (nobody else can write while we hold the lock), so this is
+        a sum over a dict rather than a stat per partition.
+        """
+        order = lambda k: (k == UNDATED, k)
+        with self._lock:
+            parts = dict(self._load())
+        return sum(
+            parts[k]["rows"] if parts.get(k) is not None and k not in self._touched else self.info(k)["rows"]
+            for k in parts if order(k) < order(key)
+        )
+
+    def offsets(self):
+        """(partition, first position, row count) for every partition, in order."""
+        start, out = 0, []
+        for key in self.keys():
+            rows = self.info(key)["rows"]
+            out.append((key, start, rows))
+            start += rows
+        return out
+
+    def iter_rows(self, key):
+        return iter_merged_logs(self.log_path(key), self.events_path(key))
+
+    # --- writer side ---
+
+    def reload(self):
+        """Pick up the manifest from disk at the start of a write batch (another process may have saved)."""
+        with self._lock:
+            self._signature = None
+            self._touched.clear()
+
+    def touch(self, key):
+        self._touched.add(key)
+
+    def save(self):
+        """Recount the partitions written in this batch and save the manifest once."""
+        with self._lock:
+            if not self._touched:
+                return
+            parts = self._load()
+            for key in self._touched:
+                if os.path.exists(self.log_path(key)):
+                    parts[key] = self._count(key)
+                else:
+                    parts.pop(key, None)
+            self._touched.clear()
+            known = {k: v for k, v in parts.items() if v is not None}
+            tmp = f"{self.manifest_path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"partitions": known}, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.manifest_path)
+            self._signature = file_signature(self.manifest_path)
+
+    def rewrite(self, key, rows):
+        """Replace a partition's rows (events folded in); an empty partition is removed."""
+        if rows:
+            write_rows_atomic(self.log_path(key), [LOG_HEADER] + rows)
+        elif os.path.exists(self.log_path(key)):
+            os.remove(self.log_path(key))
+        if os.path.exists(self.events_path(key)):
+            os.remove(self.events_path(key))
+        self.touch(key)
+
+
+class RegistrationIndex:
+    """In-memory lookup tables over registrations.csv.
+
+    The file is parsed once and re-parsed only when its mtime or size changes,
+    so every lookup helper in app.py is a dictionary hit instead of a full scan.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._signature = None
+        self._loaded = False
+        self._reset()
+
+    def _reset(self):
+        self.rows = []
+        self.by_name = {}          # full name (lowercase) -> first matching row
+        self.by_member_id = {}     # Member ID -> row
+        self.emails = set()
+        self.phones = set()
+        self.by_role = {}          # role -> [full names]
+        self.children_of = {}      # parent name (lowercase) -> [child names] from the Parent Name column
+        self.minor_children = {}   # parent name (lowercase) -> children listed on the parent's own row
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = False
+
+    def refresh(self):
+        signature = file_signature(self.path)
+        if self._loaded and signature == self._signature:
+            return self
+        with self._lock:
+            signature = file_signature(self.path)
+            if self._loaded and signature == self._signature:
+                return self
+            self._build()
+            self._signature = signature
+            self._loaded = True
+        return self
+
+    def _build(self):
+        rows = []
+        if os.path.exists(self.path):
+            with open(self.path, newline="") as f:
+                rows = list(csv.reader(f))
+            METRICS.inc("attendance_csv_rows_read_total", len(rows))
+
+        by_name, by_member_id, emails, phones = {}, {}, set(), set()
+        by_role, children_of, minor_children = {}, {}, {}
+        for row in rows:
+            if len(row) < 2 or row[0].strip() == "First Name":
+                continue
+            key = full_name_key(f"{row[0]} {row[1]}")
+            by_name.setdefault(key, row)
+            if len(row) > MEMBER_ID and row[MEMBER_ID].strip():
+                by_member_id[row[MEMBER_ID].strip().upper()] = row
+            if len(row) > 2 and row[2]:
+                emails.add(row[2].strip().lower())
+            if len(row) > 3 and row[3]:
+                phones.add(row[3].strip())
+            if len(row) < 6:
+                continue
+            role = row[5].strip()
+            by_role.setdefault(role, []).append(f"{row[0]} {row[1]}")
+            if role.lower() == "parent" and len(row) > 6 and row[6].strip():
+                minor_children.setdefault(key, [c.strip() for c in row[6].split(",") if c.strip()])
+            if role == "Child" and len(row) > 9:
+                for parent in row[9].split(","):
+                    if parent.strip():
+                        children_of.setdefault(full_name_key(parent), []).append(f"{row[0]} {row[1]}")
+
+        # Swap in whole tables so concurrent readers never see a half-built index
+        self.rows, self.by_name, self.emails, self.phones = rows, by_name, emails, phones
+        self.by_member_id = by_member_id
+        self.by_role, self.children_of, self.minor_children = by_role, children_of, minor_children
+
+    # --- lookups ---
+
+    def get(self, full_name):
+        return self.refresh().by_name.get(full_name_key(full_name))
+
+    def get_member(self, member_id):
+        return self.refresh().by_member_id.get(member_id.strip().upper())
+
+    def has_email(self, email):
+        return email.strip().lower() in self.refresh().emails
+
+    def has_phone(self, phone):
+        return phone.strip() in self.refresh().phones
+
+    def names_with_role(self, *roles):
+        self.refresh()
+        names = []
+        for role in roles:
+            names.extend(self.by_role.get(role, []))
+        return names
+
+    def children(self, parent_name):
+        return list(self.refresh().children_of.get(full_name_key(parent_name), []))
+
+    def minors_listed_by(self, parent_name):
+        return list(self.refresh().minor_children.get(full_name_key(parent_name), []))
+
+
+class OpenCheckinIndex:
+    """Who is checked in (and not yet out) today, per today's log partition.
+
+    Write paths update it incrementally inside ``writing()``; it only re-reads
+    today's partition at date rollover or when it was changed behind its back.
+    """
+
+    def __init__(self, partitions):
+        self.partitions = partitions
+        self._lock = threading.RLock()
+        self._date = None
+        self._signature = None
+        self._writing = False
+        self._open = {}  # full name (lowercase) -> today's open check-in rows
+
+    def _file_state(self, today):
+        key = self.partitions.key_for(today)
+        return (file_signature(self.partitions.log_path(key)), file_signature(self.partitions.events_path(key)))
+
+    def invalidate(self):
+        with self._lock:
+            self._date = None
+
+    def refresh(self):
+        today = str(date.today())
+        with self._lock:
+            if self._writing:
+                return self  # the writer keeps us current; don't re-read a half-written file
+            signature = self._file_state(today)
+            if self._date == today and signature == self._signature:
+                return self
+            self._rebuild(today)
+            self._date = today
+            self._signature = signature
+        return self
+
+    def _rebuild(self, today):
+        open_rows = {}
+        for row in self.partitions.iter_rows(self.partitions.key_for(today)):
+            if len(row) >= 5 and not row[4].strip():
+                open_rows.setdefault(full_name_key(row[0]), []).append(row)
+        self._open = open_rows
+
+    @contextmanager
+    def writing(self):
+        """Hold the index while the log is written, then adopt the new file state."""
+        with self._lock:
+            self.refresh()
+            self._writing = True
+            try:
+                yield self
+            finally:
+                self._writing = False
+                self._signature = self._file_state(self._date) if self._date else None
+
+    def add(self, row):
+        if row[2].strip() == self._date:
+            self._open.setdefault(full_name_key(row[0]), []).append(row)
+
+    def remove(self, name, on_date=None):
+        """Drop the oldest open row for ``name``; returns it (None if there was none today)."""
+        if on_date is not None and on_date != self._date:
+            return None
+        key = full_name_key(name)
+        rows = self._open.get(key)
+        if not rows:
+            return None
+        row = rows.pop(0)
+        if not rows:
+            del self._open[key]
+        return row
+
+    # --- lookups ---
+
+    def is_open(self, name):
+        return full_name_key(name) in self.refresh()._open
+
+    def open_rows(self, name):
+        return list(self.refresh()._open.get(full_name_key(name), []))
+
+    def names(self):
+        return list(self.refresh()._open)
+
+
+class CsvStore:
+    """Registrations in registrations.csv, attendance in per-day partitions under logs/.
+
+    Every mutation runs as a job on one WriteQueue thread under a cross-process
+    file lock, so concurrent scanner stations (and worker processes) never
+    interleave appends with rewrites. Reads go straight to the files/indexes.
+
+    Registration indexes are positions in the file (0 is the header row), which
+    is what the admin pages link to. Log indexes count data rows across the
+    partitions in date order.
+
+    Files written by older versions are brought up to the current layout by
+    migrate(), once, before anything else touches them; data/schema.json
+    records how far they have got.
+    """
+
+    # (version, what it does, method); run in order, each exactly once per data directory
+    MIGRATIONS = [
+        (1, "Move logs.csv into per-day partitions", "_migrate_flat_log"),
+        (2, "Bring registrations.csv to the current columns", "_migrate_registration_columns"),
+        (3, "Give every registration a Member ID", "_migrate_member_ids"),
+    ]
+    SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+    def __init__(self, reg_csv, log_dir, lock_path):
+        self.reg_csv = reg_csv
+        self.schema_path = os.path.join(os.path.dirname(os.path.abspath(reg_csv)), "schema.json")
+        self.reg_index = RegistrationIndex(reg_csv)
+        self.search_index = SearchIndex()
+        self.partitions = LogPartitions(log_dir)
+        self.open_checkins = OpenCheckinIndex(self.partitions)
+        self.writer = WriteQueue(lock_path, batch_context=self._write_batch)
+
+    @contextmanager
+    def _write_batch(self):
+        """Around each write batch: keep today's index in step and save the manifest once."""
+        self.partitions.reload()
+        with self.open_checkins.writing():
+            yield
+        self.partitions.save()
+
+    # --------------------- registrations ---------------------
+
+    def registration_rows(self):
+        return [list(row) for row in self.reg_index.refresh().rows]
+
+    def find_registration(self, full_name):
+        return self.reg_index.get(full_name)
+
+    def find_member(self, member_id):
+        return self.reg_index.get_member(member_id)
+
+    def email_exists(self, email):
+        return self.reg_index.has_email(email)
+
+    def phone_exists(self, phone):
+        return self.reg_index.has_phone(phone)
+
+    def names_with_role(self, *roles):
+        return self.reg_index.names_with_role(*roles)
+
+    def children_of(self, parent_name):
+        return self.reg_index.children(parent_name)
+
+    def minors_listed_by(self, parent_name):
+        return self.reg_index.minors_listed_by(parent_name)
+
+    def search_registrations(self, query, limit=20):
+        """Ranked typeahead matches as (index, (name, email, phone))."""
+        self.search_index.sync(self.reg_index.refresh().rows)
+        return self.search_index.search(query, limit)
+
+    def registration_page(self, filters, sort="oldest", after=None, limit=50):
+        """One dashboard page of (index, row) pairs plus the next keyset key."""
+        def keyed():
+            for i, row in enumerate(self.reg_index.refresh().rows):
+                if len(row) < 2 or row[0].strip() == "First Name":
+                    continue
+                row = row + [""] * (len(REG_HEADER) - len(row))
+                if registration_matches(row, filters):
+                    yield sort_key(sort, f"{row[0]} {row[1]}", i), (i, row)
+        return keyset_page(keyed(), after, limit)
+
+    def _read_registrations(self, appends):
+        appends.flush()  # include rows queued earlier in this batch
+        if not os.path.exists(self.reg_csv):
+            return []
+        with open(self.reg_csv, newline="") as f:
+            rows = list(csv.reader(f))
+        METRICS.inc("attendance_csv_rows_read_total", len(rows))
+        return rows
+
+    def _write_registrations(self, rows):
+        write_rows_atomic(self.reg_csv, rows)
+        self.reg_index.invalidate()
+
+    # --------------------- schema migrations ---------------------
+
+    def schema_version(self):
+        try:
+            with open(self.schema_path) as f:
+                return json.load(f)["version"]
+        except FileNotFoundError:
+            return 0
+
+    def migrate(self, new_id, legacy_logs=()):
+        """Run pending MIGRATIONS as one write job (so under the cross-process lock).
+
+        ``new_id`` makes Member IDs; ``legacy_logs`` is (logs.csv, checkouts.csv)
+        from before partitioning. Returns [(version, description)] applied.
+        """
+        return self.writer.submit(self._migrate, new_id, legacy_logs)
+
+    def _migrate(self, appends, new_id, legacy_logs):
+        version, applied = self.schema_version(), []
+        for number, description, step in self.MIGRATIONS:
+            if number <= version:
+                continue
+            getattr(self, step)(appends, new_id=new_id, legacy_logs=legacy_logs)
+            tmp = f"{self.schema_path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"version": number}, f)
+            os.replace(tmp, self.schema_path)  # recorded after each step, so a crash resumes there
+            applied.append((number, description))
+        return applied
+
+    def _rewrite_registrations(self, appends, upgrade):
+        """Stream registrations.csv through ``upgrade(row, is_header)`` into a new copy."""
+        appends.flush()
+        if not os.path.exists(self.reg_csv):
+            return
+        with open(self.reg_csv, newline="") as f:
+            reader = csv.reader(f)
+            write_rows_atomic(self.reg_csv, (upgrade(row, row[:1] == ["First Name"]) for row in reader if row))
+            METRICS.inc("attendance_csv_rows_read_total", reader.line_num)
+        self.reg_index.invalidate()
+
+    def _migrate_flat_log(self, appends, legacy_logs, **context):
+        if legacy_logs:
+            self._import_flat_log(appends, *legacy_logs)
+
+    def _migrate_registration_columns(self, appends, **context):
+        # Older files lack "Date of Birth" and "Member ID" (and some rows were padded to 11 cells)
+        if not os.path.exists(self.reg_csv):
+            self._write_registrations([REG_HEADER])
+            return
+
+        def upgrade(row, is_header):
+            if is_header:
+                return row + REG_HEADER[len(row):]
+            return row + [""] * (len(REG_HEADER) - len(row))
+        self._rewrite_registrations(appends, upgrade)
+
+    def _migrate_member_ids(self, appends, new_id, **context):
+        def upgrade(row, is_header):
+            if not is_header and len(row) >= 2 and not row[MEMBER_ID].strip():
+                row[MEMBER_ID] = new_id()
+            return row
+        self._rewrite_registrations(appends, upgrade)
+
+    def add_registration(self, row):
+        self.add_registrations([row])
+
+    def add_registrations(self, rows):
+        """Append registration rows in one write."""
+        self.writer.submit(self._add_registrations, rows)
+
+    def _add_registrations(self, appends, rows):
+        appends.append(self.reg_csv, rows, header=REG_HEADER)
+        self.reg_index.invalidate()
+
+    def update_registrations(self, changes):
+        """Replace rows by index ({index: row}) in one rewrite."""
+        self.writer.submit(self._update_registrations, changes)
+
+    def _update_registrations(self, appends, changes):
+        rows = self._read_registrations(appends)
+        for index, row in changes.items():
+            if 0 <= index < len(rows):
+                rows[index] = row
+        self._write_registrations(rows)
+
+    def delete_registration(self, index):
+        return self.writer.submit(self._delete_registration, index)
+
+    def _delete_registration(self, appends, index):
+        rows = self._read_registrations(appends)
+        if not 0 <= index < len(rows):
+            return False
+        rows.pop(index)
+        self._write_registrations(rows)
+        return True
+
+    # --------------------- attendance ---------------------
+    #
+    # Each day's check-ins are appended to logs/<date>.csv. Checkouts are
+    # appended to that day's logs/<date>.checkouts.csv as events keyed by the
+    # check-in row (name, date, check-in time) instead of rewriting it; readers
+    # merge the two, and compact() folds events back in once the system has
+    # been idle. Same-day work only ever opens today's partition. Jobs run
+    # inside _write_batch, so the open check-in index and the manifest change
+    # with the files.
+
+    def _iter_partitions(self, keys):
+        """(position, row) across the given partitions; positions count from the oldest partition."""
+        wanted = set(keys)
+        for key, start, rows in self.partitions.offsets():
+            if key in wanted:
+                for i, row in enumerate(self.partitions.iter_rows(key)):
+                    yield start + i, row
+
+    def log_rows(self):
+        return [row for _, row in self._iter_partitions(self.partitions.keys())]
+
+    def iter_logs(self, filters, after=None):
+        """Stream (index, row) pairs oldest first, filtered, starting after index ``after``.
+
+        Partitions outside the date filter, or wholly before the cursor, are never opened.
+        """
+        keys = set(self.partitions.keys(filters.get("date_from", ""), filters.get("date_to", "")))
+        for key, start, rows in self.partitions.offsets():
+            if key not in keys or (after is not None and start + rows - 1 <= after):
+                continue
+            for i, row in enumerate(self.partitions.iter_rows(key)):
+                if after is not None and start + i <= after:
+                    continue
+                row = row + [""] * (len(LOG_HEADER) - len(row))
+                if log_matches(row, filters):
+                    yield start + i, row
+
+    def _iter_logs_newest(self, filters, before=None):
+        """iter_logs backwards: (index, row) newest first, starting before index ``before``."""
+        keys = set(self.partitions.keys(filters.get("date_from", ""), filters.get("date_to", "")))
+        for key, start, rows in reversed(self.partitions.offsets()):
+            if key not in keys or (before is not None and start >= before):
+                continue
+            matches = []
+            for i, row in enumerate(self.partitions.iter_rows(key)):
+                if before is not None and start + i >= before:
+                    break
+                row = row + [""] * (len(LOG_HEADER) - len(row))
+                if log_matches(row, filters):
+                    matches.append((start + i, row))
+            yield from reversed(matches)
+
+    def log_page(self, filters, sort="newest", after=None, limit=50):
+        """One dashboard page of (index, row) pairs plus the next keyset key.
+
+        "newest" and "oldest" walk the partitions in page order from the
+        cursor's partition and stop after limit + 1 matches, so a page reads a
+        day or two of log however long the history. "name" has no order on
+        disk: it streams every matching partition, keeping only limit + 1 rows.
+        """
+        if sort == "name":
+            keyed = ((sort_key(sort, row[0], i), (i, row)) for i, row in self.iter_logs(filters))
+            return keyset_page(keyed, after, limit)
+        if sort == "oldest":
+            rows = self.iter_logs(filters, after=int(after[0]) if after else None)
+        else:
+            rows = self._iter_logs_newest(filters, before=-int(after[0]) if after else None)
+        page = list(islice(rows, limit + 1))
+        next_key = sort_key(sort, "", page[limit - 1][0]) if len(page) > limit else None
+        return page[:limit], next_key
+
+    def is_checked_in(self, name):
+        return self.open_checkins.is_open(name)
+
+    def checked_in_names(self):
+        return self.open_checkins.names()
+
+    def append_logs(self, rows, skip_open=False):
+        """Append check-in rows; with skip_open, people already checked in on the row's date are left out.
+
+        Returns (index, row) for each row actually written.
+        """
+        return [(index, row) for index, row in self.writer.submit(self._append_logs, rows, skip_open)
+                if index is not None]
+
+    def check_in_family(self, rows):
+        """Check a family in as one write job: every row is validated against the open
+        check-ins on its date (and the rows before it) and the new ones appended together.
+
+        Returns (index, row) for every row; index is None for anyone already checked in.
+        """
+        return self.writer.submit(self._append_logs, rows, True)
+
+    def _append_logs(self, appends, rows, skip_open):
+        # Rows for an earlier day (offline scans) are checked against that day's
+        # partition, read before anything is appended so the indexes below hold
+        earlier = {}  # date -> names open on it, plus the rows written here
+        if skip_open:
+            for on_date in {row[2].strip() for row in rows} - {self.open_checkins._date}:
+                open_rows = self._open_rows(appends, [self.partitions.key_for(on_date)])
+                earlier[on_date] = {full_name_key(r[0]) for r in open_rows if r[2].strip() == on_date}
+        written, ends = [], {}
+        for row in rows:
+            open_names = earlier.get(row[2].strip())
+            if open_names is None:
+                already_open = skip_open and self.open_checkins.is_open(row[0])
+            else:
+                already_open = full_name_key(row[0]) in open_names
+                open_names.add(full_name_key(row[0]))
+            if already_open:
+                written.append((None, row))
+                continue
+            self.open_checkins.add(list(row))
+            key = self.partitions.key_for(row[2])
+            path = self.partitions.log_path(key)
+            if key not in ends:  # rows before this partition + what it holds on disk
+                ends[key] = self.partitions.start_of(key) + self.partitions.info(key)["rows"]
+            written.append((ends[key] + appends.pending(path), row))
+            self._append_partitioned(appends, [row])
+        return written
+
+    def _append_partitioned(self, appends, rows):
+        for row in rows:
+            key = self.partitions.key_for(row[2])
+            appends.append(self.partitions.log_path(key), [row], header=LOG_HEADER)
+            self.partitions.touch(key)
+
+    def _append_checkouts(self, appends, closed_rows, checkout_time):
+        for row in closed_rows:
+            key = self.partitions.key_for(row[2])
+            appends.append(self.partitions.events_path(key), [[row[0], row[2], row[3], checkout_time]],
+                           header=CHECKOUT_HEADER)
+            self.partitions.touch(key)
+
+    def check_out(self, names, on_date, checkout_time):
+        """Close every open row on ``on_date`` for the given names; returns the closed rows."""
+        return self.writer.submit(self._check_out, names, on_date, checkout_time)
+
+    def _check_out(self, appends, names, on_date, checkout_time):
+        closed = []
+        if on_date == self.open_checkins._date:
+            # Today's open rows are already in memory
+            for name in names:
+                while True:
+                    row = self.open_checkins.remove(name)
+                    if row is None:
+                        break
+                    closed.append(row)
+        else:
+            keys = {full_name_key(n) for n in names}
+            closed = [row for row in self._open_rows(appends, [self.partitions.key_for(on_date)])
+                      if full_name_key(row[0]) in keys and row[2].strip() == on_date]
+        self._append_checkouts(appends, closed, checkout_time)
+        return [row[:4] + [checkout_time] + row[5:] for row in closed]
+
+    def check_out_first(self, name, checkout_time):
+        """Close the first open row whose name matches exactly, whatever its date; returns it or None."""
+        return self.writer.submit(self._check_out_first, name, checkout_time)
+
+    def _check_out_first(self, appends, name, checkout_time):
+        appends.flush()
+        # The manifest's open counts let us skip every partition with nothing open
+        keys = [k for k in self.partitions.keys() if self.partitions.info(k)["open"]]
+        for row in self._open_rows(appends, keys):
+            if row[0].strip() == name.strip():
+                self._append_checkouts(appends, [row], checkout_time)
+                self.open_checkins.remove(row[0], on_date=row[2].strip())
+                return row[:4] + [checkout_time] + row[5:]
+        return None
+
+    def _open_rows(self, appends, keys):
+        appends.flush()
+        return (row for key in keys for row in self.partitions.iter_rows(key)
+                if len(row) >= 5 and not row[4].strip())
+
+    def _rewrite_partition(self, appends, key, edit=None):
+        """Fold a partition's checkout events into it, optionally editing its data rows."""
+        appends.flush()
+        rows = list(self.partitions.iter_rows(key))
+        if edit:
+            rows = edit(rows)
+        self.partitions.rewrite(key, rows)
+
+    def compact(self, idle_seconds=0):
+        """Fold checkout events back into their partitions, if no process has written
+        the log for ``idle_seconds`` (checked again under the write lock)."""
+        self.writer.submit(self._compact, idle_seconds)
+
+    def _compact(self, appends, idle_seconds):
+        if self._idle_seconds() < idle_seconds:
+            return
+        for key in self.partitions.keys():
+            if os.path.exists(self.partitions.events_path(key)):
+                self._rewrite_partition(appends, key)
+
+    def _idle_seconds(self):
+        """Seconds since any process last wrote the log: every log write batch saves manifest.json."""
+        try:
+            return time.time() - os.path.getmtime(self.partitions.manifest_path)
+        except FileNotFoundError:
+            return float("inf")
+
+    def _has_events(self):
+        return any(name.endswith(".checkouts.csv") for name in os.listdir(self.partitions.dir))
+
+    def start_maintenance(self, idle_seconds=300, poll_seconds=30):
+        """Background thread that compacts once no process has written the log for idle_seconds."""
+        def run():
+            while True:
+                time.sleep(poll_seconds)
+                if self._idle_seconds() >= idle_seconds and self._has_events():
+                    try:
+                        self.compact(idle_seconds)
+                    except Exception as e:
+                        print(f"❌ Log compaction failed: {e}")
+
+        threading.Thread(target=run, name="log-compactor", daemon=True).start()
+
+    def delete_log(self, index):
+        """Delete the log row at ``index``; returns the deleted row, or None."""
+        return self.writer.submit(self._delete_log, index)
+
+    def _delete_log(self, appends, index):
+        appends.flush()
+        deleted = []
+
+        def drop(rows):
+            deleted.append(rows.pop(index - start))
+            return rows
+
+        for key, start, rows in self.partitions.offsets():
+            if start <= index < start + rows:
+                self._rewrite_partition(appends, key, drop)
+                break
+        self.open_checkins.invalidate()
+        return deleted[0] if deleted else None
+
+    def clear_logs(self):
+        self.writer.submit(self._clear_logs)
+
+    def _clear_logs(self, appends):
+        appends.flush()
+        for key in self.partitions.keys():
+            self.partitions.rewrite(key, [])
+        self.open_checkins.invalidate()
+
+    def _import_flat_log(self, appends, log_csv, checkout_csv):
+        """Move a pre-partitioning logs.csv (+ checkouts.csv) into logs/; returns the rows moved.
+
+        Rows stream from the old file into the day partitions IMPORT_CHUNK_ROWS
+        at a time, so memory doesn't grow with the log. The old files are
+        renamed to *.migrated rather than deleted.
+        """
+        if not os.path.exists(log_csv):
+            return 0
+        moved = 0
+        rows = iter_merged_logs(log_csv, checkout_csv)
+        while True:
+            chunk = list(islice(rows, IMPORT_CHUNK_ROWS))
+            if not chunk:
+                break
+            self._append_partitioned(appends, chunk)
+            appends.flush()
+            moved += len(chunk)
+        for path in (log_csv, checkout_csv):
+            if path and os.path.exists(path):
+                os.replace(path, f"{path}.migrated")
+        self.open_checkins.invalidate()
+        return moved
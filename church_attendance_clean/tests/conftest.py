@@ -0,0 +1,22 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# The app is a flat set of modules run from this directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """app.py imported once, against a scratch data directory."""
+    data_dir = tmp_path_factory.mktemp("data")
+    os.environ.update(DATA_DIR=str(data_dir), SCANNER_KEY="station-key", RESCAN_COOLDOWN_SECONDS="0")
+    import app
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
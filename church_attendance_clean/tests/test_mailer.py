@@ -0,0 +1,148 @@
+import os
+import socketserver
+import threading
+import time
+from email.message import EmailMessage
+
+import pytest
+
+from mailer import Mailer
+
+
+class SmtpStub(socketserver.ThreadingTCPServer):
+    """Just enough SMTP on 127.0.0.1 to take messages; the first ``fail_next`` DATA commands get a 451."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SmtpHandler)
+        self.received = []  # (recipients, message text)
+        self.fail_next = 0
+        self.lock = threading.Lock()
+
+
+class SmtpHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply("220 stub ready")
+        recipients = []
+        for raw in self.rfile:
+            command = raw.decode().strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 stub")
+            elif command.startswith("MAIL"):
+                recipients = []
+                self.reply("250 OK")
+            elif command.startswith("RCPT"):
+                recipients.append(raw.decode().split(":", 1)[1].strip().strip("<>"))
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 go ahead")
+                lines = []
+                for data in self.rfile:
+                    if data in (b".\r\n", b".\n"):
+                        break
+                    lines.append(data.decode())
+                with self.server.lock:
+                    failing = self.server.fail_next > 0
+                    if failing:
+                        self.server.fail_next -= 1
+                    else:
+                        self.server.received.append((recipients, "".join(lines)))
+                self.reply("451 try again later" if failing else "250 queued")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:  # RSET, NOOP
+                self.reply("250 OK")
+
+
+@pytest.fixture
+def smtp():
+    server = SmtpStub()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_mailer(outbox, smtp, **options):
+    options = dict(dict(use_tls=False, base_delay=0.05, poll_seconds=0.05), **options)
+    return Mailer(outbox, "127.0.0.1", smtp.server_address[1], **options)
+
+
+def message(subject):
+    msg = EmailMessage()
+    msg["Subject"] = subject
+    msg.set_content("Your QR code is attached.")
+    return msg
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_queued_messages_are_delivered(tmp_path, smtp):
+    mailer = make_mailer(tmp_path / "outbox", smtp)
+    for i in range(3):
+        mailer.enqueue(f"member{i}@example.com", message(f"QR {i}"))
+    mailer.start()
+
+    assert mailer.flush(10)
+    assert [recipients for recipients, _ in smtp.received] == [[f"member{i}@example.com"] for i in range(3)]
+    assert "Subject: QR 1" in smtp.received[1][1]
+    assert mailer.pending() == 0
+
+
+def test_failed_sends_are_retried_then_given_up(tmp_path, smtp):
+    smtp.fail_next = 2
+    mailer = make_mailer(tmp_path / "outbox", smtp, max_attempts=3).start()
+    mailer.enqueue("retry@example.com", message("retried"))
+
+    assert mailer.flush(10)
+    assert [recipients for recipients, _ in smtp.received] == [["retry@example.com"]]
+
+    smtp.fail_next = 3
+    mailer.enqueue("never@example.com", message("dropped"))
+    wait_for(lambda: os.listdir(tmp_path / "outbox" / "failed"))
+    assert len(smtp.received) == 1 and mailer.pending() == 0
+
+
+def test_one_sender_across_mailers(tmp_path, smtp):
+    first = make_mailer(tmp_path / "outbox", smtp).start()
+    second = make_mailer(tmp_path / "outbox", smtp).start()
+    for i in range(6):
+        (first if i % 2 else second).enqueue(f"member{i}@example.com", message(f"QR {i}"))
+
+    wait_for(lambda: len(smtp.received) == 6 and first.pending() == 0)
+    time.sleep(0.2)  # time for a second sender to (wrongly) send anything again
+    assert sorted(r[0] for r, _ in smtp.received) == [f"member{i}@example.com" for i in range(6)]
+    assert [first._sender_lock is not None, second._sender_lock is not None].count(True) == 1
+
+
+def test_sender_survives_unexpected_errors(tmp_path, smtp, monkeypatch):
+    outbox = tmp_path / "outbox"
+    mailer = make_mailer(outbox, smtp)
+    real_due, calls = mailer._due, []
+
+    def flaky_due():
+        calls.append(1)
+        if len(calls) == 1:
+            raise OSError("outbox unreadable")
+        return real_due()
+
+    monkeypatch.setattr(mailer, "_due", flaky_due)
+    os.makedirs(outbox, exist_ok=True)
+    (outbox / "0-corrupt.json").write_text("{not json")
+    mailer.enqueue("after@example.com", message("still sent"))
+    mailer.start()
+
+    assert mailer.flush(10)
+    assert [recipients for recipients, _ in smtp.received] == [["after@example.com"]]
+    assert os.listdir(outbox / "failed") == ["0-corrupt.json"]
@@ -0,0 +1,15 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_concurrent_manual_check_ins_write_one_row(app_module):
+    def admin_check_in(_):
+        client = app_module.app.test_client()
+        with client.session_transaction() as session:
+            session["authenticated"] = True
+        return client.post("/manual-checkin?name=Cara Vance").get_data(as_text=True)
+
+    with ThreadPoolExecutor(8) as pool:
+        replies = list(pool.map(admin_check_in, range(8)))
+
+    assert sorted(replies) == ["✅ Cara Vance manually checked in."] + ["❌ Cara Vance is already checked in."] * 7
+    assert [row[0] for row in app_module.STORE.log_rows()].count("Cara Vance") == 1
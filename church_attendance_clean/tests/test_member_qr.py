@@ -0,0 +1,27 @@
+def register(client, first, last, phone):
+    return client.post("/register", data=dict(first_name=first, last_name=last, role="Adult",
+                                               email=f"{first}.{last}@example.com", phone=phone))
+
+
+def test_qr_needs_admin_or_station_key(app_module, client):
+    register(app_module.app.test_client(), "Quinn", "Roe", "5550100")
+
+    assert client.get("/qr/Quinn Roe").status_code == 401
+    assert client.get("/qr/Nobody Here").status_code == 401  # no hint whether a name is registered
+    assert client.get("/qr/Quinn Roe", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+    station = client.get("/qr/Quinn Roe", headers={"Authorization": "Bearer station-key"})
+    assert station.status_code == 200 and station.data[:4] == b"\x89PNG"
+    with client.session_transaction() as session:
+        session["authenticated"] = True
+    assert client.get("/qr/Quinn Roe").status_code == 200
+    assert client.get("/qr/Nobody Here").status_code == 404
+
+
+def test_registrant_sees_only_their_own_qr(app_module, client):
+    register(app_module.app.test_client(), "Rita", "Moss", "5550101")
+    page = register(client, "Saul", "Moss", "5550102")
+
+    assert b"/qr/Saul" in page.data
+    assert client.get("/qr/Saul Moss").status_code == 200
+    assert client.get("/qr/Rita Moss").status_code == 401
@@ -0,0 +1,178 @@
+import csv
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from migrations import run_migrations
+from member_tokens import new_member_id
+from sqlite_store import SqliteStore
+from storage import CHECKOUT_HEADER, LOG_HEADER, MEMBER_ID, REG_HEADER, CsvStore
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+# registrations.csv as written before "Date of Birth" and "Member ID" existed
+LEGACY_REGISTRATIONS = [
+    REG_HEADER[:11],
+    ["John", "Doe", "j@example.com", "111", "Male", "Parent", "Amy Doe", "", "No", "", "1 Main St"],
+    ["Amy", "Doe", "", "", "Female", "Child", "", "", "Yes", "John Doe", ""],
+    ["Sam", "Solo", "s@example.com", "222", "", "Adult"],  # short row, as some old versions wrote
+]
+LEGACY_LOGS = [
+    LOG_HEADER,
+    ["John Doe", "Parent", "2024-03-03", "09:00:00", "", "QR", ""],
+    ["Amy Doe", "Child", "2024-03-03", "09:00:00", "", "QR", "John Doe"],
+    ["Sam Solo", "Adult", "2024-03-10", "10:15:00", "11:30:00", "Manual", ""],
+]
+LEGACY_CHECKOUTS = [CHECKOUT_HEADER, ["John Doe", "2024-03-03", "09:00:00", "11:00:00"]]
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        csv.writer(f).writerows(rows)
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    write_csv(tmp_path / "registrations.csv", LEGACY_REGISTRATIONS)
+    write_csv(tmp_path / "logs.csv", LEGACY_LOGS)
+    write_csv(tmp_path / "checkouts.csv", LEGACY_CHECKOUTS)
+    return tmp_path
+
+
+def open_csv_store(data_dir):
+    return CsvStore(data_dir / "registrations.csv", data_dir / "logs", lock_path=data_dir / ".write.lock")
+
+
+def legacy_logs(data_dir):
+    return (data_dir / "logs.csv", data_dir / "checkouts.csv")
+
+
+def test_csv_chain_upgrades_legacy_data(data_dir):
+    store = open_csv_store(data_dir)
+    assert store.schema_version() == 0
+
+    applied = run_migrations(store, legacy_logs=legacy_logs(data_dir))
+
+    assert [version for version, _ in applied] == [1, 2, 3]
+    assert store.schema_version() == CsvStore.SCHEMA_VERSION
+    assert json.loads((data_dir / "schema.json").read_text()) == {"version": 3}
+
+    rows = read_csv(data_dir / "registrations.csv")
+    assert rows[0] == REG_HEADER
+    assert all(len(row) == len(REG_HEADER) for row in rows)
+    assert rows[1][:11] == LEGACY_REGISTRATIONS[1]
+    ids = [row[MEMBER_ID] for row in rows[1:]]
+    assert all(ids) and len(set(ids)) == len(ids)
+    assert store.find_member(ids[0])[0] == "John"
+
+    # logs.csv moved into day partitions, its checkout event folded in
+    assert not (data_dir / "logs.csv").exists()
+    assert (data_dir / "logs.csv.migrated").exists() and (data_dir / "checkouts.csv.migrated").exists()
+    assert sorted(p.name for p in (data_dir / "logs").glob("*.csv")) == ["2024-03-03.csv", "2024-03-10.csv"]
+    logs = store.log_rows()
+    assert [row[0] for row in logs] == ["John Doe", "Amy Doe", "Sam Solo"]
+    assert logs[0][4] == "11:00:00" and logs[1][4] == "" and logs[2][4] == "11:30:00"
+
+
+def test_flat_log_import_streams_in_chunks(data_dir, monkeypatch):
+    monkeypatch.setattr("storage.IMPORT_CHUNK_ROWS", 2)
+    rows = [LOG_HEADER] + [[f"Member {i}", "Adult", f"2024-01-{1 + i % 28:02d}", "09:00:00", "", "QR", ""]
+                           for i in range(25)]
+    write_csv(data_dir / "logs.csv", rows)
+    store = open_csv_store(data_dir)
+    run_migrations(store, legacy_logs=legacy_logs(data_dir))
+    assert sorted(row[0] for row in store.log_rows()) == sorted(row[0] for row in rows[1:])
+
+
+def test_csv_rerun_is_a_no_op(data_dir):
+    store = open_csv_store(data_dir)
+    run_migrations(store, legacy_logs=legacy_logs(data_dir))
+    registrations = read_csv(data_dir / "registrations.csv")
+    logs = store.log_rows()
+
+    # a logs.csv appearing again later is not imported a second time
+    write_csv(data_dir / "logs.csv", LEGACY_LOGS)
+    again = open_csv_store(data_dir)
+    assert run_migrations(again, legacy_logs=legacy_logs(data_dir)) == []
+    assert read_csv(data_dir / "registrations.csv") == registrations
+    assert again.log_rows() == logs
+
+
+def test_fresh_data_dir_gets_current_layout(tmp_path):
+    store = open_csv_store(tmp_path)
+    run_migrations(store, legacy_logs=legacy_logs(tmp_path))
+    assert read_csv(tmp_path / "registrations.csv") == [REG_HEADER]
+    assert store.schema_version() == CsvStore.SCHEMA_VERSION
+
+
+def test_concurrent_startup_migrates_once(data_dir):
+    # Every worker process runs the migrations on startup; the write lock lets one do the work
+    code = (
+        "import sys; from pathlib import Path; from storage import CsvStore; "
+        "from migrations import run_migrations; d = Path(sys.argv[1]); "
+        "store = CsvStore(d / 'registrations.csv', d / 'logs', lock_path=d / '.write.lock'); "
+        "run_migrations(store, legacy_logs=(d / 'logs.csv', d / 'checkouts.csv'))"
+    )
+    workers = [subprocess.Popen([sys.executable, "-c", code, str(data_dir)], cwd=APP_DIR,
+                                stdout=subprocess.PIPE, text=True) for _ in range(4)]
+    outputs = [worker.communicate(timeout=60)[0] for worker in workers]
+    assert all(worker.returncode == 0 for worker in workers)
+
+    printed = [line for out in outputs for line in out.splitlines() if "Migration" in line]
+    assert len(printed) == 3, outputs
+    rows = read_csv(data_dir / "registrations.csv")
+    assert len(rows) == len(LEGACY_REGISTRATIONS)
+    assert len({row[MEMBER_ID] for row in rows[1:]}) == len(rows) - 1
+    assert len(open_csv_store(data_dir).log_rows()) == len(LEGACY_LOGS) - 1
+
+
+def test_sqlite_chain_backfills_member_ids(tmp_path):
+    db_path = tmp_path / "attendance.db"
+    with sqlite3.connect(db_path) as db:  # members table from before the member_id column
+        db.execute("CREATE TABLE members (id INTEGER PRIMARY KEY, first_name TEXT NOT NULL DEFAULT '', "
+                   "last_name TEXT NOT NULL DEFAULT '', email TEXT NOT NULL DEFAULT '', "
+                   "phone TEXT NOT NULL DEFAULT '', gender TEXT NOT NULL DEFAULT '', "
+                   "role TEXT NOT NULL DEFAULT '', children TEXT NOT NULL DEFAULT '', "
+                   "qr_link TEXT NOT NULL DEFAULT '', minor TEXT NOT NULL DEFAULT '', "
+                   "parent_name TEXT NOT NULL DEFAULT '', address TEXT NOT NULL DEFAULT '', "
+                   "date_of_birth TEXT NOT NULL DEFAULT '', name_key TEXT NOT NULL, "
+                   "email_key TEXT NOT NULL DEFAULT '')")
+        db.executemany("INSERT INTO members (first_name, last_name, role, name_key) VALUES (?, ?, ?, ?)",
+                       [("John", "Doe", "Parent", "john doe"), ("Sam", "Solo", "Adult", "sam solo")])
+
+    store = SqliteStore(db_path)
+    assert [version for version, _ in run_migrations(store)] == [1, 2]
+    assert store.schema_version() == SqliteStore.SCHEMA_VERSION
+    ids = [row[MEMBER_ID] for row in store.registration_rows()[1:]]
+    assert all(ids) and len(set(ids)) == 2
+    assert store.find_member(ids[1])[:2] == ["Sam", "Solo"]
+
+    assert SqliteStore(db_path).migrate(new_member_id) == []
+    assert [row[MEMBER_ID] for row in store.registration_rows()[1:]] == ids
+
+
+def test_sqlite_import_gives_legacy_registrations_member_ids(data_dir):
+    db_path = data_dir / "attendance.db"
+    run_migrations(SqliteStore(db_path))  # an empty database the app already brought to the current schema
+
+    env = dict(os.environ, DATA_DIR=str(data_dir))
+    out = subprocess.run([sys.executable, "sqlite_store.py", "import", str(db_path)], cwd=APP_DIR, env=env,
+                         capture_output=True, text=True)
+    assert out.returncode == 0, out.stderr
+
+    store = SqliteStore(db_path)
+    assert store.schema_version() == SqliteStore.SCHEMA_VERSION
+    rows = store.registration_rows()[1:]
+    assert [row[0] for row in rows] == ["John", "Amy", "Sam"]
+    assert all(row[MEMBER_ID] for row in rows) and len({row[MEMBER_ID] for row in rows}) == 3
+    assert len(store.log_rows()) == len(LEGACY_LOGS) - 1
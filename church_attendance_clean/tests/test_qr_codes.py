@@ -0,0 +1,40 @@
+import time
+
+from qr_codes import QrCache, QrRegenJob
+
+
+class FakeStore:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def registration_rows(self):
+        return [list(row) for row in self.rows]
+
+    def update_registrations(self, changes):
+        for index, row in changes.items():
+            self.rows[index] = row
+
+
+def run_job(job, store):
+    assert job.start(store, "http://host", lambda base, reg: f"{base}/M/{reg[0]}")
+    deadline = time.time() + 30
+    while job.status()["state"] == "running" and time.time() < deadline:
+        time.sleep(0.01)
+    return job.status()
+
+
+def test_regen_counts_cached_apart_from_over_capacity():
+    rows = [["First Name"] + [""] * 7] + [[f"m{i}", "", "", "", "", "", "", "old"] for i in range(5)]
+    store = FakeStore(rows)
+    cache = QrCache(max_items=3)
+    cache.put("http://host/M/m0", b"png")
+
+    status = run_job(QrRegenJob(cache), store)
+
+    assert status["state"] == "done", status
+    assert (status["total"], status["cached"], status["rendered"], status["over_capacity"]) == (5, 1, 2, 2)
+    assert status["links_updated"] == 5 and store.rows[1][7] == "http://host/M/m0"
+    assert all(f"http://host/M/m{i}" in cache for i in range(3))
+
+    status = run_job(QrRegenJob(cache), store)
+    assert (status["cached"], status["rendered"], status["over_capacity"], status["links_updated"]) == (3, 0, 2, 0)
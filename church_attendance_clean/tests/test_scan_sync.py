@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+STATION = {"Authorization": "Bearer station-key"}
+
+
+@pytest.fixture
+def register(client):
+    def register(first, last, role="Adult", children=""):
+        client.post("/register", data=dict(first_name=first, last_name=last, email=f"{first}.{last}@example.com",
+                                           phone=str(abs(hash((first, last))) % 10**9), role=role, children=children))
+        return f"{first}|{last}|{role}"
+    return register
+
+
+def sync(client, *events):
+    response = client.post("/api/scan/sync", json={"events": list(events)}, headers=STATION)
+    assert response.status_code == 200, response.data
+    return response.json["results"]
+
+
+def check_in(key, code, at):
+    return {"key": key, "code": code, "action": "check_in", "at": at.isoformat()}
+
+
+def log_rows(app_module, name, on_date):
+    return [row for row in app_module.STORE.log_rows() if row[0] == name and row[2] == str(on_date)]
+
+
+def test_earlier_day_check_in_is_not_dropped_for_being_in_today(app_module, client, register):
+    code = register("Ann", "Lee")
+    now = datetime.now().replace(microsecond=0)
+    yesterday = (now - timedelta(days=1)).replace(hour=9)
+
+    assert sync(client, check_in("ann-today", code, now))[0]["checked_in"] is True
+    result = sync(client, check_in("ann-yesterday", code, yesterday))[0]
+
+    assert result["ok"] and result["checked_in"] is True, result
+    assert len(log_rows(app_module, "Ann Lee", yesterday.date())) == 1
+
+
+def test_earlier_day_check_in_is_written_once(app_module, client, register):
+    code = register("Bob", "Ray")
+    yesterday = (datetime.now() - timedelta(days=1)).replace(hour=9, minute=0, second=0, microsecond=0)
+
+    sync(client, check_in("bob-1", code, yesterday), check_in("bob-2", code, yesterday + timedelta(minutes=5)))
+    sync(client, check_in("bob-3", code, yesterday + timedelta(minutes=10)))
+
+    rows = log_rows(app_module, "Bob Ray", yesterday.date())
+    assert len(rows) == 1 and rows[0][3] == "09:00:00", rows
@@ -0,0 +1,43 @@
+from search_index import SearchIndex, edit_distance
+
+ROWS = [
+    ["First Name", "Last Name", "Email", "Phone"],
+    ["John", "Smith", "js@example.com", "555-0101"],
+    ["Ann", "Johnson", "aj@example.com", "555-0102"],
+    ["Mary", "Jones", "", ""],
+]
+
+
+def names(index, query):
+    return [member[0] for _, member in index.search(query)]
+
+
+def test_swapped_letters_find_the_name_first():
+    index = SearchIndex()
+    index.sync(ROWS)
+    assert names(index, "jhon")[0] == "John Smith"
+    assert names(index, "jhon smith") == ["John Smith"]
+    assert names(index, "smtih") == ["John Smith"]
+
+
+def test_typo_postings_follow_edits():
+    index = SearchIndex()
+    index.sync(ROWS)
+    edited = [list(row) for row in ROWS]
+    edited[1][0] = "Peter"
+    index.sync(edited)
+    assert "John Smith" not in names(index, "jhon")
+    assert names(index, "petre")[0] == "Peter Smith"
+
+
+def test_exact_and_prefix_still_rank_first():
+    index = SearchIndex()
+    index.sync(ROWS)
+    assert names(index, "ann johnson")[0] == "Ann Johnson"
+    assert names(index, "jo") == ["Ann Johnson", "John Smith", "Mary Jones"]
+
+
+def test_edit_distance():
+    assert edit_distance("jhon", "john") == 1
+    assert edit_distance("jon", "john") == 1
+    assert edit_distance("jane", "john") > 1
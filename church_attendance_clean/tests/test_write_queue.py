@@ -0,0 +1,110 @@
+import csv
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+
+from write_queue import WriteQueue
+
+
+@pytest.fixture
+def lock_path(tmp_path):
+    return tmp_path / ".write.lock"
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_jobs_run_in_submission_order(tmp_path, lock_path):
+    writer = WriteQueue(lock_path)
+    path = tmp_path / "log.csv"
+    for i in range(20):
+        writer.submit(lambda appends, i: appends.append(path, [[str(i)]], header=["N"]), i)
+    assert read_csv(path) == [["N"]] + [[str(i)] for i in range(20)]
+
+
+def test_submit_returns_the_job_result_once_on_disk(tmp_path, lock_path):
+    writer = WriteQueue(lock_path)
+    path = tmp_path / "log.csv"
+
+    def job(appends):
+        appends.append(path, [["a"], ["b"]])
+        assert appends.pending(path) == 2
+        return "done"
+
+    assert writer.submit(job) == "done"
+    assert read_csv(path) == [["a"], ["b"]]
+
+
+def test_jobs_queued_during_a_batch_share_the_next_one(tmp_path, lock_path):
+    batches = []
+
+    @contextmanager
+    def batch_context():
+        batches.append([])
+        yield
+
+    writer = WriteQueue(lock_path, batch_context=batch_context, max_batch=5)
+    started, release = threading.Event(), threading.Event()
+
+    def blocker(appends):
+        started.set()
+        release.wait(5)
+
+    def record(appends, i):
+        batches[-1].append(i)
+
+    first = threading.Thread(target=writer.submit, args=(blocker,))
+    first.start()
+    started.wait(5)
+    threads = [threading.Thread(target=writer.submit, args=(record, i)) for i in range(8)]
+    for t in threads:
+        t.start()
+    while writer._queue.qsize() < 8:
+        time.sleep(0.001)
+    release.set()
+    for t in [first] + threads:
+        t.join(5)
+
+    assert len(batches) == 3  # the blocker alone, then 8 queued jobs capped at max_batch
+    assert [len(b) for b in batches[1:]] == [5, 3]
+    assert sorted(batches[1] + batches[2]) == list(range(8))
+
+
+def test_a_failing_job_raises_in_its_caller_only(tmp_path, lock_path):
+    writer = WriteQueue(lock_path)
+    path = tmp_path / "log.csv"
+
+    def bad(appends):
+        raise ValueError("bad row")
+
+    with pytest.raises(ValueError, match="bad row"):
+        writer.submit(bad)
+    writer.submit(lambda appends: appends.append(path, [["ok"]]))
+    assert read_csv(path) == [["ok"]]
+
+
+def test_a_failing_batch_fails_every_job_in_it(tmp_path, lock_path):
+    @contextmanager
+    def broken():
+        raise OSError("disk full")
+        yield
+
+    writer = WriteQueue(lock_path, batch_context=broken)
+    with pytest.raises(OSError, match="disk full"):
+        writer.submit(lambda appends: "never runs")
+
+
+def test_nested_submit_runs_inline(tmp_path, lock_path):
+    writer = WriteQueue(lock_path)
+    path = tmp_path / "log.csv"
+
+    def outer(appends):
+        appends.append(path, [["outer"]])
+        return writer.submit(lambda inner_appends: inner_appends is appends)
+
+    assert writer.submit(outer) is True
+    assert read_csv(path) == [["outer"]]
@@ -0,0 +1,130 @@
+import csv
+import os
+import queue
+import threading
+from contextlib import nullcontext
+
+from metrics import METRICS
+
+try:
+    import fcntl  # POSIX only; the Windows build falls back to the in-process queue alone
+except ImportError:
+    fcntl = None
+
+
+class FileLock:
+    """Exclusive advisory lock (flock) on a lock file, shared by every worker process."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._file = open(self.path, "a")
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class BufferedAppends:
+    """CSV rows queued by the jobs of one batch, written with one open + fsync per file."""
+
+    def __init__(self):
+        self._pending = {}  # path -> (header, [rows])
+
+    def append(self, path, rows, header=None):
+        if rows:
+            self._pending.setdefault(path, (header, []))[1].extend(rows)
+
+    def pending(self, path):
+        """Rows queued for ``path`` that are not on disk yet."""
+        return len(self._pending[path][1]) if path in self._pending else 0
+
+    def flush(self):
+        pending, self._pending = self._pending, {}
+        for path, (header, rows) in pending.items():
+            new_file = not os.path.exists(path)
+            with open(path, "a", newline="") as f:
+                writer = csv.writer(f)
+                if new_file and header:
+                    writer.writerow(header)
+                writer.writerows(rows)
+                f.flush()
+                os.fsync(f.fileno())
+            METRICS.inc("attendance_csv_rows_written_total", len(rows))
+
+
+class _Job:
+    __slots__ = ("fn", "args", "done", "result", "error")
+
+    def __init__(self, fn, args):
+        self.fn = fn
+        self.args = args
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class WriteQueue:
+    """Single writer thread for the data files.
+
+    ``submit(fn, *args)`` runs ``fn(appends, *args)`` on the writer thread and
+    blocks until its batch is on disk. Whatever is queued while a batch runs is
+    taken as the next batch, so under load many check-ins share one lock and one
+    flush. ``batch_context`` (if given) is entered around each batch, inside the
+    cross-process lock.
+    """
+
+    def __init__(self, lock_path, batch_context=None, max_batch=200):
+        self.lock = FileLock(lock_path)
+        self.batch_context = batch_context or nullcontext
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._appends = None
+        self._thread = threading.Thread(target=self._run, name="csv-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args):
+        if threading.current_thread() is self._thread:
+            return fn(self._appends, *args)  # nested call from inside a job
+        job = _Job(fn, args)
+        self._queue.put(job)
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                for job in batch:
+                    job.error = job.error or e
+            for job in batch:
+                job.done.set()
+
+    def _run_batch(self, batch):
+        with self.lock, self.batch_context():
+            self._appends = BufferedAppends()
+            try:
+                for job in batch:
+                    try:
+                        job.result = job.fn(self._appends, *job.args)
+                    except Exception as e:
+                        job.error = e
+                self._appends.flush()
+            finally:
+                self._appends = None